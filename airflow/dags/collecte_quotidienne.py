@@ -5,7 +5,6 @@ DAG Airflow pour la collecte quotidienne de données concurrentielles TechPulse
 
 from airflow import DAG
 from airflow.operators.python_operator import PythonOperator
-from airflow.operators.bash_operator import BashOperator
 from datetime import datetime, timedelta
 import sys
 import os
@@ -36,26 +35,17 @@ dag = DAG(
 
 def check_database_connection():
     """Vérifier la connexion à la base de données"""
-    import psycopg2
     import logging
+    from db_pool import connexion_db
     
     logger = logging.getLogger(__name__)
     
     try:
-        conn = psycopg2.connect(
-            host='postgres',
-            port=5432,
-            database='techpulse_veille',
-            user='techpulse',
-            password='techpulse2024'
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM sites_concurrents WHERE actif = true;")
-        count = cursor.fetchone()[0]
-        
-        cursor.close()
-        conn.close()
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM sites_concurrents WHERE actif = true;")
+            count = cursor.fetchone()[0]
+            cursor.close()
         
         logger.info(f"✅ Connexion DB OK - {count} sites actifs")
         return f"DB_OK_{count}_sites"
@@ -64,136 +54,222 @@ def check_database_connection():
         logger.error(f"❌ Erreur connexion DB: {e}")
         raise Exception(f"Connexion DB échouée: {e}")
 
-def run_cdiscount_scraping():
-    """Exécuter le scraping Cdiscount avec le scraper final"""
-    import logging
-    import sys
-    import os
+# Taille cible d'un shard: nombre de produits collectés par tâche mappée
+PRODUITS_PAR_SHARD = int(os.getenv('TECHPULSE_PRODUITS_PAR_SHARD', '200'))
+
+# Backend Scrapy (un spider par site, téléchargeur Twisted) pour les sites à fort volume:
+# slugs listés, ou sites dont le nombre de produits dus atteint le seuil (0: jamais)
+BACKEND_SCRAPY_SITES = {s.strip() for s in os.getenv('TECHPULSE_BACKEND_SCRAPY_SITES', '').split(',') if s.strip()}
+BACKEND_SCRAPY_SEUIL = int(os.getenv('TECHPULSE_BACKEND_SCRAPY_SEUIL', '0'))
+
+def backend_site(site_name, nb_produits):
+    """Backend de collecte d'un site: 'scrapy' pour les sites à fort volume, 'requests' sinon"""
+    if site_name in BACKEND_SCRAPY_SITES or (BACKEND_SCRAPY_SEUIL and nb_produits >= BACKEND_SCRAPY_SEUIL):
+        return 'scrapy'
+    return 'requests'
+
+def slug_site(nom_site):
+    """Clé scraper d'un site: 'Rue du Commerce' -> 'rueducommerce'"""
+    return nom_site.lower().replace(' ', '')
+
+def list_collection_shards(avec_non_planifies=True):
+    """Construire la liste des shards (site actif x tranche des produits dus) à collecter
     
-    # Ajouter le path des scrapers
-    sys.path.append('/opt/airflow/scrapers')
+    avec_non_planifies=False (recollecte horaire): seulement les produits planifiés du catalogue.
+    """
+    import logging
+    import math
+    from db_pool import connexion_db
+    from scraper_final_techpulse import TechPulseScraperFinal
+    from planification import PlanificationCollecte
     
     logger = logging.getLogger(__name__)
-    logger.info("🚀 Début scraping Cdiscount avec scraper final")
     
-    try:
-        # Import du scraper final
-        from scraper_final_techpulse import TechPulseScraperFinal
+    with connexion_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id_site, nom_site
+            FROM sites_concurrents
+            WHERE actif = true
+            ORDER BY id_site
+        """)
+        sites = cursor.fetchall()
+        cursor.close()
+    
+    scraper = TechPulseScraperFinal()
+    planification = PlanificationCollecte(avec_non_planifies)
+    shards = []
+    
+    for id_site, nom_site in sites:
+        site_name = slug_site(nom_site)
+        produits_site = [p for p in scraper.produits_catalogue if site_name in p['urls']]
         
-        # Créer une instance
-        scraper = TechPulseScraperFinal()
+        if not produits_site:
+            logger.warning(f"⚠️ {nom_site}: aucun produit du catalogue à surveiller, site ignoré")
+            continue
         
-        # Exécuter uniquement la collecte Cdiscount
-        results = scraper.run_full_collection(target_sites=['cdiscount'])
+        nb_produits = planification.nombre_dus(id_site, produits_site)
+        if nb_produits == 0:
+            logger.info(f"🗓️ {nom_site}: aucun produit dû sur {len(produits_site)}, site ignoré")
+            continue
         
-        if results and results.get('cdiscount', {}).get('succes', 0) > 0:
-            logger.info(f"✅ Scraping Cdiscount terminé: {results['cdiscount']['succes']} produits collectés")
-            return "CDISCOUNT_SUCCESS"
-        else:
-            raise Exception("Aucun produit collecté")
-            
-    except Exception as e:
-        logger.error(f"❌ Erreur scraping Cdiscount: {e}")
-        raise
-
-def run_rueducommerce_scraping():
-    """Exécuter le scraping Rue du Commerce avec le scraper final"""
-    import logging
-    import sys
+        nb_shards = max(1, math.ceil(nb_produits / PRODUITS_PAR_SHARD))
+        backend = backend_site(site_name, nb_produits)
+        logger.info(f"🧩 {nom_site}: {nb_produits}/{len(produits_site)} produits dus -> {nb_shards} shard(s), backend {backend}")
+        
+        for shard_index in range(nb_shards):
+            shards.append({
+                'site_name': site_name,
+                'id_site': id_site,
+                'shard_index': shard_index,
+                'nb_shards': nb_shards,
+                'avec_non_planifies': avec_non_planifies,
+                'backend': backend
+            })
     
-    sys.path.append('/opt/airflow/scrapers')
-    logger = logging.getLogger(__name__)
-    logger.info("🚀 Début scraping Rue du Commerce avec scraper final")
+    # Aucun shard: la tâche mappée est sautée, rapport et maintenance s'exécutent quand même
+    if not shards:
+        logger.info("ℹ️ Aucun produit dû sur les sites actifs, pas de collecte")
     
-    try:
-        from scraper_final_techpulse import TechPulseScraperFinal
-        scraper = TechPulseScraperFinal()
-        results = scraper.run_full_collection(target_sites=['rueducommerce'])
-        
-        if results and results.get('rueducommerce', {}).get('succes', 0) > 0:
-            logger.info(f"✅ Scraping RDC terminé: {results['rueducommerce']['succes']} produits collectés")
-            return "RDC_SUCCESS"
-        else:
-            raise Exception("Aucun produit collecté")
-            
-    except Exception as e:
-        logger.error(f"❌ Erreur scraping RDC: {e}")
-        raise
+    return shards
 
-def run_boulanger_scraping():
-    """Exécuter le scraping Boulanger avec le scraper final"""
+def run_shard_scraping(site_name, id_site, shard_index, nb_shards, avec_non_planifies=True, backend='requests'):
+    """Exécuter le scraping d'un shard (un site, une tranche du catalogue, produits dus seulement)"""
     import logging
     import sys
     
     sys.path.append('/opt/airflow/scrapers')
     logger = logging.getLogger(__name__)
-    logger.info("🚀 Début scraping Boulanger avec scraper final")
+    logger.info(f"🚀 Début scraping {site_name} shard {shard_index + 1}/{nb_shards} (backend {backend})")
     
     try:
         from scraper_final_techpulse import TechPulseScraperFinal
+        from planification import PlanificationCollecte
+        
         scraper = TechPulseScraperFinal()
-        results = scraper.run_full_collection(target_sites=['boulanger'])
+        scraper.sites_mapping[site_name] = id_site
         
-        if results and results.get('boulanger', {}).get('succes', 0) > 0:
-            logger.info(f"✅ Scraping Boulanger terminé: {results['boulanger']['succes']} produits collectés")
-            return "BOULANGER_SUCCESS"
+        results = scraper.run_full_collection(
+            target_sites=[site_name],
+            mode='concurrent',
+            shard=(shard_index, nb_shards),
+            planification=PlanificationCollecte(avec_non_planifies),
+            backend=backend
+        )
+        
+        # Un produit inchangé depuis la veille compte comme collecté
+        resultat_site = (results or {}).get(site_name, {})
+        nb_collectes = resultat_site.get('succes', 0) + resultat_site.get('inchanges', 0)
+        
+        if nb_collectes > 0:
+            logger.info(f"✅ Scraping {site_name} shard {shard_index + 1}/{nb_shards} terminé: {nb_collectes} produits collectés")
+            return f"{site_name.upper()}_{shard_index}_SUCCESS"
+        elif resultat_site.get('erreurs', 0) == 0:
+            logger.info(f"ℹ️ Shard {shard_index + 1}/{nb_shards} de {site_name} vide")
+            return f"{site_name.upper()}_{shard_index}_VIDE"
         else:
             raise Exception("Aucun produit collecté")
             
     except Exception as e:
-        logger.error(f"❌ Erreur scraping Boulanger: {e}")
+        logger.error(f"❌ Erreur scraping {site_name} shard {shard_index + 1}/{nb_shards}: {e}")
         raise
 
+def _evolution(actuel, reference, pourcentage=True):
+    """Écart lisible entre une valeur du jour et sa référence (veille, moyenne 7 jours)"""
+    if actuel is None or not reference:
+        return "n/a"
+    if pourcentage:
+        return f"{(actuel - reference) / reference * 100:+.1f}%"
+    return f"{actuel - reference:+.0f}"
+
 def generate_daily_report():
-    """Générer le rapport quotidien"""
-    import psycopg2
+    """Générer le rapport quotidien (agrégats de resume_collecte_quotidien: jour, veille, 7 jours)
+    
+    Produits collectés = pages lues avec succès, y compris celles inchangées depuis la dernière
+    collecte (aucune ligne écrite); prix moyen, promotions et disponibilité portent sur tous.
+    """
     import logging
-    from datetime import date
+    from datetime import date, timedelta
+    from db_pool import connexion_db
     
     logger = logging.getLogger(__name__)
     logger.info("📊 Génération du rapport quotidien")
     
+    aujourd_hui = date.today()
+    veille = aujourd_hui - timedelta(days=1)
+    
     try:
-        conn = psycopg2.connect(
-            host='postgres',
-            port=5432,
-            database='techpulse_veille',
-            user='techpulse',
-            password='techpulse2024'
-        )
-        
-        cursor = conn.cursor()
-        
-        # Compter les produits collectés aujourd'hui
-        cursor.execute("""
-            SELECT 
-                sc.nom_site,
-                COUNT(*) as nb_produits
-            FROM produits_concurrents pc
-            JOIN sites_concurrents sc ON pc.id_site = sc.id_site
-            WHERE DATE(pc.date_collecte) = %s
-            GROUP BY sc.nom_site
-            ORDER BY nb_produits DESC
-        """, (date.today(),))
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            
+            # Quelques lignes par site (une par jour), lues par clé primaire
+            cursor.execute("""
+                SELECT 
+                    sc.nom_site, r.jour, r.nb_produits, r.nb_inchanges, r.nb_prix, r.somme_prix,
+                    r.prix_min, r.prix_max, r.nb_promotions, r.nb_disponibles
+                FROM resume_collecte_quotidien r
+                JOIN sites_concurrents sc ON r.id_site = sc.id_site
+                WHERE r.jour BETWEEN %s AND %s
+            """, (aujourd_hui - timedelta(days=7), aujourd_hui))
+            
+            results = cursor.fetchall()
+            cursor.close()
         
-        results = cursor.fetchall()
+        par_site = {}
+        for nom_site, jour, nb_produits, nb_inchanges, nb_prix, somme_prix, prix_min, prix_max, nb_promotions, nb_disponibles in results:
+            par_site.setdefault(nom_site, {})[jour] = {
+                'nb_produits': nb_produits,
+                'nb_inchanges': nb_inchanges,
+                'prix_moyen': float(somme_prix) / nb_prix if nb_prix else None,
+                'prix_min': prix_min,
+                'prix_max': prix_max,
+                'nb_promotions': nb_promotions,
+                'taux_disponibilite': nb_disponibles / nb_produits * 100 if nb_produits else 0,
+                'nb_prix': nb_prix,
+                'somme_prix': float(somme_prix)
+            }
         
-        total_produits = sum([row[1] for row in results])
+        total_produits = sum(jours[aujourd_hui]['nb_produits'] for jours in par_site.values() if aujourd_hui in jours)
+        total_veille = sum(jours[veille]['nb_produits'] for jours in par_site.values() if veille in jours)
+        total_inchanges = sum(jours[aujourd_hui]['nb_inchanges'] for jours in par_site.values() if aujourd_hui in jours)
         
         rapport = f"""
-📊 RAPPORT QUOTIDIEN TECHPULSE - {date.today()}
+📊 RAPPORT QUOTIDIEN TECHPULSE - {aujourd_hui}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 📈 COLLECTE DU JOUR:
-• Total produits collectés: {total_produits}
+• Total produits collectés: {total_produits} ({_evolution(total_produits, total_veille, pourcentage=False)} vs veille)
+• Dont inchangés depuis la dernière collecte: {total_inchanges} (non réécrits)
 
 📋 DÉTAIL PAR SITE:
 """
         
-        for site, nb in results:
-            rapport += f"• {site}: {nb} produits\n"
+        sites_du_jour = sorted(
+            (site for site, jours in par_site.items() if aujourd_hui in jours),
+            key=lambda site: par_site[site][aujourd_hui]['nb_produits'], reverse=True
+        )
+        for site in sites_du_jour:
+            jours = par_site[site]
+            jour = jours[aujourd_hui]
+            precedent = jours.get(veille, {})
+            semaine = [valeurs for j, valeurs in jours.items() if j < aujourd_hui]
+            nb_semaine = sum(valeurs['nb_produits'] for valeurs in semaine) / len(semaine) if semaine else None
+            prix_semaine = sum(valeurs['somme_prix'] for valeurs in semaine)
+            nb_prix_semaine = sum(valeurs['nb_prix'] for valeurs in semaine)
+            prix_moyen_semaine = prix_semaine / nb_prix_semaine if nb_prix_semaine else None
+            
+            prix_moyen = f"{jour['prix_moyen']:.2f}€" if jour['prix_moyen'] is not None else "n/a"
+            rapport += (
+                f"• {site}: {jour['nb_produits']} produits collectés "
+                f"({_evolution(jour['nb_produits'], precedent.get('nb_produits'), pourcentage=False)} vs veille, "
+                f"{_evolution(jour['nb_produits'], nb_semaine)} vs moy. 7j), dont {jour['nb_inchanges']} inchangés\n"
+                f"    prix moyen {prix_moyen} ({_evolution(jour['prix_moyen'], precedent.get('prix_moyen'))} vs veille, "
+                f"{_evolution(jour['prix_moyen'], prix_moyen_semaine)} vs 7j), "
+                f"min {jour['prix_min'] or 'n/a'}€ / max {jour['prix_max'] or 'n/a'}€\n"
+                f"    {jour['nb_promotions']} en promotion, {jour['taux_disponibilite']:.0f}% disponibles\n"
+            )
         
-        if not results:
+        if not sites_du_jour:
             rapport += "• Aucune collecte aujourd'hui\n"
         
         rapport += f"""
@@ -203,15 +279,80 @@ def generate_daily_report():
         
         logger.info(f"📊 Rapport généré:\n{rapport}")
         
-        cursor.close()
-        conn.close()
-        
         return "RAPPORT_OK"
         
     except Exception as e:
         logger.error(f"❌ Erreur génération rapport: {e}")
         raise
 
+# Rétention (intervalles PostgreSQL); historique vide: historique compacté conservé sans limite
+MOIS_PARTITIONS_AVANCE = int(os.getenv('TECHPULSE_MOIS_PARTITIONS_AVANCE', '3'))
+RETENTION_COLLECTE = os.getenv('TECHPULSE_RETENTION_COLLECTE', '1 year')
+COMPACTION_HISTORIQUE = os.getenv('TECHPULSE_COMPACTION_HISTORIQUE', '3 months')
+RETENTION_HISTORIQUE = os.getenv('TECHPULSE_RETENTION_HISTORIQUE', '')
+
+def maintenance_partitions():
+    """Créer les partitions mensuelles à venir, supprimer les mois expirés et compacter l'historique"""
+    import logging
+    from db_pool import connexion_db
+    
+    logger = logging.getLogger(__name__)
+    
+    with connexion_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT creer_partitions_futures(%s)", (MOIS_PARTITIONS_AVANCE,))
+        nb_crees = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT nettoyer_anciennes_donnees(%s::interval, %s::interval, %s::interval)",
+            (RETENTION_COLLECTE, COMPACTION_HISTORIQUE, RETENTION_HISTORIQUE or None)
+        )
+        conn.commit()
+        for notice in conn.notices:
+            logger.info(f"🧹 {notice.strip()}")
+        del conn.notices[:]
+        cursor.close()
+    
+    logger.info(f"🗂️ {nb_crees} partition(s) mensuelle(s) créée(s) ({MOIS_PARTITIONS_AVANCE} mois d'avance)")
+    return "MAINTENANCE_OK"
+
+def recalculer_planification():
+    """Recalculer l'intervalle de collecte de chaque (produit, site) depuis historique_prix"""
+    import logging
+    from db_pool import connexion_db
+    
+    logger = logging.getLogger(__name__)
+    
+    with connexion_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT recalculer_planification()")
+        nb_lignes = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT pt.priorite_veille, COUNT(*), ROUND(AVG(p.intervalle_heures), 1)
+            FROM planification_collecte p
+            JOIN produits_techpulse pt ON pt.id_produit = p.id_produit_techpulse
+            GROUP BY pt.priorite_veille
+        """)
+        for priorite, nb, intervalle_moyen in cursor.fetchall():
+            logger.info(f"🗓️ Priorité {priorite}: {nb} (produit, site), intervalle moyen {intervalle_moyen}h")
+        conn.commit()
+        cursor.close()
+    
+    logger.info(f"🗓️ Planification recalculée: {nb_lignes} (produit, site)")
+    return "PLANIFICATION_OK"
+
+# Fenêtre de collecte reprise par le rapprochement quotidien
+RAPPROCHEMENT_JOURS = int(os.getenv('TECHPULSE_RAPPROCHEMENT_JOURS', '7'))
+
+def rapprocher_offres():
+    """Rattacher au catalogue les offres collectées sans produit TechPulse (produits ou noms ajoutés depuis)"""
+    import logging
+    from rapprochement import rattraper
+    
+    logger = logging.getLogger(__name__)
+    nb_rapprochees = rattraper(jours=RAPPROCHEMENT_JOURS)
+    logger.info(f"🔗 {nb_rapprochees} offre(s) rattachée(s) au catalogue sur {RAPPROCHEMENT_JOURS} jours")
+    return "RAPPROCHEMENT_OK"
+
 def send_notification():
     """Envoyer une notification de fin"""
     import logging
@@ -231,24 +372,25 @@ task_check_db = PythonOperator(
     dag=dag
 )
 
-# Tâche 2a: Scraping Cdiscount
-task_scraping_cdiscount = PythonOperator(
-    task_id='scraping_cdiscount',
-    python_callable=run_cdiscount_scraping,
+# Tâche 2a: Liste des shards (sites actifs de sites_concurrents x tranches du catalogue)
+task_shards = PythonOperator(
+    task_id='list_collection_shards',
+    python_callable=list_collection_shards,
     dag=dag
 )
 
-# Tâche 2b: Scraping Rue du Commerce  
-task_scraping_rdc = PythonOperator(
-    task_id='scraping_rueducommerce',
-    python_callable=run_rueducommerce_scraping,
+# Tâche 2b: Scraping, une tâche mappée par shard, réparties sur les workers Celery
+task_scraping = PythonOperator.partial(
+    task_id='scraping_shard',
+    python_callable=run_shard_scraping,
     dag=dag
-)
+).expand(op_kwargs=task_shards.output)
 
-# Tâche 2c: Scraping Boulanger
-task_scraping_boulanger = PythonOperator(
-    task_id='scraping_boulanger',
-    python_callable=run_boulanger_scraping,
+# Tâche 2c: Offres encore sans produit TechPulse rapprochées du catalogue
+task_rapprochement = PythonOperator(
+    task_id='rapprocher_offres',
+    python_callable=rapprocher_offres,
+    trigger_rule='none_failed',  # aussi quand aucun shard n'a été mappé
     dag=dag
 )
 
@@ -266,40 +408,74 @@ task_notification = PythonOperator(
     dag=dag
 )
 
-# Tâche 5: Nettoyage (optionnel)
-task_cleanup = BashOperator(
-    task_id='cleanup_old_logs',
-    bash_command="""
-    echo "🧹 Nettoyage des anciens logs..."
-    # Plus tard: script de nettoyage des données anciennes
-    echo "✅ Nettoyage terminé"
-    """,
+# Tâche 5: Partitions à venir, rétention par partitions entières et compaction hebdomadaire
+task_cleanup = PythonOperator(
+    task_id='maintenance_partitions',
+    python_callable=maintenance_partitions,
+    dag=dag
+)
+
+# Tâche 6: Intervalles de recollecte (priorité de veille, volatilité des prix)
+task_planification = PythonOperator(
+    task_id='recalculer_planification',
+    python_callable=recalculer_planification,
     dag=dag
 )
 
 # DÉFINITION DES DÉPENDANCES (ordre d'exécution)
 
-# D'abord vérifier la DB
-task_check_db >> [task_scraping_cdiscount, task_scraping_rdc, task_scraping_boulanger]
+# D'abord vérifier la DB, puis calculer les shards
+task_check_db >> task_shards >> task_scraping
 
-# Une fois tous les scrapings terminés, générer le rapport
-[task_scraping_cdiscount, task_scraping_rdc, task_scraping_boulanger] >> task_rapport
+# Une fois tous les shards terminés, rapprocher les offres restantes puis générer le rapport
+task_scraping >> task_rapprochement >> task_rapport
 
-# Puis envoyer la notification et nettoyer
-task_rapport >> [task_notification, task_cleanup]
+# Puis envoyer la notification, nettoyer et replanifier
+task_rapport >> [task_notification, task_cleanup, task_planification]
 
 # Schéma des dépendances:
 #
-#     check_db
-#        |
-#   ┌────┼────┐
-#   │    │    │
-# cdiscount rdc boulanger
-#   │    │    │
-#   └────┼────┘
-#        │
-#     rapport
-#        |
-#   ┌────┼────┐
-#   │    │    │
-# notification cleanup
\ No newline at end of file
+#        check_db
+#           |
+#   list_collection_shards
+#           |
+#   ┌───────┼───────┐
+#   │       │       │
+# shard 0 shard 1 ... shard N   (site x tranche, mapping dynamique)
+#   │       │       │
+#   └───────┼───────┘
+#           │
+#   rapprocher_offres
+#           |
+#        rapport
+#           |
+#      ┌────┼──────────────┐
+#      │         │                    │
+# notification maintenance_partitions recalculer_planification
+
+# RECOLLECTE HORAIRE: produits planifiés dus entre deux collectes quotidiennes
+# (priorité haute, prix volatils), réservés pour ne pas être collectés deux fois
+
+dag_recollecte = DAG(
+    'techpulse_recollecte_horaire',
+    default_args=default_args,
+    description='Recollecte des produits dus selon la planification',
+    schedule_interval='30 * * * *',  # Toutes les heures à la demie
+    max_active_runs=1,
+    tags=['techpulse', 'scraping', 'planification']
+)
+
+task_shards_dus = PythonOperator(
+    task_id='list_collection_shards',
+    python_callable=list_collection_shards,
+    op_kwargs={'avec_non_planifies': False},
+    dag=dag_recollecte
+)
+
+task_scraping_dus = PythonOperator.partial(
+    task_id='scraping_shard',
+    python_callable=run_shard_scraping,
+    dag=dag_recollecte
+).expand(op_kwargs=task_shards_dus.output)
+
+task_shards_dus >> task_scraping_dus
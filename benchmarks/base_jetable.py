@@ -0,0 +1,167 @@
+# benchmarks/base_jetable.py
+"""
+Base PostgreSQL jetable pour les benchmarks, chargée depuis database/init.sql
+Cluster temporaire (initdb/pg_ctl) si les binaires sont présents, sinon base temporaire
+sur le serveur configuré par TECHPULSE_DB_*; tout est détruit en sortie
+"""
+
+import os
+import glob
+import shutil
+import logging
+import tempfile
+import subprocess
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = logging.getLogger(__name__)
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_SCHEMA = os.path.join(RACINE, 'database', 'init.sql')
+
+# Tables remises à zéro entre deux runs
+TABLES_COLLECTE = ('produits_concurrents', 'historique_prix', 'derniers_prix_concurrents', 'resume_collecte_quotidien',
+                   'rapprochements_concurrents', 'logs_collecte')
+
+VARIABLES_DB = ('TECHPULSE_DB_HOST', 'TECHPULSE_DB_PORT', 'TECHPULSE_DB_NAME', 'TECHPULSE_DB_USER', 'TECHPULSE_DB_PASSWORD')
+
+
+def trouver_binaires_postgres(pg_bin=None):
+    """Dossier contenant initdb et pg_ctl (argument, TECHPULSE_BENCH_PG_BIN, PATH, /usr/lib/postgresql)"""
+    candidats = [pg_bin, os.getenv('TECHPULSE_BENCH_PG_BIN')]
+    initdb = shutil.which('initdb')
+    if initdb:
+        candidats.append(os.path.dirname(initdb))
+    candidats.extend(sorted(glob.glob('/usr/lib/postgresql/*/bin'), reverse=True))
+
+    for dossier in candidats:
+        if dossier and os.path.exists(os.path.join(dossier, 'initdb')) and os.path.exists(os.path.join(dossier, 'pg_ctl')):
+            return dossier
+    return None
+
+
+def schema_sql():
+    """init.sql sans les commandes psql ni la création de la base Airflow"""
+    lignes = []
+    with open(FICHIER_SCHEMA, encoding='utf-8') as f:
+        for ligne in f:
+            instruction = ligne.strip()
+            if instruction.startswith('\\') or instruction.upper().startswith('CREATE DATABASE'):
+                continue
+            lignes.append(ligne)
+    return ''.join(lignes)
+
+
+class BaseJetable:
+    """Contexte qui crée une base techpulse vide et pointe TECHPULSE_DB_* dessus"""
+
+    def __init__(self, mode='auto', pg_bin=None):
+        self.pg_bin = trouver_binaires_postgres(pg_bin)
+        if mode == 'auto':
+            mode = 'cluster' if self.pg_bin else 'serveur'
+        if mode == 'cluster' and not self.pg_bin:
+            raise RuntimeError("initdb/pg_ctl introuvables: --pg-bin ou TECHPULSE_BENCH_PG_BIN")
+        self.mode = mode
+        self.config = None
+        self._dossier = None
+        self._env_precedent = {}
+
+    def __enter__(self):
+        if self.mode == 'cluster':
+            self.config = self._demarrer_cluster()
+        else:
+            self.config = self._creer_base_temporaire()
+
+        try:
+            self._executer(schema_sql())
+        except Exception:
+            self._detruire()
+            raise
+
+        for variable in VARIABLES_DB:
+            self._env_precedent[variable] = os.environ.get(variable)
+        os.environ.update({
+            'TECHPULSE_DB_HOST': self.config['host'],
+            'TECHPULSE_DB_PORT': str(self.config['port']),
+            'TECHPULSE_DB_NAME': self.config['database'],
+            'TECHPULSE_DB_USER': self.config['user'],
+            'TECHPULSE_DB_PASSWORD': self.config['password']
+        })
+        logger.info(f"🧪 Base jetable prête ({self.mode}): {self.config['host']}:{self.config['port']}/{self.config['database']}")
+        return self
+
+    def __exit__(self, *exc):
+        for variable, valeur in self._env_precedent.items():
+            if valeur is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = valeur
+
+        self._detruire()
+        return False
+
+    def _detruire(self):
+        """Arrête le cluster temporaire ou supprime la base temporaire"""
+        if self.mode == 'cluster':
+            subprocess.run([os.path.join(self.pg_bin, 'pg_ctl'), '-D', os.path.join(self._dossier, 'data'), '-m', 'immediate', 'stop'],
+                           check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.rmtree(self._dossier, ignore_errors=True)
+        else:
+            admin = psycopg2.connect(**dict(self.config, database='postgres'))
+            admin.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            admin.cursor().execute(f"DROP DATABASE IF EXISTS {self.config['database']}")
+            admin.close()
+        logger.info("🧹 Base jetable supprimée")
+
+    def _executer(self, sql):
+        """Exécute une requête sur la base jetable, retourne la première ligne éventuelle"""
+        conn = psycopg2.connect(**self.config)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            ligne = cursor.fetchone() if cursor.description else None
+            conn.commit()
+            return ligne
+        finally:
+            conn.close()
+
+    def vider(self):
+        """Remet les tables de collecte à zéro entre deux runs"""
+        self._executer(f"TRUNCATE {', '.join(TABLES_COLLECTE)} RESTART IDENTITY")
+
+    def compter(self, table):
+        return self._executer(f"SELECT COUNT(*) FROM {table}")[0]
+
+    def _demarrer_cluster(self):
+        """initdb + pg_ctl dans un dossier temporaire, socket Unix uniquement"""
+        self._dossier = tempfile.mkdtemp(prefix='techpulse_bench_pg_')
+        donnees = os.path.join(self._dossier, 'data')
+        subprocess.run([os.path.join(self.pg_bin, 'initdb'), '-D', donnees, '-U', 'techpulse', '--auth=trust', '-E', 'UTF8'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([os.path.join(self.pg_bin, 'pg_ctl'), '-D', donnees, '-w', '-l', os.path.join(self._dossier, 'postgres.log'),
+                        '-o', f"-k {self._dossier} -c listen_addresses=''", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+
+        config = {'host': self._dossier, 'port': 5432, 'database': 'postgres', 'user': 'techpulse', 'password': ''}
+        admin = psycopg2.connect(**config)
+        admin.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        admin.cursor().execute("CREATE DATABASE techpulse_veille")
+        admin.close()
+        return dict(config, database='techpulse_veille')
+
+    def _creer_base_temporaire(self):
+        """Base techpulse_bench_<pid> sur le serveur TECHPULSE_DB_* existant"""
+        config = {
+            'host': os.getenv('TECHPULSE_DB_HOST', 'localhost'),
+            'port': int(os.getenv('TECHPULSE_DB_PORT', '5433')),
+            'database': 'postgres',
+            'user': os.getenv('TECHPULSE_DB_USER', 'techpulse'),
+            'password': os.getenv('TECHPULSE_DB_PASSWORD', 'techpulse2024')
+        }
+        nom_base = f"techpulse_bench_{os.getpid()}"
+        admin = psycopg2.connect(**config)
+        admin.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        admin.cursor().execute(f"CREATE DATABASE {nom_base}")
+        admin.close()
+        return dict(config, database=nom_base)
@@ -0,0 +1,360 @@
+# benchmarks/lancer_benchmarks.py
+"""
+Banc d'essai de bout en bout de la collecte (serveur de fixtures + base jetable)
+Rapporte produits/s, latences p50/p99 par étape (fetch, parse, écriture) et mémoire de pointe
+
+Usage:
+    python benchmarks/lancer_benchmarks.py                              # 10, 1k et 100k SKUs
+    python benchmarks/lancer_benchmarks.py --skus 10 1000 --scenarios cdiscount_v2
+    python benchmarks/lancer_benchmarks.py --skus 100 --scenarios navigateur     # selenium + Chrome requis
+    python benchmarks/lancer_benchmarks.py --scenarios collecte scrapy           # backends requests et Scrapy
+    python benchmarks/lancer_benchmarks.py --latence-ms 40 --gigue-ms 20 --taux-erreur 0.01
+    python benchmarks/lancer_benchmarks.py --sortie bench.json --reference bench_precedent.json
+
+Chaque run tourne dans un processus neuf: caches, pools et pic mémoire ne débordent pas d'un run à l'autre.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+from datetime import datetime
+
+DOSSIER_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(DOSSIER_BENCHMARKS), 'scrapers'))
+sys.path.insert(0, DOSSIER_BENCHMARKS)
+
+from serveur_fixtures import SITES, servir_processus, url_produit, url_produit_js, url_liste, produit_fixture
+from base_jetable import BaseJetable
+
+logger = logging.getLogger('benchmarks')
+
+TAILLES_DEFAUT = [10, 1000, 100000]
+ETAPES = ('fetch', 'parse', 'ecriture')
+
+
+def limiteur_benchmark(options):
+    """Même délai pour tous les hôtes du serveur de fixtures (0 = pas de limite)"""
+    from limiteur_debit import LimiteurDebit
+    return LimiteurDebit(delais_par_hote={}, delai_defaut=options['delai_hote'])
+
+
+# Un scénario prépare ses objets (hors chrono) et retourne la fonction mesurée,
+# qui renvoie (produits traités, erreurs)
+
+def scenario_cdiscount_v2(base_url, nb_skus, options):
+    """CdiscountScraperV2 page par page, écriture par lots"""
+    from cdiscount_scraper import CdiscountScraperV2
+    from ingestion_batch import IngestionBatch
+    from index_checksums import IndexChecksums
+
+    scraper = CdiscountScraperV2()
+    scraper.fetch.limiteur = limiteur_benchmark(options)
+    index = IndexChecksums()
+
+    def executer():
+        traites, erreurs = 0, 0
+        for _ in range(options['passes']):
+            lot = IngestionBatch(scraper.site_id, 'cdiscount', index_checksums=index)
+            for sku in range(nb_skus):
+                product_data = scraper.scrape_product_page(url_produit(base_url, 'cdiscount', sku))
+                if product_data and product_data['prix_ttc']:
+                    scraper.save_to_database(product_data, lot=lot)
+                else:
+                    erreurs += 1
+            lot.flush()
+            traites += lot.stats['lignes'] + lot.stats['inchanges']
+            erreurs += lot.stats['erreurs']
+        return traites, erreurs
+
+    return executer
+
+
+def scraper_collecte(base_url, nb_skus, options):
+    """TechPulseScraperFinal sur le catalogue des fixtures (nb_skus produits, trois sites), délais simulés coupés"""
+    from scraper_final_techpulse import TechPulseScraperFinal
+
+    scraper = TechPulseScraperFinal()
+    scraper.fetch.limiteur = limiteur_benchmark(options)
+    scraper.delais_simulation = False
+    scraper.produits_catalogue = []
+    for sku in range(nb_skus):
+        produit = produit_fixture(sku)
+        scraper.produits_catalogue.append({
+            'nom': produit['nom'],
+            'prix_base': round(produit['prix'], 2),
+            'variation_max': 50,
+            'urls': {site: url_produit(base_url, site, sku) for site in SITES}
+        })
+    return scraper
+
+
+def scenario_collecte(base_url, nb_skus, options, backend='requests'):
+    """TechPulseScraperFinal.run_full_collection sur les trois sites, délais simulés coupés"""
+    scraper = scraper_collecte(base_url, nb_skus, options)
+
+    def executer():
+        traites, erreurs = 0, 0
+        for _ in range(options['passes']):
+            resume = scraper.run_full_collection(mode=options['mode'], backend=backend)
+            traites += sum(r['succes'] + r['inchanges'] for r in resume.values())
+            erreurs += sum(r['erreurs'] for r in resume.values())
+        return traites, erreurs
+
+    return executer
+
+
+def scenario_scrapy(base_url, nb_skus, options):
+    """Même collecte avec le backend Scrapy (un spider par site, extraction réelle des pages)"""
+    return scenario_collecte(base_url, nb_skus, options, backend='scrapy')
+
+
+def scenario_listes(base_url, nb_skus, options):
+    """ScraperListes sur les pages de liste des trois sites (nb_skus offres par site), pages produit si changement"""
+    from scraper_listes import ScraperListes
+    from couche_fetch import CoucheFetch
+
+    scraper = ScraperListes(fetch=CoucheFetch(limiteur=limiteur_benchmark(options)), pages_max=nb_skus)
+
+    def executer():
+        traites, erreurs = 0, 0
+        for _ in range(options['passes']):
+            for site_id, site in enumerate(SITES, start=1):
+                lot = scraper.lot(site_id, site)
+                resume = scraper.collecter(site, site_id, url_liste(base_url, site, nb_skus), lot)
+                traites += resume['offres']
+                erreurs += nb_skus - resume['offres'] + lot.stats['erreurs']
+        logger.info(f"📃 {scraper.requetes_par_offre():.3f} requêtes par offre ({scraper.stats})")
+        return traites, erreurs
+
+    return executer
+
+
+def scenario_navigateur(base_url, nb_skus, options):
+    """CdiscountScraperV2 sur les pages au prix rendu en JavaScript: HTTP statique puis pool de navigateurs headless"""
+    from cdiscount_scraper import CdiscountScraperV2
+    from ingestion_batch import IngestionBatch
+
+    scraper = CdiscountScraperV2()
+    scraper.fetch.limiteur = limiteur_benchmark(options)
+    if scraper.navigateurs is None:
+        raise RuntimeError("étage navigateur indisponible (selenium absent ou TECHPULSE_NAVIGATEURS=0)")
+
+    def executer():
+        traites, erreurs = 0, 0
+        for _ in range(options['passes']):
+            lot = IngestionBatch(scraper.site_id, 'cdiscount')
+            for sku in range(nb_skus):
+                product_data = scraper.scrape_product_page(url_produit_js(base_url, 'cdiscount', sku))
+                # Prix du texte statique (celui d'un accessoire) compté comme une erreur
+                if product_data and product_data['prix_ttc'] == round(produit_fixture(sku)['prix'], 2):
+                    scraper.save_to_database(product_data, lot=lot)
+                else:
+                    erreurs += 1
+            lot.flush()
+            traites += lot.stats['lignes']
+            erreurs += lot.stats['erreurs']
+        logger.info(f"🌐 Pool de navigateurs: {scraper.navigateurs.stats}")
+        return traites, erreurs
+
+    return executer
+
+
+SCENARIOS = {
+    'cdiscount_v2': scenario_cdiscount_v2,
+    'collecte': scenario_collecte,
+    'listes': scenario_listes,
+    'navigateur': scenario_navigateur,
+    'scrapy': scenario_scrapy
+}
+
+# Hors des scénarios par défaut (navigateur headless ou scrapy requis)
+SCENARIOS_OPTIONNELS = {'navigateur', 'scrapy'}
+
+
+def percentiles(durees):
+    """Nombre d'échantillons, p50 et p99 en millisecondes"""
+    if not durees:
+        return {'n': 0, 'p50_ms': None, 'p99_ms': None}
+    valeurs = sorted(durees)
+    def rang(p):
+        return valeurs[min(len(valeurs) - 1, int(round(p * (len(valeurs) - 1))))] * 1000
+    return {'n': len(valeurs), 'p50_ms': round(rang(0.50), 2), 'p99_ms': round(rang(0.99), 2)}
+
+
+def pic_rss_mo():
+    """Pic de mémoire résidente du processus (ru_maxrss: Ko sous Linux, octets sous macOS)"""
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pic / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def executer_run(file_resultats, scenario, nb_skus, base_url, options):
+    """Processus enfant: un run isolé, résultat déposé dans la file"""
+    logging.basicConfig(level=logging.INFO if options['verbeux'] else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    os.environ['TECHPULSE_CACHE_HTTP'] = os.path.join(options['dossier_cache'], f"{scenario}_{nb_skus}.sqlite")
+    os.environ['TECHPULSE_ARCHIVE'] = os.path.join(options['dossier_cache'], f"archive_{scenario}_{nb_skus}") if options['archive'] else ''
+
+    from metriques import collecter_echantillons
+
+    executer = SCENARIOS[scenario](base_url, nb_skus, options)
+
+    if options['tracemalloc']:
+        tracemalloc.start()
+
+    start_time = time.perf_counter()
+    with collecter_echantillons() as echantillons:
+        traites, erreurs = executer()
+    duree = time.perf_counter() - start_time
+
+    file_resultats.put({
+        'scenario': scenario,
+        'skus': nb_skus,
+        'produits': traites,
+        'erreurs': erreurs,
+        'duree_s': round(duree, 3),
+        'produits_par_s': round(traites / duree, 1) if duree > 0 else 0.0,
+        'etapes': {etape: percentiles(echantillons.get(etape, [])) for etape in ETAPES},
+        'rss_pic_mo': pic_rss_mo(),
+        'tracemalloc_pic_mo': round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1) if options['tracemalloc'] else None
+    })
+
+
+def _format_etape(stats):
+    if not stats['n']:
+        return '-'
+    return f"{stats['p50_ms']:.1f}/{stats['p99_ms']:.1f}"
+
+
+def afficher_resultats(resultats, reference=None):
+    """Tableau récapitulatif, avec l'écart de débit par rapport à un run de référence"""
+    references = {(r['scenario'], r['skus']): r for r in (reference or {}).get('resultats', [])}
+
+    entete = f"{'scénario':<14}{'SKUs':>8}{'produits':>10}{'erreurs':>9}{'durée s':>10}{'produits/s':>12}"
+    entete += ''.join(f"{etape + ' p50/p99 ms':>24}" for etape in ETAPES)
+    entete += f"{'RSS Mo':>9}{'Δ débit':>10}"
+    print(entete)
+    print('-' * len(entete))
+
+    for r in resultats:
+        ligne = f"{r['scenario']:<14}{r['skus']:>8}{r['produits']:>10}{r['erreurs']:>9}{r['duree_s']:>10.2f}{r['produits_par_s']:>12.1f}"
+        ligne += ''.join(f"{_format_etape(r['etapes'][etape]):>24}" for etape in ETAPES)
+        ligne += f"{r['rss_pic_mo']:>9.1f}"
+
+        precedent = references.get((r['scenario'], r['skus']))
+        if precedent and precedent['produits_par_s']:
+            ecart = (r['produits_par_s'] - precedent['produits_par_s']) / precedent['produits_par_s'] * 100
+            ligne += f"{ecart:>+9.1f}%"
+        else:
+            ligne += f"{'-':>10}"
+        print(ligne)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de débit de la collecte TechPulse")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS),
+                        default=sorted(set(SCENARIOS) - SCENARIOS_OPTIONNELS))
+    parser.add_argument('--skus', nargs='+', type=int, default=TAILLES_DEFAUT)
+    parser.add_argument('--mode', choices=['sequentiel', 'concurrent'], default='concurrent',
+                        help="mode de run_full_collection (scénario collecte)")
+    parser.add_argument('--passes', type=int, default=1,
+                        help="passages successifs sur les mêmes SKUs (2+: chemin 304 / checksum inchangé)")
+    parser.add_argument('--delai-hote', type=float, default=0,
+                        help="intervalle minimal entre requêtes par hôte, en secondes (0 = pas de limite)")
+    parser.add_argument('--latence-ms', type=float, default=0)
+    parser.add_argument('--gigue-ms', type=float, default=0)
+    parser.add_argument('--taux-erreur', type=float, default=0.0,
+                        help="part des réponses 503/429/403 (les scrapers attendent avant de réessayer)")
+    parser.add_argument('--remplissage-ko', type=int, default=200, help="taille ajoutée à chaque page")
+    parser.add_argument('--db', choices=['auto', 'cluster', 'serveur'], default='auto',
+                        help="cluster: initdb temporaire; serveur: base temporaire sur TECHPULSE_DB_*")
+    parser.add_argument('--pg-bin', help="dossier des binaires initdb/pg_ctl")
+    parser.add_argument('--redis', action='store_true', help="utiliser TECHPULSE_REDIS_URL (sinon index en mémoire)")
+    parser.add_argument('--archive', action='store_true', help="archiver les pages lues (zstd) pendant le run")
+    parser.add_argument('--tracemalloc', action='store_true', help="pic d'allocations Python (ralentit le run)")
+    parser.add_argument('--sortie', help="fichier JSON des résultats")
+    parser.add_argument('--reference', help="résultats JSON d'un run précédent à comparer")
+    parser.add_argument('--verbeux', action='store_true', help="logs INFO des scrapers")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Les runs ne poussent pas de métriques et n'écrivent pas dans le Redis partagé
+    # ni dans l'instantané local du catalogue (catalogue des fixtures)
+    os.environ['TECHPULSE_PUSHGATEWAY'] = ''
+    os.environ['TECHPULSE_CATALOGUE'] = ''
+    if not args.redis:
+        os.environ['TECHPULSE_REDIS_URL'] = ''
+
+    reference = None
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            reference = json.load(f)
+
+    contexte = multiprocessing.get_context('spawn')
+    file_port = contexte.Queue()
+    serveur = contexte.Process(target=servir_processus, daemon=True, args=(file_port, {
+        'latence_ms': args.latence_ms,
+        'gigue_ms': args.gigue_ms,
+        'taux_erreur': args.taux_erreur,
+        'remplissage_ko': args.remplissage_ko
+    }))
+    serveur.start()
+    base_url = f"http://127.0.0.1:{file_port.get(timeout=30)}"
+    logger.info(f"🌐 Serveur de fixtures: {base_url}")
+
+    resultats = []
+    try:
+        with BaseJetable(args.db, args.pg_bin) as base, tempfile.TemporaryDirectory(prefix='techpulse_bench_') as dossier_cache:
+            options = {
+                'mode': args.mode,
+                'passes': args.passes,
+                'delai_hote': args.delai_hote,
+                'verbeux': args.verbeux,
+                'tracemalloc': args.tracemalloc,
+                'archive': args.archive,
+                'dossier_cache': dossier_cache
+            }
+            for scenario in args.scenarios:
+                for nb_skus in args.skus:
+                    base.vider()
+                    logger.info(f"⏱️  {scenario} - {nb_skus} SKUs")
+
+                    file_resultats = contexte.Queue()
+                    run = contexte.Process(target=executer_run, args=(file_resultats, scenario, nb_skus, base_url, options))
+                    run.start()
+                    run.join()
+                    if run.exitcode != 0:
+                        logger.error(f"❌ Run {scenario}/{nb_skus} en échec (code {run.exitcode})")
+                        continue
+
+                    resultat = file_resultats.get(timeout=10)
+                    resultat['lignes_en_base'] = base.compter('produits_concurrents')
+                    logger.info(f"✅ {resultat['produits_par_s']} produits/s, pic RSS {resultat['rss_pic_mo']} Mo")
+                    resultats.append(resultat)
+    finally:
+        serveur.terminate()
+
+    print()
+    afficher_resultats(resultats, reference)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump({
+                'date': datetime.now().isoformat(),
+                'machine': {'python': platform.python_version(), 'plateforme': platform.platform(), 'cpus': os.cpu_count()},
+                'configuration': {k: v for k, v in vars(args).items() if k not in ('sortie', 'reference')},
+                'resultats': resultats
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Résultats écrits dans {args.sortie}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# benchmarks/serveur_fixtures.py
+"""
+Serveur HTTP local qui sert les pages produits enregistrées (benchmarks/fixtures),
+des pages de liste paginées de ces mêmes produits et, pour les sites qui en ont une,
+la variante dont le prix n'est affiché qu'en JavaScript (fixtures <site>_js.html)
+Latence et taux d'erreur configurables, ETag + 304 comme les vrais sites
+
+Usage autonome: python benchmarks/serveur_fixtures.py --port 8765 --latence-ms 50
+"""
+
+import os
+import time
+import random
+import string
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DOSSIER_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SITES = ('cdiscount', 'rueducommerce', 'boulanger')
+
+MODELES = [
+    'Apple iPhone 15 128 Go', 'Samsung Galaxy S24 256 Go', 'Apple MacBook Air M3 256 Go',
+    'Apple iPad Air 64 Go', 'Dell XPS 13 Plus i7', 'Xiaomi Redmi Note 13', 'Lenovo IdeaPad 5',
+    'Sony WH-1000XM5', 'Asus Zenbook 14 OLED', 'Google Pixel 8'
+]
+
+# Réponses d'erreur tirées au sort (status, en-têtes)
+ERREURS = [
+    (503, {'Retry-After': '1'}),
+    (429, {'Retry-After': '2'}),
+    (403, {})
+]
+
+
+def url_produit(base_url, site, sku):
+    """URL d'une page produit servie par le serveur de fixtures"""
+    return f"{base_url}/{site}/produit/{sku}.html"
+
+
+def url_produit_js(base_url, site, sku):
+    """URL de la variante JavaScript d'une page produit (prix absent du HTML statique)"""
+    return f"{base_url}/{site}/js/{sku}.html"
+
+
+def url_liste(base_url, site, nb_skus, page=1):
+    """URL d'une page de liste couvrant les SKUs 0 à nb_skus - 1"""
+    return f"{base_url}/{site}/liste/{nb_skus}/{page}.html"
+
+
+def produit_fixture(sku, generation=0):
+    """Nom, prix et disponibilité déterministes d'un SKU (la génération fait varier le prix)"""
+    graine = int(hashlib.md5(f"{sku}:{generation}".encode()).hexdigest()[:8], 16)
+    prix = 99 + graine % 2000 + (graine % 100) / 100
+    return {
+        'nom': f"{MODELES[sku % len(MODELES)]} - réf {sku}",
+        'prix': prix,
+        'disponible': graine % 20 != 0,
+        'en_promotion': graine % 7 == 0
+    }
+
+
+def prix_francais(prix):
+    """Prix affiché à la française: 1234,50"""
+    return f"{prix:.2f}".replace('.', ',')
+
+
+class ServeurFixtures:
+    """ThreadingHTTPServer sur 127.0.0.1 servant les fixtures des trois sites"""
+
+    def __init__(self, port=0, latence_ms=0, gigue_ms=0, taux_erreur=0.0, remplissage_ko=200, generation=0,
+                 produits_par_page=50):
+        self.latence_ms = latence_ms
+        self.gigue_ms = gigue_ms
+        self.taux_erreur = taux_erreur
+        self.generation = generation
+        self.produits_par_page = produits_par_page
+        self._remplissage = 'x' * (remplissage_ko * 1024)
+        self._gabarits = {}
+        self._gabarits_listes = {}
+        self._gabarits_js = {}
+        for site in SITES:
+            with open(os.path.join(DOSSIER_FIXTURES, f"{site}.html"), encoding='utf-8') as f:
+                self._gabarits[site] = string.Template(f.read())
+            chemin_js = os.path.join(DOSSIER_FIXTURES, f"{site}_js.html")
+            if os.path.exists(chemin_js):
+                with open(chemin_js, encoding='utf-8') as f:
+                    self._gabarits_js[site] = string.Template(f.read())
+            with open(os.path.join(DOSSIER_FIXTURES, f"{site}_liste.html"), encoding='utf-8') as f:
+                liste = string.Template(f.read())
+            with open(os.path.join(DOSSIER_FIXTURES, f"{site}_tuile.html"), encoding='utf-8') as f:
+                self._gabarits_listes[site] = (liste, string.Template(f.read()))
+
+        serveur = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive pour les sessions requests
+
+            def do_GET(self):
+                serveur._repondre(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), Gestionnaire)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._thread = None
+
+    def page(self, site, sku, js=False):
+        """Corps HTML d'une page produit (js: variante au prix rendu par script)"""
+        produit = produit_fixture(sku, self.generation)
+        prix_point = f"{produit['prix']:.2f}"
+        gabarit = self._gabarits_js[site] if js else self._gabarits[site]
+        return gabarit.substitute(
+            nom=produit['nom'],
+            sku=sku,
+            prix=prix_francais(produit['prix']),
+            prix_point=prix_point,
+            disponibilite='En stock' if produit['disponible'] else 'Rupture de stock',
+            remplissage=self._remplissage
+        ).encode('utf-8')
+
+    def page_liste(self, site, nb_skus, page):
+        """Corps HTML d'une page de liste (produits_par_page tuiles, lien rel=next sauf en dernière page)"""
+        gabarit_liste, gabarit_tuile = self._gabarits_listes[site]
+        debut = (page - 1) * self.produits_par_page
+        tuiles = []
+        for sku in range(debut, min(debut + self.produits_par_page, nb_skus)):
+            produit = produit_fixture(sku, self.generation)
+            tuiles.append(gabarit_tuile.substitute(
+                sku=sku,
+                nom=produit['nom'],
+                url=f"/{site}/produit/{sku}.html",
+                prix=prix_francais(produit['prix']),
+                prix_barre=f"{prix_francais(produit['prix'] * 1.15)} €" if produit['en_promotion'] else '',
+                disponibilite='En stock' if produit['disponible'] else 'Rupture de stock'
+            ))
+        pagination = f'<a rel="next" href="{page + 1}.html">Page suivante</a>' if debut + self.produits_par_page < nb_skus else ''
+        return gabarit_liste.substitute(page=page, tuiles='\n'.join(tuiles), pagination=pagination).encode('utf-8')
+
+    def _repondre(self, requete):
+        delai = self.latence_ms + random.uniform(0, self.gigue_ms)
+        if delai > 0:
+            time.sleep(delai / 1000)
+
+        morceaux = requete.path.strip('/').split('/')
+        liste = len(morceaux) == 4 and morceaux[1] == 'liste'
+        js = len(morceaux) == 3 and morceaux[1] == 'js'
+        if ((len(morceaux) != 3 and not liste) or morceaux[0] not in self._gabarits or not morceaux[-1].endswith('.html')
+                or (js and morceaux[0] not in self._gabarits_js)):
+            self._envoyer(requete, 404, b'introuvable', {'Content-Type': 'text/plain'})
+            return
+
+        if self.taux_erreur and random.random() < self.taux_erreur:
+            status, en_tetes = random.choice(ERREURS)
+            self._envoyer(requete, status, b'erreur simulee', {**en_tetes, 'Content-Type': 'text/plain'})
+            return
+
+        try:
+            numero = int(morceaux[-1][:-len('.html')])
+            corps = self.page_liste(morceaux[0], int(morceaux[2]), numero) if liste else self.page(morceaux[0], numero, js)
+        except ValueError:
+            self._envoyer(requete, 404, b'introuvable', {'Content-Type': 'text/plain'})
+            return
+
+        etag = '"' + hashlib.md5(corps).hexdigest() + '"'
+        if requete.headers.get('If-None-Match') == etag:
+            self._envoyer(requete, 304, b'', {'ETag': etag})
+            return
+
+        self._envoyer(requete, 200, corps, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag})
+
+    @staticmethod
+    def _envoyer(requete, status, corps, en_tetes):
+        requete.send_response(status)
+        for nom, valeur in en_tetes.items():
+            requete.send_header(nom, valeur)
+        requete.send_header('Content-Length', str(len(corps)))
+        requete.end_headers()
+        if corps:
+            requete.wfile.write(corps)
+
+    def servir(self):
+        """Sert au premier plan jusqu'à arreter()"""
+        self._httpd.serve_forever()
+
+    def demarrer(self):
+        """Sert en arrière-plan (thread démon), retourne l'URL de base"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='serveur-fixtures', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def arreter(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def servir_processus(file_port, options):
+    """Point d'entrée multiprocessing: sert dans un processus séparé (pas de GIL partagé)"""
+    serveur = ServeurFixtures(**options)
+    file_port.put(serveur.port)
+    serveur.servir()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de fixtures pour les benchmarks TechPulse")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latence-ms', type=float, default=0)
+    parser.add_argument('--gigue-ms', type=float, default=0)
+    parser.add_argument('--taux-erreur', type=float, default=0.0)
+    parser.add_argument('--remplissage-ko', type=int, default=200)
+    args = parser.parse_args()
+
+    serveur = ServeurFixtures(args.port, args.latence_ms, args.gigue_ms, args.taux_erreur, args.remplissage_ko)
+    print(f"Fixtures servies sur {serveur.base_url} ({', '.join(url_produit(serveur.base_url, s, 1) for s in SITES)})")
+    try:
+        serveur.servir()
+    except KeyboardInterrupt:
+        serveur.arreter()
+
+
+if __name__ == '__main__':
+    main()
@@ -54,9 +54,9 @@ CREATE TABLE produits_techpulse (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Table des produits concurrents collectés
+-- Table des produits concurrents collectés (partitionnée par mois de collecte)
 CREATE TABLE produits_concurrents (
-    id_produit_concurrent SERIAL PRIMARY KEY,
+    id_produit_concurrent SERIAL,
     id_produit_techpulse INTEGER REFERENCES produits_techpulse(id_produit),
     id_site INTEGER REFERENCES sites_concurrents(id_site),
     url_produit VARCHAR(500) NOT NULL,
@@ -69,17 +69,15 @@ CREATE TABLE produits_concurrents (
     stock_affiche VARCHAR(50),
     note_moyenne DECIMAL(3,2),
     nombre_avis INTEGER DEFAULT 0,
-    date_collecte TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date_collecte TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     donnees_brutes JSONB, -- Stockage des données complètes en JSON
     checksum_produit VARCHAR(64), -- Hash pour détecter les changements
-    INDEX(date_collecte),
-    INDEX(id_produit_techpulse, date_collecte),
-    UNIQUE(id_site, url_produit, date_collecte::date)
-);
+    PRIMARY KEY(id_produit_concurrent, date_collecte)
+) PARTITION BY RANGE (date_collecte);
 
--- Table de l'historique des prix (optimisée pour les analytics)
+-- Table de l'historique des prix (optimisée pour les analytics, partitionnée par mois)
 CREATE TABLE historique_prix (
-    id_historique SERIAL PRIMARY KEY,
+    id_historique SERIAL,
     id_produit_techpulse INTEGER REFERENCES produits_techpulse(id_produit),
     id_site INTEGER REFERENCES sites_concurrents(id_site),
     prix_ttc DECIMAL(10,2) NOT NULL,
@@ -88,10 +86,12 @@ CREATE TABLE historique_prix (
     date_prix DATE NOT NULL,
     heure_collecte TIME DEFAULT CURRENT_TIME,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY(id_produit_techpulse, id_site, date_prix),
-    INDEX(date_prix),
-    INDEX(id_produit_techpulse, date_prix)
-);
+    PRIMARY KEY(id_produit_techpulse, id_site, date_prix)
+) PARTITION BY RANGE (date_prix);
+
+-- Partitions par défaut: aucune ligne perdue si une date tombe hors des partitions mensuelles
+CREATE TABLE produits_concurrents_defaut PARTITION OF produits_concurrents DEFAULT;
+CREATE TABLE historique_prix_defaut PARTITION OF historique_prix DEFAULT;
 
 -- Table des logs de collecte
 CREATE TABLE logs_collecte (
@@ -105,9 +105,7 @@ CREATE TABLE logs_collecte (
     message_erreur TEXT,
     details_execution JSONB,
     date_debut TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    date_fin TIMESTAMP,
-    INDEX(date_debut),
-    INDEX(id_site, date_debut)
+    date_fin TIMESTAMP
 );
 
 -- Table des alertes prix
@@ -122,9 +120,81 @@ CREATE TABLE alertes_prix (
     statut VARCHAR(20) DEFAULT 'nouveau', -- nouveau, traite, ignore
     date_alerte TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     date_traitement TIMESTAMP,
-    commentaire TEXT,
-    INDEX(date_alerte),
-    INDEX(statut, date_alerte)
+    commentaire TEXT
+);
+
+-- URL de chaque produit du catalogue chez chaque concurrent (désactiver plutôt que supprimer:
+-- les scrapers rafraîchissent leur instantané du catalogue par updated_at)
+CREATE TABLE urls_produits_concurrents (
+    id_produit_techpulse INTEGER NOT NULL REFERENCES produits_techpulse(id_produit),
+    id_site INTEGER NOT NULL REFERENCES sites_concurrents(id_site),
+    url_produit VARCHAR(500) NOT NULL,
+    actif BOOLEAN DEFAULT true,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(id_produit_techpulse, id_site)
+);
+
+-- Rapprochement des offres concurrentes avec le catalogue, par (site, URL)
+-- methode: ean, jetons (similarité des noms) ou manuel (jamais remplacé par le moteur)
+CREATE TABLE rapprochements_concurrents (
+    id_site INTEGER NOT NULL REFERENCES sites_concurrents(id_site),
+    url_produit VARCHAR(500) NOT NULL,
+    id_produit_techpulse INTEGER NOT NULL REFERENCES produits_techpulse(id_produit),
+    methode VARCHAR(20) NOT NULL,
+    score DECIMAL(4,3),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(id_site, url_produit)
+);
+
+-- Planification des collectes par (produit, site): intervalle selon la priorité et la volatilité du prix
+CREATE TABLE planification_collecte (
+    id_produit_techpulse INTEGER NOT NULL REFERENCES produits_techpulse(id_produit),
+    id_site INTEGER NOT NULL REFERENCES sites_concurrents(id_site),
+    intervalle_heures DECIMAL(6,2), -- NULL tant que recalculer_planification() ne l'a pas fixé
+    taux_changement DECIMAL(4,3), -- part des jours où le prix a changé (fenêtre de recalcul)
+    derniere_collecte TIMESTAMP,
+    prochaine_collecte TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(id_produit_techpulse, id_site)
+);
+
+-- Dernier prix connu par (produit, site), tenu à jour à l'ingestion
+-- L'écart avec le prix TechPulse est calculé à l'écriture, pas à chaque lecture
+-- derniere_vue avance aussi quand la collecte est inchangée (aucune ligne écrite, date_collecte fixe)
+CREATE TABLE derniers_prix_concurrents (
+    id_produit_techpulse INTEGER NOT NULL REFERENCES produits_techpulse(id_produit),
+    id_site INTEGER NOT NULL REFERENCES sites_concurrents(id_site),
+    id_produit_concurrent INTEGER NOT NULL, -- ligne source dans produits_concurrents
+    url_produit VARCHAR(500) NOT NULL,
+    nom_produit_concurrent VARCHAR(255),
+    prix_ttc DECIMAL(10,2) NOT NULL,
+    prix_promotion DECIMAL(10,2),
+    en_promotion BOOLEAN DEFAULT false,
+    disponible BOOLEAN DEFAULT true,
+    note_moyenne DECIMAL(3,2),
+    nombre_avis INTEGER DEFAULT 0,
+    date_collecte TIMESTAMP NOT NULL,
+    prix_techpulse DECIMAL(10,2),
+    ecart_pourcentage DECIMAL(7,2),
+    derniere_vue TIMESTAMP NOT NULL,
+    PRIMARY KEY(id_produit_techpulse, id_site)
+);
+
+-- Agrégats quotidiens de collecte par site (rapport quotidien, tendances)
+-- Cumulés à l'ingestion; le prix moyen se déduit de somme_prix / nb_prix
+-- Tous les produits collectés y sont comptés, inchangés compris (aucune ligne écrite, valeurs de la collecte)
+CREATE TABLE resume_collecte_quotidien (
+    jour DATE NOT NULL,
+    id_site INTEGER NOT NULL REFERENCES sites_concurrents(id_site),
+    nb_produits INTEGER NOT NULL DEFAULT 0,
+    nb_inchanges INTEGER NOT NULL DEFAULT 0, -- dont produits identiques à leur dernière écriture
+    nb_prix INTEGER NOT NULL DEFAULT 0,
+    somme_prix DECIMAL(14,2) NOT NULL DEFAULT 0,
+    prix_min DECIMAL(10,2),
+    prix_max DECIMAL(10,2),
+    nb_promotions INTEGER NOT NULL DEFAULT 0,
+    nb_disponibles INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(jour, id_site)
 );
 
 -- Données initiales
@@ -157,42 +227,319 @@ INSERT INTO produits_techpulse (reference_interne, nom_produit, id_categorie, id
 CREATE INDEX idx_produits_concurrents_collecte ON produits_concurrents(date_collecte DESC);
 CREATE INDEX idx_historique_prix_date ON historique_prix(date_prix DESC);
 CREATE INDEX idx_logs_collecte_site_date ON logs_collecte(id_site, date_debut DESC);
+CREATE INDEX idx_produits_concurrents_produit_date ON produits_concurrents(id_produit_techpulse, date_collecte);
+CREATE INDEX idx_produits_concurrents_site_url ON produits_concurrents(id_site, url_produit, date_collecte);
+CREATE INDEX idx_historique_prix_produit_date ON historique_prix(id_produit_techpulse, date_prix);
+CREATE INDEX idx_logs_collecte_date ON logs_collecte(date_debut);
+CREATE INDEX idx_alertes_prix_date ON alertes_prix(date_alerte);
+CREATE INDEX idx_alertes_prix_statut_date ON alertes_prix(statut, date_alerte);
+CREATE INDEX idx_produits_techpulse_maj ON produits_techpulse(updated_at);
+CREATE INDEX idx_urls_produits_concurrents_maj ON urls_produits_concurrents(updated_at);
+CREATE INDEX idx_planification_collecte_site_prochaine ON planification_collecte(id_site, prochaine_collecte);
+CREATE INDEX idx_derniers_prix_site_ecart ON derniers_prix_concurrents(id_site, ecart_pourcentage);
+CREATE INDEX idx_derniers_prix_site_url ON derniers_prix_concurrents(id_site, url_produit);
 
--- Vue pour les analyses de prix
+-- Vue pour les analyses de prix: dernier prix de chaque (produit, site) vu ces 7 derniers jours
+-- (lectures par clé primaire de derniers_prix_concurrents, sans parcourir la collecte).
+-- Filtre sur derniere_vue: un prix stable depuis plus de 7 jours reste affiché tant qu'il est collecté
 CREATE VIEW vue_comparaison_prix AS
 SELECT 
     pt.reference_interne,
     pt.nom_produit,
-    pt.prix_vente_ttc as prix_techpulse,
+    dp.prix_techpulse,
     sc.nom_site,
-    pc.prix_ttc as prix_concurrent,
-    pc.en_promotion,
-    pc.prix_promotion,
-    pc.note_moyenne,
-    pc.nombre_avis,
-    pc.date_collecte,
-    ROUND(((pc.prix_ttc - pt.prix_vente_ttc) / pt.prix_vente_ttc * 100), 2) as ecart_pourcentage
-FROM produits_techpulse pt
-JOIN produits_concurrents pc ON pt.id_produit = pc.id_produit_techpulse
-JOIN sites_concurrents sc ON pc.id_site = sc.id_site
-WHERE pc.date_collecte >= CURRENT_DATE - INTERVAL '7 days'
-ORDER BY pt.reference_interne, pc.date_collecte DESC;
-
--- Fonction pour nettoyer les anciennes données
-CREATE OR REPLACE FUNCTION nettoyer_anciennes_donnees()
+    dp.prix_ttc as prix_concurrent,
+    dp.en_promotion,
+    dp.prix_promotion,
+    dp.note_moyenne,
+    dp.nombre_avis,
+    dp.date_collecte,
+    dp.derniere_vue,
+    dp.ecart_pourcentage
+FROM derniers_prix_concurrents dp
+JOIN produits_techpulse pt ON pt.id_produit = dp.id_produit_techpulse
+JOIN sites_concurrents sc ON sc.id_site = dp.id_site
+WHERE dp.derniere_vue >= CURRENT_DATE - INTERVAL '7 days'
+ORDER BY pt.reference_interne, dp.date_collecte DESC;
+
+-- Écart en % d'un prix concurrent par rapport au prix TechPulse
+CREATE OR REPLACE FUNCTION ecart_prix(p_prix_concurrent DECIMAL, p_prix_techpulse DECIMAL)
+RETURNS DECIMAL AS $$
+    SELECT ROUND((p_prix_concurrent - p_prix_techpulse) / NULLIF(p_prix_techpulse, 0) * 100, 2);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Reconstruit derniers_prix_concurrents depuis produits_concurrents (amorçage, après un backfill massif)
+CREATE OR REPLACE FUNCTION reconstruire_derniers_prix()
+RETURNS INTEGER AS $$
+DECLARE
+    v_lignes INTEGER;
+BEGIN
+    TRUNCATE derniers_prix_concurrents;
+    INSERT INTO derniers_prix_concurrents (
+        id_produit_techpulse, id_site, id_produit_concurrent, url_produit, nom_produit_concurrent,
+        prix_ttc, prix_promotion, en_promotion, disponible, note_moyenne, nombre_avis,
+        date_collecte, prix_techpulse, ecart_pourcentage, derniere_vue
+    )
+    SELECT DISTINCT ON (pc.id_produit_techpulse, pc.id_site)
+        pc.id_produit_techpulse, pc.id_site, pc.id_produit_concurrent, pc.url_produit, pc.nom_produit_concurrent,
+        pc.prix_ttc, pc.prix_promotion, pc.en_promotion, pc.disponible, pc.note_moyenne, pc.nombre_avis,
+        pc.date_collecte, pt.prix_vente_ttc, ecart_prix(pc.prix_ttc, pt.prix_vente_ttc), pc.date_collecte
+    FROM produits_concurrents pc
+    JOIN produits_techpulse pt ON pt.id_produit = pc.id_produit_techpulse
+    WHERE pc.prix_ttc IS NOT NULL
+    ORDER BY pc.id_produit_techpulse, pc.id_site, pc.date_collecte DESC;
+    GET DIAGNOSTICS v_lignes = ROW_COUNT;
+    RETURN v_lignes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recalcule les agrégats quotidiens depuis produits_concurrents (après un backfill, ou pour amorcer)
+-- Les jours dont la collecte a été purgée gardent leurs agrégats.
+-- Les collectes inchangées n'ont pas de ligne: un jour recalculé ne compte plus que les lignes écrites
+CREATE OR REPLACE FUNCTION recalculer_resume_collecte(p_debut DATE, p_fin DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_lignes INTEGER;
+BEGIN
+    INSERT INTO resume_collecte_quotidien AS r (
+        jour, id_site, nb_produits, nb_prix, somme_prix, prix_min, prix_max, nb_promotions, nb_disponibles
+    )
+    SELECT date_collecte::date, id_site, COUNT(*), COUNT(prix_ttc), COALESCE(SUM(prix_ttc), 0), MIN(prix_ttc), MAX(prix_ttc),
+           COUNT(*) FILTER (WHERE en_promotion), COUNT(*) FILTER (WHERE disponible)
+    FROM produits_concurrents
+    WHERE date_collecte >= p_debut AND date_collecte < COALESCE(p_fin, p_debut) + 1
+    GROUP BY date_collecte::date, id_site
+    ON CONFLICT (jour, id_site) DO UPDATE SET
+        nb_produits = EXCLUDED.nb_produits,
+        nb_prix = EXCLUDED.nb_prix,
+        somme_prix = EXCLUDED.somme_prix,
+        prix_min = EXCLUDED.prix_min,
+        prix_max = EXCLUDED.prix_max,
+        nb_promotions = EXCLUDED.nb_promotions,
+        nb_disponibles = EXCLUDED.nb_disponibles,
+        nb_inchanges = 0;
+    GET DIAGNOSTICS v_lignes = ROW_COUNT;
+    RETURN v_lignes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Intervalle de collecte de base selon priorite_veille (heures)
+CREATE OR REPLACE FUNCTION intervalle_base(p_priorite VARCHAR)
+RETURNS DECIMAL AS $$
+    SELECT CASE p_priorite WHEN 'haute' THEN 6 WHEN 'faible' THEN 72 ELSE 24 END::decimal;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Intervalle de chaque (produit, site) suivi: base de la priorité x 2^(1 - 3 x taux de changement du prix),
+-- soit x2 pour un prix stable, x1 pour un changement tous les trois jours, /4 pour un changement quotidien
+-- (borné entre 1 heure et 7 jours). La prochaine collecte suit la dernière du nouvel intervalle.
+CREATE OR REPLACE FUNCTION recalculer_planification(p_fenetre INTERVAL DEFAULT '30 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_lignes INTEGER;
+BEGIN
+    INSERT INTO planification_collecte AS p (id_produit_techpulse, id_site, intervalle_heures, taux_changement)
+    SELECT
+        u.id_produit_techpulse,
+        u.id_site,
+        LEAST(GREATEST(intervalle_base(pt.priorite_veille) * POWER(2, 1 - 3 * COALESCE(v.taux_changement, 1.0 / 3)), 1), 168),
+        v.taux_changement
+    FROM urls_produits_concurrents u
+    JOIN produits_techpulse pt ON pt.id_produit = u.id_produit_techpulse
+    LEFT JOIN (
+        SELECT id_produit_techpulse, id_site,
+               (COUNT(*) FILTER (WHERE prix_ttc IS DISTINCT FROM precedent))::decimal / COUNT(*) AS taux_changement
+        FROM (
+            SELECT id_produit_techpulse, id_site, prix_ttc,
+                   LAG(prix_ttc) OVER (PARTITION BY id_produit_techpulse, id_site ORDER BY date_prix) AS precedent,
+                   ROW_NUMBER() OVER (PARTITION BY id_produit_techpulse, id_site ORDER BY date_prix) AS rang
+            FROM historique_prix
+            WHERE date_prix >= CURRENT_DATE - p_fenetre
+        ) jours
+        WHERE rang > 1
+        GROUP BY id_produit_techpulse, id_site
+    ) v ON v.id_produit_techpulse = u.id_produit_techpulse AND v.id_site = u.id_site
+    WHERE u.actif AND pt.actif
+    ON CONFLICT (id_produit_techpulse, id_site) DO UPDATE SET
+        intervalle_heures = EXCLUDED.intervalle_heures,
+        taux_changement = EXCLUDED.taux_changement,
+        prochaine_collecte = COALESCE(p.derniere_collecte + EXCLUDED.intervalle_heures * INTERVAL '1 hour', p.prochaine_collecte);
+    GET DIAGNOSTICS v_lignes = ROW_COUNT;
+    RETURN v_lignes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- updated_at suit chaque modification (rafraîchissement incrémental du catalogue des scrapers)
+CREATE OR REPLACE FUNCTION maj_updated_at()
+RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_produits_techpulse_updated_at
+BEFORE UPDATE ON produits_techpulse
+FOR EACH ROW EXECUTE FUNCTION maj_updated_at();
+
+CREATE TRIGGER trg_urls_produits_concurrents_updated_at
+BEFORE UPDATE ON urls_produits_concurrents
+FOR EACH ROW EXECUTE FUNCTION maj_updated_at();
+
+-- Un changement de prix TechPulse recalcule les écarts du produit (quelques lignes, une par site)
+CREATE OR REPLACE FUNCTION maj_ecart_derniers_prix()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE derniers_prix_concurrents
+    SET prix_techpulse = NEW.prix_vente_ttc,
+        ecart_pourcentage = ecart_prix(prix_ttc, NEW.prix_vente_ttc)
+    WHERE id_produit_techpulse = NEW.id_produit;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_produits_techpulse_prix_vente
+AFTER UPDATE OF prix_vente_ttc ON produits_techpulse
+FOR EACH ROW
+WHEN (OLD.prix_vente_ttc IS DISTINCT FROM NEW.prix_vente_ttc)
+EXECUTE FUNCTION maj_ecart_derniers_prix();
+
+-- Partitions mensuelles <table>_pAAAAMM à partir d'un mois donné (les existantes sont ignorées).
+-- Les lignes du mois déjà tombées dans la partition par défaut y sont déplacées avant l'attachement.
+CREATE OR REPLACE FUNCTION creer_partitions_mensuelles(p_table TEXT, p_debut DATE, p_nb_mois INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    v_cle TEXT := substring(pg_get_partkeydef(p_table::regclass) FROM '\((\w+)\)');
+    v_mois DATE;
+    v_fin DATE;
+    v_partition TEXT;
+    v_crees INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_nb_mois - 1 LOOP
+        v_mois := (date_trunc('month', p_debut) + make_interval(months => i))::date;
+        v_fin := (v_mois + INTERVAL '1 month')::date;
+        v_partition := format('%s_p%s', p_table, to_char(v_mois, 'YYYYMM'));
+        IF to_regclass(v_partition) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', v_partition, p_table);
+            EXECUTE format('WITH deplacees AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                           'INSERT INTO %I SELECT * FROM deplacees',
+                           p_table || '_defaut', v_cle, v_mois, v_cle, v_fin, v_partition);
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           p_table, v_partition, v_mois, v_fin);
+            v_crees := v_crees + 1;
+        END IF;
+    END LOOP;
+    RETURN v_crees;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mois courant et p_nb_mois suivants pour les deux tables partitionnées (tâche quotidienne)
+CREATE OR REPLACE FUNCTION creer_partitions_futures(p_nb_mois INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+BEGIN
+    RETURN creer_partitions_mensuelles('produits_concurrents', CURRENT_DATE, p_nb_mois + 1)
+         + creer_partitions_mensuelles('historique_prix', CURRENT_DATE, p_nb_mois + 1);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions mensuelles d'une table, avec leurs bornes (déduites du nom <table>_pAAAAMM)
+CREATE OR REPLACE FUNCTION partitions_mensuelles(p_table TEXT)
+RETURNS TABLE (nom_partition TEXT, debut DATE, fin DATE, compactee BOOLEAN) AS $$
+    SELECT c.relname::text,
+           to_date(right(c.relname, 6), 'YYYYMM'),
+           (to_date(right(c.relname, 6), 'YYYYMM') + INTERVAL '1 month')::date,
+           obj_description(c.oid, 'pg_class') = 'compacte_hebdo'
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = p_table::regclass
+      AND c.relname ~ ('^' || p_table || '_p[0-9]{6}$')
+    ORDER BY 2;
+$$ LANGUAGE sql STABLE;
+
+-- Rétention: détache et supprime les partitions entièrement antérieures à p_avant (pas de DELETE ni de VACUUM)
+CREATE OR REPLACE FUNCTION purger_partitions(p_table TEXT, p_avant DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_partition RECORD;
+    v_supprimees INTEGER := 0;
+BEGIN
+    FOR v_partition IN SELECT * FROM partitions_mensuelles(p_table) WHERE fin <= p_avant LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_table, v_partition.nom_partition);
+        EXECUTE format('DROP TABLE %I', v_partition.nom_partition);
+        v_supprimees := v_supprimees + 1;
+    END LOOP;
+    RETURN v_supprimees;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Compaction hebdomadaire de l'historique: pour chaque partition terminée avant p_avant, garde
+-- le dernier prix de chaque semaine par (produit, site). La partition est reconstruite puis
+-- échangée (pas de lignes mortes), et marquée pour ne pas être recompactée.
+CREATE OR REPLACE FUNCTION compacter_historique_hebdo(p_avant DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_partition RECORD;
+    v_compacte TEXT;
+    v_compactees INTEGER := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT * FROM partitions_mensuelles('historique_prix') WHERE fin <= p_avant AND compactee IS NOT TRUE
+    LOOP
+        v_compacte := v_partition.nom_partition || '_hebdo';
+        EXECUTE format('CREATE TABLE %I (LIKE historique_prix INCLUDING DEFAULTS)', v_compacte);
+        EXECUTE format($sql$
+            INSERT INTO %I
+            SELECT DISTINCT ON (id_produit_techpulse, id_site, date_trunc('week', date_prix)) *
+            FROM %I
+            ORDER BY id_produit_techpulse, id_site, date_trunc('week', date_prix), date_prix DESC
+        $sql$, v_compacte, v_partition.nom_partition);
+
+        EXECUTE format('ALTER TABLE historique_prix DETACH PARTITION %I', v_partition.nom_partition);
+        EXECUTE format('DROP TABLE %I', v_partition.nom_partition);
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', v_compacte, v_partition.nom_partition);
+        EXECUTE format('ALTER TABLE historique_prix ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       v_partition.nom_partition, v_partition.debut, v_partition.fin);
+        EXECUTE format('COMMENT ON TABLE %I IS %L', v_partition.nom_partition, 'compacte_hebdo');
+        v_compactees := v_compactees + 1;
+    END LOOP;
+    RETURN v_compactees;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fonction pour nettoyer les anciennes données (rétention par partitions entières)
+CREATE OR REPLACE FUNCTION nettoyer_anciennes_donnees(
+    p_retention_collecte INTERVAL DEFAULT '1 year',
+    p_compaction_historique INTERVAL DEFAULT '3 months',
+    p_retention_historique INTERVAL DEFAULT NULL -- NULL: historique compacté conservé
+)
 RETURNS void AS $$
+DECLARE
+    v_collecte INTEGER;
+    v_compactees INTEGER;
+    v_historique INTEGER := 0;
+    v_logs INTEGER;
 BEGIN
-    -- Supprimer les données de collecte de plus de 1 an
-    DELETE FROM produits_concurrents 
-    WHERE date_collecte < CURRENT_DATE - INTERVAL '1 year';
+    -- Supprimer les mois de collecte de plus de 1 an (et les rares lignes hors partitions mensuelles)
+    v_collecte := purger_partitions('produits_concurrents', (CURRENT_DATE - p_retention_collecte)::date);
+    DELETE FROM produits_concurrents_defaut
+    WHERE date_collecte < CURRENT_DATE - p_retention_collecte;
     
     -- Supprimer les logs de plus de 6 mois
     DELETE FROM logs_collecte 
     WHERE date_debut < CURRENT_DATE - INTERVAL '6 months';
+    GET DIAGNOSTICS v_logs = ROW_COUNT;
     
     -- Compacter l'historique des prix (garder 1 prix par semaine pour les données anciennes)
-    -- Cette fonction sera détaillée selon les besoins
+    v_compactees := compacter_historique_hebdo((CURRENT_DATE - p_compaction_historique)::date);
+    IF p_retention_historique IS NOT NULL THEN
+        v_historique := purger_partitions('historique_prix', (CURRENT_DATE - p_retention_historique)::date);
+        DELETE FROM historique_prix_defaut
+        WHERE date_prix < CURRENT_DATE - p_retention_historique;
+    END IF;
     
-    RAISE NOTICE 'Nettoyage terminé';
+    RAISE NOTICE 'Nettoyage terminé: % partitions de collecte supprimées, % logs supprimés, % partitions d''historique compactées, % supprimées',
+        v_collecte, v_logs, v_compactees, v_historique;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+-- Partitions du mois courant et des 3 suivants
+SELECT creer_partitions_futures(3);
@@ -0,0 +1,244 @@
+# scrapers/archive_pages.py
+"""
+Archive locale des pages HTML brutes, adressée par contenu (SHA-256) et compressée en zstd
+Index SQLite par (site, URL, date) et rejeu d'une journée sans requête réseau
+
+Usage: python archive_pages.py stats
+       python archive_pages.py rejouer 2024-06-12 [--sans-ecriture]
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime, date, time as heure, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHEMIN_ARCHIVE_DEFAUT = os.path.join(os.path.expanduser('~'), '.cache', 'techpulse', 'archive')
+NIVEAU_ZSTD = int(os.getenv('TECHPULSE_ARCHIVE_NIVEAU', '3'))
+
+# En-têtes posés sur les réponses: date de la capture rejouée, empreinte de la page archivée
+EN_TETE_DATE_ARCHIVE = 'X-TechPulse-Archive'
+EN_TETE_EMPREINTE = 'X-TechPulse-Empreinte'
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def archive_partagee():
+    """Archive du processus (TECHPULSE_ARCHIVE vide ou zstandard absent: None)"""
+    global _archive
+    chemin = os.getenv('TECHPULSE_ARCHIVE', CHEMIN_ARCHIVE_DEFAUT)
+    if not chemin or zstandard is None:
+        return None
+
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                try:
+                    _archive = ArchivePages(chemin)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"⚠️  Archive {chemin} indisponible: {e}")
+                    return None
+    return _archive
+
+
+def date_archive(response):
+    """Date de capture d'une réponse rejouée depuis l'archive, None pour une réponse réseau"""
+    valeur = response.headers.get(EN_TETE_DATE_ARCHIVE)
+    return datetime.fromisoformat(valeur) if valeur else None
+
+
+def empreinte_archive(response):
+    """Empreinte de la page archivée (ou rejouée) pour cette réponse, None sinon"""
+    return response.headers.get(EN_TETE_EMPREINTE)
+
+
+class EcriturePage:
+    """Page en cours d'archivage: compressée et hachée au fil des morceaux, sans tout garder en mémoire"""
+
+    def __init__(self, archive, site, url, content_type):
+        self.archive = archive
+        self.site = site
+        self.url = url
+        self.content_type = content_type
+        self.date_collecte = datetime.now()
+        self.taille = 0
+        self._empreinte = hashlib.sha256()
+        self._compresseur = zstandard.ZstdCompressor(level=NIVEAU_ZSTD).compressobj()
+        descripteur, self._chemin_temporaire = tempfile.mkstemp(dir=archive.dossier_temporaire, suffix='.zst')
+        self._fichier = os.fdopen(descripteur, 'wb')
+
+    def ajouter(self, morceau):
+        self.taille += len(morceau)
+        self._empreinte.update(morceau)
+        self._fichier.write(self._compresseur.compress(morceau))
+
+    def terminer(self, tronque=False):
+        """Range l'objet sous son empreinte (ou l'abandonne s'il existe déjà) et l'indexe"""
+        self._fichier.write(self._compresseur.flush())
+        self._fichier.close()
+
+        empreinte = self._empreinte.hexdigest()
+        chemin = self.archive.chemin_objet(empreinte)
+        if os.path.exists(chemin):
+            os.unlink(self._chemin_temporaire)
+            self.archive.stats['dedupliquees'] += 1
+        else:
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+            os.replace(self._chemin_temporaire, chemin)
+            self.archive.stats['objets_ecrits'] += 1
+
+        self.archive.indexer(self.site, self.url, self.date_collecte, empreinte, self.taille, tronque, self.content_type)
+        return empreinte
+
+    def abandonner(self):
+        """Lecture interrompue: rien n'est indexé"""
+        self._fichier.close()
+        if os.path.exists(self._chemin_temporaire):
+            os.unlink(self._chemin_temporaire)
+
+
+class ArchivePages:
+    """Objets zstd rangés par empreinte (objets/ab/abcd….zst) et index SQLite des captures"""
+
+    def __init__(self, chemin=None):
+        self.chemin = chemin or os.getenv('TECHPULSE_ARCHIVE') or CHEMIN_ARCHIVE_DEFAUT
+        self.dossier_objets = os.path.join(self.chemin, 'objets')
+        self.dossier_temporaire = os.path.join(self.chemin, 'tmp')
+        os.makedirs(self.dossier_objets, exist_ok=True)
+        os.makedirs(self.dossier_temporaire, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.chemin, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS captures (
+                id INTEGER PRIMARY KEY,
+                site TEXT NOT NULL,
+                url TEXT NOT NULL,
+                date_collecte TEXT NOT NULL,
+                empreinte TEXT NOT NULL,
+                taille INTEGER NOT NULL,
+                tronque INTEGER NOT NULL DEFAULT 0,
+                content_type TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_captures_site_url_date ON captures (site, url, date_collecte);
+            CREATE INDEX IF NOT EXISTS idx_captures_date ON captures (date_collecte);
+        """)
+        self._conn.commit()
+
+        self.stats = {'objets_ecrits': 0, 'dedupliquees': 0}
+
+    def chemin_objet(self, empreinte):
+        return os.path.join(self.dossier_objets, empreinte[:2], f"{empreinte}.zst")
+
+    def ecriture(self, site, url, content_type=None):
+        """Nouvelle page à archiver morceau par morceau"""
+        return EcriturePage(self, site, url, content_type)
+
+    def indexer(self, site, url, date_collecte, empreinte, taille, tronque=False, content_type=None):
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO captures (site, url, date_collecte, empreinte, taille, tronque, content_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (site, url, date_collecte.isoformat(), empreinte, taille, int(tronque), content_type))
+            self._conn.commit()
+
+    def trouver(self, site, url, jour=None):
+        """Dernière capture d'une URL (du jour donné s'il est précisé), None si absente"""
+        requete = "SELECT * FROM captures WHERE site = ? AND url = ?"
+        parametres = [site, url]
+        if jour is not None:
+            requete += " AND date_collecte >= ? AND date_collecte < ?"
+            parametres += self._bornes_jour(jour)
+        with self._lock:
+            return self._conn.execute(requete + " ORDER BY date_collecte DESC LIMIT 1", parametres).fetchone()
+
+    def captures_periode(self, debut, fin, site=None):
+        """Toutes les captures entre deux instants (fin exclue), par date"""
+        requete = "SELECT * FROM captures WHERE date_collecte >= ? AND date_collecte < ?"
+        parametres = [debut.isoformat(), fin.isoformat()]
+        if site:
+            requete += " AND site = ?"
+            parametres.append(site)
+        with self._lock:
+            return self._conn.execute(requete + " ORDER BY date_collecte", parametres).fetchall()
+
+    def captures_du_jour(self, jour, site=None):
+        """Dernière capture de chaque URL pour un jour (et un site)"""
+        requete = """
+            SELECT * FROM captures WHERE id IN (
+                SELECT MAX(id) FROM captures
+                WHERE date_collecte >= ? AND date_collecte < ?{filtre_site}
+                GROUP BY site, url
+            ) ORDER BY site, url
+        """.format(filtre_site=" AND site = ?" if site else "")
+        parametres = self._bornes_jour(jour) + ([site] if site else [])
+        with self._lock:
+            return self._conn.execute(requete, parametres).fetchall()
+
+    @staticmethod
+    def _bornes_jour(jour):
+        debut = datetime.combine(jour, heure.min)
+        return [debut.isoformat(), (debut + timedelta(days=1)).isoformat()]
+
+    def ouvrir(self, empreinte):
+        """Flux décompressé d'un objet (fichier-like, lu par morceaux)"""
+        return zstandard.ZstdDecompressor().stream_reader(open(self.chemin_objet(empreinte), 'rb'))
+
+    def lire(self, empreinte):
+        """Contenu complet d'un objet"""
+        with self.ouvrir(empreinte) as flux:
+            return flux.read()
+
+    def resume(self):
+        """Volume de l'archive: captures, objets distincts, octets bruts et compressés"""
+        with self._lock:
+            captures, objets, octets = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT empreinte), COALESCE(SUM(taille), 0) FROM captures"
+            ).fetchone()
+        compresses = sum(
+            os.path.getsize(os.path.join(dossier, nom))
+            for dossier, _, fichiers in os.walk(self.dossier_objets)
+            for nom in fichiers
+        )
+        return {'captures': captures, 'objets': objets, 'octets_bruts': octets, 'octets_compresses': compresses}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Archive des pages brutes TechPulse")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+    commandes.add_parser('stats', help="volume de l'archive")
+    rejeu = commandes.add_parser('rejouer', help="réextraire les pages Cdiscount d'une journée depuis l'archive")
+    rejeu.add_argument('jour', type=date.fromisoformat)
+    rejeu.add_argument('--sans-ecriture', action='store_true', help="extraire sans écrire en base")
+    args = parser.parse_args()
+
+    if args.commande == 'stats':
+        resume = ArchivePages().resume()
+        ratio = resume['octets_bruts'] / resume['octets_compresses'] if resume['octets_compresses'] else 0
+        print(f"{resume['captures']} captures, {resume['objets']} objets distincts, "
+              f"{resume['octets_bruts'] / 1e6:.1f} Mo bruts -> {resume['octets_compresses'] / 1e6:.1f} Mo (x{ratio:.1f})")
+        return
+
+    from cdiscount_scraper import CdiscountScraperV2
+
+    scraper = CdiscountScraperV2(rejeu=args.jour)
+    resultats = scraper.rejouer_journee(ecrire=not args.sans_ecriture)
+    print(f"{resultats['extraits']}/{resultats['pages']} pages réextraites, {resultats['ecrits']} lignes écrites")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+# scrapers/backend_scrapy.py
+"""
+Backend de collecte Scrapy: un spider par site, tous servis par le même téléchargeur Twisted
+AutoThrottle démarré au délai de sites_concurrents.delai_requete_sec, items écrits par lots (IngestionBatch)
+Comme la couche fetch: seau à jetons partagé du site, disjoncteur, requêtes conditionnelles (cache HTTP)
+et archive des pages
+"""
+
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+try:
+    import scrapy
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.exceptions import IgnoreRequest
+except ImportError:  # backend scrapy indisponible
+    scrapy = None
+
+from document_page import DocumentPage, charset_content_type
+from extraction_lxml import moteur_extraction, disponibilite_texte, extraire_ean
+from couche_fetch import TENTATIVES, TAILLE_MAX_PAGE, STATUTS_A_RETENTER
+from metriques import mesurer_parse, observer_reponse
+
+logger = logging.getLogger(__name__)
+
+# CrawlerRunner ne configure pas les logs: ceux de Scrapy passent par le logging de l'application
+logging.getLogger('scrapy').setLevel(logging.WARNING)
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# Réglages communs à tous les spiders (délai et concurrence ajoutés par site)
+REGLAGES_SCRAPY = {
+    'USER_AGENT': USER_AGENT,
+    'DEFAULT_REQUEST_HEADERS': {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8'
+    },
+    'ROBOTSTXT_OBEY': False,
+    'COOKIES_ENABLED': False,
+    'TELNETCONSOLE_ENABLED': False,
+    'DOWNLOAD_TIMEOUT': 15,
+    'DOWNLOAD_MAXSIZE': TAILLE_MAX_PAGE,
+    # Mêmes reprises que la couche fetch
+    'RETRY_TIMES': TENTATIVES - 1,
+    'RETRY_HTTP_CODES': sorted(STATUTS_A_RETENTER),
+    # Le délai du site est un minimum: pas de tirage entre 0,5x et 1,5x
+    'RANDOMIZE_DOWNLOAD_DELAY': False,
+    'AUTOTHROTTLE_ENABLED': True,
+    'AUTOTHROTTLE_MAX_DELAY': 60,
+    # Une page produit donne un seul item (le défaut, 100, lance 100 tâches coopératives par réponse)
+    'CONCURRENT_ITEMS': 1,
+    'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7'
+}
+
+_reacteur_lock = threading.Lock()
+_reacteur_thread = None
+
+
+def reglages_site(delai, concurrence):
+    """Réglages d'un spider: AutoThrottle part du délai du site sans descendre en dessous"""
+    return dict(
+        REGLAGES_SCRAPY,
+        DOWNLOAD_DELAY=delai,
+        AUTOTHROTTLE_START_DELAY=delai,
+        AUTOTHROTTLE_TARGET_CONCURRENCY=float(concurrence),
+        CONCURRENT_REQUESTS_PER_DOMAIN=concurrence,
+        # Après RetryMiddleware (550): chaque tentative passe par le disjoncteur, puis prend un jeton
+        DOWNLOADER_MIDDLEWARES={MiddlewareDisjoncteur: 555, MiddlewareLimiteur: 560},
+        ITEM_PIPELINES={PipelineIngestion: 300}
+    )
+
+
+def _reponse_cache(response):
+    """Statut et validateurs d'une réponse Scrapy, sous la forme lue par CacheHTTP (réponse requests)"""
+    return SimpleNamespace(status_code=response.status, headers={
+        nom: response.headers.get(nom).decode('latin-1') for nom in ('ETag', 'Last-Modified') if response.headers.get(nom)
+    })
+
+
+class MiddlewareLimiteur:
+    """Jeton du seau de l'hôte (LimiteurDebit de la couche fetch, partagé via Redis) avant chaque tentative
+
+    Le délai de Scrapy ne vaut que pour son processus: sans le seau, les shards d'un même site
+    lancés sur plusieurs workers multiplieraient le débit configuré.
+    """
+
+    async def process_request(self, request, spider):
+        if spider.limiteur is None:
+            return None
+        from twisted.internet import reactor, task, threads
+
+        # Réservation (aller-retour Redis) hors du réacteur, attente sans bloquer les autres sites
+        attente = await threads.deferToThread(spider.limiteur.reserver, request.url)
+        if attente > 0:
+            await task.deferLater(reactor, attente, lambda: None)
+        return None
+
+
+class MiddlewareDisjoncteur:
+    """Disjoncteur du site (celui de la couche fetch): requête refusée s'il est ouvert, issue de chaque tentative comptée"""
+
+    def process_request(self, request, spider):
+        if spider.disjoncteur is not None and not spider.disjoncteur.autoriser():
+            raise IgnoreRequest(f"Disjoncteur {spider.name} ouvert: {request.url} non demandé")
+        return None
+
+    def process_response(self, request, response, spider):
+        if spider.disjoncteur is not None:
+            if response.status in STATUTS_A_RETENTER:
+                spider.disjoncteur.echec(response.status)
+            else:
+                spider.disjoncteur.succes()
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # IgnoreRequest: refus du disjoncteur lui-même, pas un échec du site
+        if spider.disjoncteur is not None and not isinstance(exception, IgnoreRequest):
+            spider.disjoncteur.echec()
+        return None
+
+
+class PipelineIngestion:
+    """Items ajoutés au lot d'ingestion du spider; lots pleins écrits hors du thread du réacteur"""
+
+    def open_spider(self, spider):
+        from twisted.internet import threads
+
+        # Ajout au tampon sur le réacteur (quelques µs), écriture d'un lot dans le pool de threads de Twisted
+        self.ecritures = []
+        spider.lot.ecriture_differee = lambda flush: self.ecritures.append(threads.deferToThread(flush))
+
+    def process_item(self, item, spider):
+        spider.lot.ajouter(item, spider.donnees_brutes(item), item.get('id_produit_techpulse'))
+        return item
+
+    def close_spider(self, spider):
+        from twisted.internet import defer, threads
+
+        # Reliquat du site écrit, et lots en cours terminés, avant la fin du crawl
+        self.ecritures.append(threads.deferToThread(spider.lot.flush))
+        return defer.DeferredList(self.ecritures)
+
+
+class SpiderProduits(scrapy.Spider if scrapy is not None else object):
+    """Pages produit d'un site (URLs du catalogue), extraites avec les sélecteurs lxml partagés"""
+
+    name = None
+    # 304 des requêtes conditionnelles remis à parse (écartés par défaut comme les autres statuts non 2xx)
+    handle_httpstatus_list = [304]
+
+    def __init__(self, produits=(), lot=None, download_delay=0, limiteur=None, disjoncteur=None, cache_http=None,
+                 archive=None, **kwargs):
+        super().__init__(**kwargs)
+        self.produits = produits
+        self.lot = lot
+        # Délai minimal d'AutoThrottle (attribut lu par Scrapy à l'ouverture du spider)
+        self.download_delay = download_delay
+        # Limiteur, disjoncteur, cache HTTP et archive de la couche fetch (None: désactivé)
+        self.limiteur = limiteur
+        self.disjoncteur = disjoncteur
+        self.cache_http = cache_http
+        self.archive = archive
+        self.erreurs = 0
+
+    def start_requests(self):
+        for produit in self.produits:
+            url = produit['urls'][self.name]
+            yield scrapy.Request(
+                url,
+                headers=self.cache_http.en_tetes_conditionnels(url) if self.cache_http is not None else None,
+                callback=self.parse,
+                errback=self.echec,
+                cb_kwargs={'produit': produit},
+                dont_filter=True
+            )
+
+    def parse(self, response, produit):
+        """Item de la page (retourné et non produit par yield: Scrapy relit le source de chaque callback générateur)"""
+        url = produit['urls'][self.name]
+        observer_reponse(self.name, response.meta.get('download_latency', 0), response.status, len(response.body))
+
+        # Page inchangée depuis la dernière collecte: enregistrement mémorisé
+        product_data = None
+        if self.cache_http is not None:
+            product_data = self.cache_http.reponse_en_cache(url, _reponse_cache(response))
+        if product_data is None:
+            content_type = response.headers.get('Content-Type', b'').decode('latin-1')
+            self.archiver(response, content_type)
+            with mesurer_parse(self.name):
+                doc = DocumentPage(response.body, charset_content_type(content_type), response.url)
+                product_data = self.extraire_produit(doc, url)
+
+            if product_data['prix_ttc'] is None:
+                logger.warning(f"⚠️  {self.name}: prix introuvable sur {response.url}")
+                self.erreurs += 1
+                return None
+            if self.cache_http is not None:
+                self.cache_http.memoriser(url, _reponse_cache(response), product_data)
+
+        product_data['id_produit_techpulse'] = produit.get('id_produit')
+        return product_data
+
+    def archiver(self, response, content_type):
+        """Corps d'une page 200 rangé dans l'archive (au-delà de DOWNLOAD_MAXSIZE Scrapy abandonne la page)"""
+        if self.archive is None or response.status != 200:
+            return
+        ecriture = self.archive.ecriture(self.name, response.url, content_type or None)
+        try:
+            ecriture.ajouter(response.body)
+            ecriture.terminer()
+        except Exception as e:
+            ecriture.abandonner()
+            logger.warning(f"⚠️  {self.name}: archivage de {response.url} impossible ({e})")
+
+    def echec(self, failure):
+        logger.warning(f"⚠️  {self.name}: {failure.request.url} en échec ({failure.getErrorMessage()})")
+        self.erreurs += 1
+
+    def extraire_produit(self, doc, url):
+        """Enregistrement produit (mêmes champs que les scrapers requests)"""
+        nom = moteur_extraction.extraire_nom(doc.tree, self.name) or doc.titre[:255] or "Nom non trouvé"
+        product_data = {
+            'url': url,
+            'nom_produit': nom,
+            'prix_ttc': moteur_extraction.extraire_prix(doc.tree, self.name),
+            'prix_promotion': None,
+            'en_promotion': False,
+            'disponible': disponibilite_texte(doc.texte_minuscule),
+            'note_moyenne': None,
+            'nombre_avis': None,
+            'stock_affiche': "Non spécifié",
+            'ean': extraire_ean(doc.tree),
+            'date_collecte': datetime.now()
+        }
+        data_string = f"{product_data['nom_produit']}_{product_data['prix_ttc']}_{product_data['disponible']}"
+        product_data['checksum_produit'] = hashlib.md5(data_string.encode()).hexdigest()
+        return product_data
+
+    @staticmethod
+    def donnees_brutes(product_data):
+        return {
+            'methode_collecte': 'scrapy',
+            'scraping_timestamp': product_data['date_collecte'].isoformat()
+        }
+
+
+class SpiderCdiscount(SpiderProduits):
+    name = 'cdiscount'
+
+
+class SpiderRueducommerce(SpiderProduits):
+    name = 'rueducommerce'
+
+
+class SpiderBoulanger(SpiderProduits):
+    name = 'boulanger'
+
+
+SPIDERS = {spider.name: spider for spider in (SpiderCdiscount, SpiderRueducommerce, SpiderBoulanger)}
+
+
+def _reacteur():
+    """Réacteur Twisted tournant dans un thread du processus (démarré une fois: il ne redémarre pas)"""
+    global _reacteur_thread
+    from twisted.internet import reactor
+
+    with _reacteur_lock:
+        if _reacteur_thread is None:
+            _reacteur_thread = threading.Thread(
+                target=reactor.run, kwargs={'installSignalHandlers': False}, name='reacteur-scrapy', daemon=True
+            )
+            _reacteur_thread.start()
+    return reactor
+
+
+def crawler_sites(produits_par_site, lots, delais, concurrence_par_site, fetch=None, cache_http=None):
+    """Lance un spider par site, tous en même temps, et attend la fin du dernier
+
+    produits_par_site et lots: par nom de site; delais: delai_requete_sec par site.
+    fetch: couche fetch dont les spiders reprennent limiteur de débit, disjoncteurs et archive;
+    cache_http: validateurs ETag / Last-Modified des requêtes conditionnelles.
+    Retourne les spiders terminés par site (erreurs, stats Scrapy).
+    """
+    if scrapy is None:
+        raise RuntimeError("backend scrapy indisponible (scrapy non installé)")
+
+    from twisted.internet import defer, threads
+
+    reactor = _reacteur()
+    crawlers = {}
+
+    def lancer():
+        differes = []
+        for site_name, produits in produits_par_site.items():
+            runner = CrawlerRunner(reglages_site(delais[site_name], concurrence_par_site.get(site_name, 2)))
+            crawlers[site_name] = runner.create_crawler(SPIDERS[site_name])
+            differes.append(runner.crawl(
+                crawlers[site_name], produits=produits, lot=lots[site_name], download_delay=delais[site_name],
+                limiteur=fetch.limiteur if fetch is not None else None,
+                disjoncteur=fetch.disjoncteur(site_name) if fetch is not None else None,
+                cache_http=cache_http,
+                archive=fetch.archive if fetch is not None else None
+            ))
+        return defer.DeferredList(differes, consumeErrors=True)
+
+    logger.info(f"🕷️ Crawl Scrapy: {', '.join(f'{site} ({delais[site]}s)' for site in produits_par_site)}")
+    for site_name, (ok, resultat) in zip(produits_par_site, threads.blockingCallFromThread(reactor, lancer)):
+        if not ok:
+            logger.error(f"❌ Spider {site_name} interrompu: {resultat.getErrorMessage()}")
+
+    spiders = {}
+    for site_name, crawler in crawlers.items():
+        spiders[site_name] = crawler.spider
+        stats = crawler.stats.get_stats()
+        logger.info(f"🕷️ {site_name}: {stats.get('downloader/response_count', 0)} réponses, "
+                    f"{stats.get('retry/count', 0)} reprises, {stats.get('item_scraped_count', 0)} items")
+    return spiders
@@ -0,0 +1,247 @@
+# scrapers/backfill.py
+"""
+Réextraction hors ligne des pages archivées avec les extracteurs actuels
+Pool multiprocessing, diff avec produits_concurrents, mise à jour groupée des seules lignes changées
+
+Usage: python backfill.py --depuis 2024-05-01 --jusqu-a 2024-06-30 [--processus 8] [--simulation]
+"""
+
+import os
+import time
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime, date, time as heure, timedelta
+
+from psycopg2.extras import execute_values
+
+from db_pool import connexion_db
+from archive_pages import ArchivePages
+from document_page import DocumentPage, charset_content_type
+
+logger = logging.getLogger(__name__)
+
+# Sites dont les lignes viennent d'un vrai extracteur (même id que CdiscountScraperV2.site_id)
+SITES_EXTRACTEURS = {'cdiscount': 1}
+
+TAILLE_LOT_MAJ = 1000
+
+SELECT_LIGNES_JOUR = """
+    SELECT id_produit_concurrent, id_produit_techpulse, url_produit, date_collecte,
+           nom_produit_concurrent, prix_ttc, disponible, donnees_brutes->>'empreinte_page'
+    FROM produits_concurrents
+    WHERE id_site = %s AND date_collecte >= %s AND date_collecte < %s
+"""
+
+UPDATE_PRODUITS = """
+    UPDATE produits_concurrents pc SET
+        nom_produit_concurrent = v.nom,
+        prix_ttc = v.prix,
+        disponible = v.disponible,
+        checksum_produit = v.checksum
+    FROM (VALUES %s) AS v(id, date_collecte, nom, prix, disponible, checksum)
+    WHERE pc.id_produit_concurrent = v.id AND pc.date_collecte = v.date_collecte
+"""
+
+# historique_prix garde la dernière collecte du jour: recalculée pour les (produit, site, jour) touchés
+UPDATE_HISTORIQUE = """
+    UPDATE historique_prix h SET prix_ttc = d.prix_ttc
+    FROM (
+        SELECT DISTINCT ON (pc.id_produit_techpulse, pc.id_site, k.jour)
+               pc.id_produit_techpulse, pc.id_site, k.jour, pc.prix_ttc
+        FROM (VALUES %s) AS k(id_produit, id_site, jour)
+        JOIN produits_concurrents pc
+          ON pc.id_produit_techpulse = k.id_produit AND pc.id_site = k.id_site
+         AND pc.date_collecte >= k.jour AND pc.date_collecte < k.jour + 1
+        WHERE pc.prix_ttc IS NOT NULL
+        ORDER BY pc.id_produit_techpulse, pc.id_site, k.jour, pc.date_collecte DESC
+    ) d
+    WHERE h.id_produit_techpulse = d.id_produit_techpulse AND h.id_site = d.id_site
+      AND h.date_prix = d.jour AND h.prix_ttc IS DISTINCT FROM d.prix_ttc
+"""
+
+# Le dernier prix connu suit sa ligne source quand elle est corrigée
+UPDATE_DERNIERS_PRIX = """
+    UPDATE derniers_prix_concurrents dp SET
+        nom_produit_concurrent = v.nom,
+        prix_ttc = v.prix,
+        disponible = v.disponible,
+        ecart_pourcentage = ecart_prix(v.prix, dp.prix_techpulse)
+    FROM (VALUES %s) AS v(id, date_collecte, nom, prix, disponible, checksum)
+    WHERE dp.id_produit_concurrent = v.id AND dp.date_collecte = v.date_collecte
+"""
+
+# État d'un processus du pool: un extracteur et une archive ouverts une seule fois
+_processus = {}
+
+
+def _initialiser_processus(chemin_archive):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    os.environ['TECHPULSE_ARCHIVE'] = ''  # les extracteurs ne réarchivent rien
+    from cdiscount_scraper import CdiscountScraperV2
+
+    _processus['archive'] = ArchivePages(chemin_archive)
+    _processus['extracteurs'] = {'cdiscount': CdiscountScraperV2()}
+
+
+def reextraire(capture):
+    """Processus du pool: extraction d'une page archivée, (empreinte, valeurs ou None)"""
+    try:
+        contenu = _processus['archive'].lire(capture['empreinte'])
+        doc = DocumentPage(contenu, charset_content_type(capture['content_type']), capture['url'])
+        if doc.tree is None:
+            return capture['empreinte'], None
+
+        product_data = _processus['extracteurs'][capture['site']].extraire_produit(doc, capture['url'], None)
+        return capture['empreinte'], {
+            'nom': product_data['nom_produit'],
+            'prix': product_data['prix_ttc'],
+            'disponible': product_data['disponible'],
+            'checksum': product_data['checksum_produit']
+        }
+    except Exception as e:
+        logger.error(f"❌ Réextraction {capture['url']} ({capture['empreinte'][:12]}): {e}")
+        return capture['empreinte'], None
+
+
+def _prix_egaux(ancien, nouveau):
+    if ancien is None or nouveau is None:
+        return ancien is None and nouveau is None
+    return round(float(ancien), 2) == round(float(nouveau), 2)
+
+
+class Backfill:
+    """Réextrait jour par jour les pages archivées et met à jour les lignes dont l'extraction a changé"""
+
+    def __init__(self, archive=None, processus=None, simulation=False):
+        self.archive = archive or ArchivePages()
+        self.processus = processus or os.cpu_count()
+        self.simulation = simulation
+        self.stats = {
+            'jours': 0, 'lignes': 0, 'sans_page': 0, 'pages_extraites': 0,
+            'echecs_extraction': 0, 'modifiees': 0, 'nom': 0, 'prix': 0, 'disponible': 0
+        }
+
+    def executer(self, debut, fin):
+        """Traite les jours de debut à fin inclus, retourne les statistiques"""
+        start_time = time.time()
+        contexte = multiprocessing.get_context('spawn')
+        with contexte.Pool(self.processus, initializer=_initialiser_processus, initargs=(self.archive.chemin,)) as pool:
+            jour = debut
+            while jour <= fin:
+                for site, id_site in SITES_EXTRACTEURS.items():
+                    self._traiter_jour(pool, jour, site, id_site)
+                self.stats['jours'] += 1
+                jour += timedelta(days=1)
+
+        duree = time.time() - start_time
+        logger.info(f"🏁 Backfill {debut} → {fin}: {self.stats['modifiees']}/{self.stats['lignes']} lignes modifiées "
+                    f"({self.stats['pages_extraites']} pages en {duree:.1f}s, {self.processus} processus)"
+                    f"{' [simulation]' if self.simulation else ''}")
+        return self.stats
+
+    def _traiter_jour(self, pool, jour, site, id_site):
+        debut = datetime.combine(jour, heure.min)
+        fin = debut + timedelta(days=1)
+
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_LIGNES_JOUR, (id_site, debut, fin))
+            lignes = cursor.fetchall()
+            cursor.close()
+        if not lignes:
+            return
+
+        pages = self._pages_des_lignes(lignes, site, debut, fin)
+        a_extraire = {capture['empreinte']: capture for capture in pages.values()}
+        resultats = dict(pool.imap_unordered(reextraire, list(a_extraire.values()), chunksize=8))
+        self.stats['pages_extraites'] += len(resultats)
+        self.stats['echecs_extraction'] += sum(1 for valeurs in resultats.values() if valeurs is None)
+
+        modifications, historique = self._diff(lignes, pages, resultats, id_site, jour)
+        self.stats['lignes'] += len(lignes)
+        self.stats['modifiees'] += len(modifications)
+        logger.info(f"📅 {jour} {site}: {len(modifications)}/{len(lignes)} lignes à corriger ({len(pages)} pages)")
+
+        if modifications and not self.simulation:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, UPDATE_PRODUITS, modifications,
+                               template="(%s, %s::timestamp, %s, %s::numeric, %s::boolean, %s)", page_size=TAILLE_LOT_MAJ)
+                execute_values(cursor, UPDATE_DERNIERS_PRIX, modifications,
+                               template="(%s, %s::timestamp, %s, %s::numeric, %s::boolean, %s)", page_size=TAILLE_LOT_MAJ)
+                if historique:
+                    execute_values(cursor, UPDATE_HISTORIQUE, historique,
+                                   template="(%s, %s, %s::date)", page_size=TAILLE_LOT_MAJ)
+                cursor.execute("SELECT recalculer_resume_collecte(%s)", (jour,))
+                conn.commit()
+
+    def _pages_des_lignes(self, lignes, site, debut, fin):
+        """Capture de chaque ligne: son empreinte si elle l'a enregistrée, sinon la dernière capture
+        de la même URL avant la ligne, le même jour. Retourne {id_produit_concurrent: capture}"""
+        captures = [dict(capture) for capture in self.archive.captures_periode(debut, fin, site)]
+        par_empreinte = {capture['empreinte']: capture for capture in captures}
+        par_url = {}
+        for capture in captures:  # triées par date
+            par_url.setdefault(capture['url'], []).append(capture)
+
+        pages = {}
+        for id_ligne, _, url, date_collecte, _, _, _, empreinte in lignes:
+            capture = par_empreinte.get(empreinte) if empreinte else None
+            if capture is None:
+                candidates = [c for c in par_url.get(url, []) if c['date_collecte'] <= date_collecte.isoformat()]
+                capture = candidates[-1] if candidates else None
+            if capture is None:
+                self.stats['sans_page'] += 1
+                continue
+            pages[id_ligne] = capture
+        return pages
+
+    def _diff(self, lignes, pages, resultats, id_site, jour):
+        """Lignes (id, date_collecte, nom, prix, disponible, checksum) dont l'extraction a changé, et clés historique touchées
+
+        Une page dont la réextraction ne donne pas de prix ne remplace pas l'ancienne ligne.
+        """
+        modifications = []
+        historique = set()
+        for id_ligne, id_produit, _, date_collecte, nom, prix, disponible, _ in lignes:
+            capture = pages.get(id_ligne)
+            valeurs = resultats.get(capture['empreinte']) if capture else None
+            if valeurs is None or valeurs['prix'] is None:
+                continue
+
+            changements = [
+                champ for champ, egal in (
+                    ('nom', nom == valeurs['nom']),
+                    ('prix', _prix_egaux(prix, valeurs['prix'])),
+                    ('disponible', disponible == valeurs['disponible'])
+                ) if not egal
+            ]
+            if not changements:
+                continue
+
+            for champ in changements:
+                self.stats[champ] += 1
+            modifications.append((id_ligne, date_collecte, valeurs['nom'], valeurs['prix'], valeurs['disponible'], valeurs['checksum']))
+            if 'prix' in changements and id_produit is not None:
+                historique.add((id_produit, id_site, jour))
+        return modifications, sorted(historique)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Réextraction des pages archivées et correction de produits_concurrents")
+    parser.add_argument('--depuis', type=date.fromisoformat, required=True)
+    parser.add_argument('--jusqu-a', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--processus', type=int, default=None, help="taille du pool (défaut: nombre de cœurs)")
+    parser.add_argument('--simulation', action='store_true', help="calculer le diff sans écrire en base")
+    args = parser.parse_args()
+
+    stats = Backfill(processus=args.processus, simulation=args.simulation).executer(args.depuis, args.jusqu_a)
+    print(f"{stats['modifiees']} lignes modifiées sur {stats['lignes']} "
+          f"(nom: {stats['nom']}, prix: {stats['prix']}, disponibilité: {stats['disponible']}), "
+          f"{stats['sans_page']} sans page archivée, {stats['echecs_extraction']} échecs d'extraction")
+
+
+if __name__ == '__main__':
+    main()
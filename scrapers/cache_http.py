@@ -0,0 +1,108 @@
+# scrapers/cache_http.py
+"""
+Cache HTTP conditionnel (ETag / Last-Modified) persistant sur disque
+Une page inchangée (304) réutilise l'enregistrement extrait la veille
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CHEMIN_CACHE_DEFAUT = os.path.join(os.path.expanduser('~'), '.cache', 'techpulse', 'cache_http.sqlite')
+
+
+class CacheHTTP:
+    """Validateurs HTTP et enregistrements extraits, indexés par URL"""
+
+    def __init__(self, chemin=None):
+        self.chemin = chemin or os.getenv('TECHPULSE_CACHE_HTTP', CHEMIN_CACHE_DEFAUT)
+        os.makedirs(os.path.dirname(self.chemin) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.chemin, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS reponses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                enregistrement TEXT NOT NULL,
+                date_maj TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def en_tetes_conditionnels(self, url):
+        """En-têtes If-None-Match / If-Modified-Since pour une URL déjà vue"""
+        with self._lock:
+            ligne = self._conn.execute(
+                "SELECT etag, last_modified FROM reponses WHERE url = ?", (url,)
+            ).fetchone()
+
+        if not ligne:
+            return {}
+
+        etag, last_modified = ligne
+        en_tetes = {}
+        if etag:
+            en_tetes['If-None-Match'] = etag
+        if last_modified:
+            en_tetes['If-Modified-Since'] = last_modified
+        return en_tetes
+
+    def reponse_en_cache(self, url, response):
+        """Enregistrement mémorisé si le serveur répond 304, sinon None (compte hit/miss)"""
+        if response is not None and response.status_code == 304:
+            with self._lock:
+                ligne = self._conn.execute(
+                    "SELECT enregistrement FROM reponses WHERE url = ?", (url,)
+                ).fetchone()
+
+            if ligne:
+                self.stats['hits'] += 1
+                enregistrement = json.loads(ligne[0])
+                enregistrement['date_collecte'] = datetime.now()
+                return enregistrement
+
+        self.stats['misses'] += 1
+        return None
+
+    def memoriser(self, url, response, enregistrement):
+        """Stocke les validateurs de la réponse et l'enregistrement extrait"""
+        if response is None or response.status_code != 200:
+            return
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return  # Rien à revalider au prochain passage
+
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO reponses (url, etag, last_modified, enregistrement, date_maj)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    enregistrement = excluded.enregistrement,
+                    date_maj = excluded.date_maj
+            """, (url, etag, last_modified, json.dumps(enregistrement, default=str), datetime.now().isoformat()))
+            self._conn.commit()
+
+    def resume_stats(self):
+        """Statistiques hit/miss de la session"""
+        total = self.stats['hits'] + self.stats['misses']
+        taux = self.stats['hits'] / total * 100 if total else 0.0
+        return {'hits': self.stats['hits'], 'misses': self.stats['misses'], 'taux_hit': round(taux, 1)}
+
+    def log_stats(self):
+        """Journalise les statistiques du cache"""
+        stats = self.resume_stats()
+        logger.info(f"🗄️  Cache HTTP: {stats['hits']} hits / {stats['misses']} misses ({stats['taux_hit']}% de 304)")
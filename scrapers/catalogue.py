@@ -0,0 +1,180 @@
+# scrapers/catalogue.py
+"""
+Catalogue de veille: produits actifs de produits_techpulse et leurs URLs chez les concurrents
+Instantané SQLite local rafraîchi par updated_at (seules les lignes modifiées sont relues)
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from db_pool import connexion_db
+
+logger = logging.getLogger(__name__)
+
+CHEMIN_CATALOGUE_DEFAUT = os.path.join(os.path.expanduser('~'), '.cache', 'techpulse', 'catalogue.sqlite')
+
+# Rechargement complet périodique: rattrape les lignes supprimées au lieu d'être désactivées
+RECHARGEMENT_COMPLET_H = float(os.getenv('TECHPULSE_CATALOGUE_RECHARGEMENT_H', '24'))
+
+# Recouvrement du curseur updated_at: une transaction validée tard garde une date antérieure
+MARGE_CURSEUR = timedelta(minutes=5)
+
+# Version du schéma de l'instantané: un instantané plus ancien est recréé (rechargement complet)
+VERSION_SCHEMA = 2
+
+# Amplitude des prix simulés, en fraction du prix de vente TechPulse
+VARIATION_SIMULATION = 0.08
+
+SELECT_PRODUITS = """
+    SELECT pt.id_produit, pt.reference_interne, pt.nom_produit, pt.prix_vente_ttc, pt.priorite_veille,
+           pt.actif, pt.updated_at, m.nom_marque, pt.ean
+    FROM produits_techpulse pt
+    LEFT JOIN marques m ON m.id_marque = pt.id_marque
+    WHERE pt.updated_at > %s
+"""
+
+# Clé scraper du site: 'Rue du Commerce' -> 'rueducommerce' (comme slug_site du DAG)
+SELECT_URLS = """
+    SELECT u.id_produit_techpulse, LOWER(REPLACE(sc.nom_site, ' ', '')), u.url_produit, u.actif, u.updated_at
+    FROM urls_produits_concurrents u
+    JOIN sites_concurrents sc ON sc.id_site = u.id_site
+    WHERE u.updated_at > %s
+"""
+
+
+class CatalogueVeille:
+    """Instantané local du catalogue (TECHPULSE_CATALOGUE vide: en mémoire, rechargé à chaque processus)"""
+
+    def __init__(self, chemin=None):
+        self.chemin = chemin or os.getenv('TECHPULSE_CATALOGUE', CHEMIN_CATALOGUE_DEFAUT) or ':memory:'
+        if self.chemin != ':memory:':
+            os.makedirs(os.path.dirname(self.chemin) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.chemin, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != VERSION_SCHEMA:
+            self._conn.executescript("DROP TABLE IF EXISTS produits; DROP TABLE IF EXISTS urls; DROP TABLE IF EXISTS etat;")
+            self._conn.execute(f"PRAGMA user_version = {VERSION_SCHEMA}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS produits (
+                id_produit INTEGER PRIMARY KEY,
+                reference TEXT NOT NULL,
+                nom TEXT NOT NULL,
+                prix_vente_ttc REAL,
+                priorite TEXT,
+                marque TEXT,
+                ean TEXT
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                id_produit INTEGER NOT NULL,
+                site TEXT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (id_produit, site)
+            );
+            CREATE TABLE IF NOT EXISTS etat (
+                cle TEXT PRIMARY KEY,
+                valeur TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+        self.stats = {'produits_relus': 0, 'urls_relues': 0, 'rechargement_complet': False}
+
+    def rafraichir(self):
+        """Relit les produits et URLs modifiés depuis le dernier rafraîchissement (tout, s'il est trop ancien)"""
+        with self._lock:
+            etat = dict(self._conn.execute("SELECT cle, valeur FROM etat").fetchall())
+        dernier_complet = etat.get('rechargement_complet')
+        complet = (
+            dernier_complet is None
+            or datetime.now() - datetime.fromisoformat(dernier_complet) > timedelta(hours=RECHARGEMENT_COMPLET_H)
+        )
+        precedents = {
+            cle: datetime.min if complet else datetime.fromisoformat(etat[cle])
+            for cle in ('curseur_produits', 'curseur_urls')
+        }
+        depuis = {cle: max(curseur, datetime.min + MARGE_CURSEUR) - MARGE_CURSEUR for cle, curseur in precedents.items()}
+        debut = datetime.now()
+
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_PRODUITS, (depuis['curseur_produits'],))
+            produits = cursor.fetchall()
+            cursor.execute(SELECT_URLS, (depuis['curseur_urls'],))
+            urls = cursor.fetchall()
+            cursor.close()
+
+        with self._lock:
+            if complet:
+                self._conn.execute("DELETE FROM produits")
+                self._conn.execute("DELETE FROM urls")
+                etat['rechargement_complet'] = debut.isoformat()
+
+            self._conn.executemany("DELETE FROM produits WHERE id_produit = ?", [(p[0],) for p in produits if not p[5]])
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO produits (id_produit, reference, nom, prix_vente_ttc, priorite, marque, ean)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(p[0], p[1], p[2], float(p[3]) if p[3] is not None else None, p[4], p[7], p[8]) for p in produits if p[5]])
+            self._conn.executemany("DELETE FROM urls WHERE id_produit = ? AND site = ?", [(u[0], u[1]) for u in urls if not u[3]])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO urls (id_produit, site, url) VALUES (?, ?, ?)",
+                [(u[0], u[1], u[2]) for u in urls if u[3]]
+            )
+
+            etat['curseur_produits'] = max([p[6] for p in produits] + [precedents['curseur_produits']]).isoformat()
+            etat['curseur_urls'] = max([u[4] for u in urls] + [precedents['curseur_urls']]).isoformat()
+            self._conn.executemany("INSERT OR REPLACE INTO etat (cle, valeur) VALUES (?, ?)", etat.items())
+            self._conn.commit()
+
+        self.stats = {'produits_relus': len(produits), 'urls_relues': len(urls), 'rechargement_complet': complet}
+        logger.info(f"📚 Catalogue {'rechargé' if complet else 'rafraîchi'}: "
+                    f"{len(produits)} produits et {len(urls)} URLs relus en {(datetime.now() - debut).total_seconds():.2f}s")
+
+    def produits(self):
+        """Produits actifs au format des scrapers: nom, marque, EAN, prix de base, URLs par site"""
+        with self._lock:
+            lignes = self._conn.execute(
+                "SELECT id_produit, reference, nom, prix_vente_ttc, priorite, marque, ean FROM produits ORDER BY id_produit"
+            ).fetchall()
+            urls = self._conn.execute("SELECT id_produit, site, url FROM urls").fetchall()
+
+        urls_par_produit = {}
+        for id_produit, site, url in urls:
+            urls_par_produit.setdefault(id_produit, {})[site] = url
+
+        return [
+            {
+                'id_produit': id_produit,
+                'reference': reference,
+                'nom': nom,
+                'prix_base': prix_vente_ttc,
+                'variation_max': round((prix_vente_ttc or 0) * VARIATION_SIMULATION),
+                'priorite': priorite,
+                'marque': marque,
+                'ean': ean,
+                'urls': urls_par_produit.get(id_produit, {})
+            }
+            for id_produit, reference, nom, prix_vente_ttc, priorite, marque, ean in lignes
+        ]
+
+
+def charger_catalogue(repli=None, avec_urls=True):
+    """Catalogue de veille à jour; repli (catalogue de démonstration) si la base est injoignable
+    ou, avec avec_urls, si aucun produit n'a d'URL concurrente"""
+    try:
+        catalogue = CatalogueVeille()
+        catalogue.rafraichir()
+        produits = catalogue.produits()
+    except Exception as e:
+        logger.warning(f"⚠️  Catalogue indisponible ({e}), catalogue de démonstration utilisé")
+        return list(repli or [])
+
+    vide = not any(produit['urls'] for produit in produits) if avec_urls else not produits
+    if vide and repli:
+        logger.info("ℹ️ Catalogue sans produit à surveiller, catalogue de démonstration utilisé")
+        return list(repli)
+    return produits
@@ -5,28 +5,40 @@ Version simplifiée et robuste pour TechPulse
 """
 
 import requests
-from bs4 import BeautifulSoup
-import time
-import random
 import logging
-import psycopg2
 from datetime import datetime
-import json
 import hashlib
 from fake_useragent import UserAgent
 
+from ingestion_batch import IngestionBatch
+from cache_http import CacheHTTP
+from index_checksums import IndexChecksums
+from extraction_lxml import SELECTEURS_PAR_SITE, moteur_extraction, parse_prix, trouver_prix_texte, disponibilite_texte, extraire_ean
+from document_page import DocumentFlux
+from metriques import mesurer_parse, pousser_metriques
+from couche_fetch import CoucheFetch, FetchRejeu, CircuitOuvert
+from archive_pages import date_archive, empreinte_archive
+from navigateur_pool import pool_partage
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CdiscountScraperV2:
     """Scraper Cdiscount amélioré"""
     
-    def __init__(self):
+    def __init__(self, rejeu=None):
+        """rejeu: jour (date) dont les pages archivées remplacent le réseau"""
         self.session = requests.Session()
         self.ua = UserAgent()
         self.base_url = "https://www.cdiscount.com"
         self.site_id = 1
         
+        # Cache des validateurs HTTP (requêtes conditionnelles)
+        self.cache_http = CacheHTTP()
+        
+        # Moteur d'extraction lxml partagé (sélecteurs précompilés)
+        self.moteur = moteur_extraction
+        
         # Headers plus réalistes
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -40,73 +52,60 @@ class CdiscountScraperV2:
             'Sec-Fetch-Site': 'none'
         })
         
-        # Config DB
-        self.db_config = {
-            'host': 'postgres',
-            'port': 5432,
-            'database': 'techpulse_veille',
-            'user': 'techpulse',
-            'password': 'techpulse2024'
-        }
-    
-    def get_db_connection(self):
-        """Connexion PostgreSQL"""
-        try:
-            return psycopg2.connect(**self.db_config)
-        except Exception as e:
-            logger.error(f"Erreur connexion DB: {e}")
-            return None
-    
-    def delay_between_requests(self, min_delay=3, max_delay=7):
-        """Délai aléatoire pour éviter détection"""
-        delay = random.uniform(min_delay, max_delay)
-        logger.info(f"⏱️  Attente {delay:.1f}s...")
-        time.sleep(delay)
+        # Requêtes: limiteur de débit par hôte, backoff avec gigue, disjoncteur du site
+        # (en rejeu, pages lues dans l'archive sans aucune requête)
+        self.rejeu = rejeu
+        self.fetch = FetchRejeu(rejeu) if rejeu else CoucheFetch(session=self.session)
+        
+        # Étage navigateur headless: seulement pour les pages dont le prix n'est pas dans le HTML statique
+        self.navigateurs = None if rejeu else pool_partage()
     
     def scrape_product_page(self, product_url):
         """Scrape une page produit avec gestion d'erreurs robuste"""
         try:
             logger.info(f"🔍 Scraping: {product_url}")
             
-            # Requête avec retry
-            for attempt in range(3):
-                try:
-                    response = self.session.get(product_url, timeout=15)
-                    if response.status_code == 200:
-                        break
-                    elif response.status_code == 403:
-                        logger.warning(f"⚠️  Accès refusé (403) - tentative {attempt + 1}/3")
-                        time.sleep(5)
-                    else:
-                        logger.warning(f"⚠️  Status {response.status_code} - tentative {attempt + 1}/3")
-                        time.sleep(2)
-                except requests.RequestException as e:
-                    logger.warning(f"⚠️  Erreur requête {attempt + 1}/3: {e}")
-                    time.sleep(5)
-            else:
-                logger.error(f"❌ Échec après 3 tentatives pour {product_url}")
+            # Requête conditionnelle en flux (reprises et disjoncteur dans la couche fetch)
+            en_tetes = self.cache_http.en_tetes_conditionnels(product_url)
+            try:
+                response = self.fetch.get('cdiscount', product_url, headers=en_tetes, timeout=15, stream=True)
+            except CircuitOuvert as e:
+                logger.error(f"🚫 {e}")
+                return None
+            except requests.RequestException as e:
+                logger.error(f"❌ Échec réseau pour {product_url}: {e}")
                 return None
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            if response.status_code not in (200, 304):
+                response.close()
+                logger.error(f"❌ Échec après {self.fetch.tentatives} tentatives pour {product_url} (status {response.status_code})")
+                return None
             
-            # Extraction des données avec fallbacks multiples
-            product_data = {
-                'url': product_url,
-                'nom_produit': self._extract_product_name(soup),
-                'prix_ttc': self._extract_price(soup),
-                'prix_promotion': None,  # Simplifié pour l'instant
-                'en_promotion': False,   # Simplifié pour l'instant
-                'disponible': self._extract_availability(soup),
-                'note_moyenne': None,    # Simplifié pour l'instant
-                'nombre_avis': 0,        # Simplifié pour l'instant
-                'stock_affiche': "Non spécifié",
-                'date_collecte': datetime.now(),
-                'donnees_brutes': str(soup)[:500]  # Échantillon pour debug
-            }
+            # Page inchangée: réutiliser l'extraction précédente sans parser
+            product_data = self.cache_http.reponse_en_cache(product_url, response)
+            if product_data:
+                response.close()
+                logger.info(f"♻️  Inchangé (304): {product_data['nom_produit'][:50]} - {product_data['prix_ttc']}€")
+                return product_data
             
-            # Checksum
-            data_string = f"{product_data['nom_produit']}_{product_data['prix_ttc']}_{product_data['disponible']}"
-            product_data['checksum_produit'] = hashlib.md5(data_string.encode()).hexdigest()
+            with mesurer_parse('cdiscount'):
+                # Parsing au fil du téléchargement, arrêté dès que nom et prix sont trouvés
+                doc = DocumentFlux.pour_reponse(response, {
+                    'nom': self.moteur.detecteur('cdiscount', 'nom'),
+                    'prix': self.moteur.detecteur('cdiscount', 'prix')
+                })
+                self.fetch.lire('cdiscount', response, doc.alimenter)
+                if doc.terminer() is None:
+                    logger.error(f"❌ Page vide ou illisible: {product_url}")
+                    return None
+            
+                product_data = self.extraire_produit(doc, product_url, date_archive(response) or datetime.now())
+            
+            if product_data['source_prix'] != 'selecteur' and self.navigateurs is not None:
+                product_data = self._extraire_rendu(product_url, product_data)
+            product_data['empreinte_page'] = empreinte_archive(response)
+            
+            self.cache_http.memoriser(product_url, response, product_data)
             
             logger.info(f"✅ Produit scrapé: {product_data['nom_produit'][:50]} - {product_data['prix_ttc']}€")
             return product_data
@@ -115,224 +114,126 @@ class CdiscountScraperV2:
             logger.error(f"❌ Erreur scraping {product_url}: {e}")
             return None
     
-    def _extract_product_name(self, soup):
-        """Extraction nom produit avec fallbacks multiples"""
-        # Sélecteurs CSS possibles pour Cdiscount
-        selectors = [
-            'h1[data-product="name"]',
-            'h1.fpHdrDsc',
-            'h1.product-title',
-            '.fpHdr h1',
-            'h1.title',
-            'h1',
-            '.product-name h1',
-            '[data-testid="product-title"]'
-        ]
-        
-        for selector in selectors:
-            try:
-                elements = soup.select(selector)
-                if elements:
-                    name = elements[0].get_text(strip=True)
-                    if name and len(name) > 3:  # Nom valide
-                        return name[:255]  # Limite DB
-            except:
-                continue
-        
-        # Fallback: chercher dans le title de la page
+    def _extraire_rendu(self, product_url, product_data):
+        """Page rendue par un navigateur du pool (prix affiché en JavaScript); extraction statique gardée en cas d'échec"""
+        logger.info(f"🌐 Prix absent du HTML statique, rendu navigateur: {product_url}")
         try:
-            title = soup.find('title')
-            if title:
-                title_text = title.get_text(strip=True)
-                if 'cdiscount' in title_text.lower():
-                    # Nettoyer le titre
-                    clean_title = title_text.replace(' - Cdiscount', '').replace(' | Cdiscount', '')
-                    return clean_title[:255]
-        except:
-            pass
+            with mesurer_parse('cdiscount'):
+                doc = self.navigateurs.document(product_url, ', '.join(SELECTEURS_PAR_SITE['cdiscount']['prix']))
+                rendu = self.extraire_produit(doc, product_url, product_data['date_collecte'])
+        except Exception as e:
+            logger.warning(f"⚠️  Rendu navigateur impossible pour {product_url}: {e}")
+            return product_data
         
-        return "Nom non trouvé"
+        if rendu['prix_ttc'] is None:
+            return product_data
+        rendu['etage'] = 'navigateur'
+        return rendu
     
-    def _extract_price(self, soup):
-        """Extraction prix avec multiples stratégies"""
-        # Stratégie 1: Sélecteurs CSS
-        price_selectors = [
-            '.fpPrice .price',
-            '.price-current',
-            '.product-price .price',
-            '[data-price]',
-            '.fpPrice',
-            '.price',
-            '.current-price',
-            '.sale-price'
-        ]
+    def extraire_produit(self, doc, product_url, date_collecte):
+        """Enregistrement produit extrait d'un document (collecte en ligne, rejeu et backfill)"""
+        # Extraction des données avec fallbacks multiples (un seul parsing partagé)
+        prix, source_prix = self._extract_price(doc)
+        product_data = {
+            'url': product_url,
+            'nom_produit': self._extract_product_name(doc),
+            'prix_ttc': prix,
+            'source_prix': source_prix,
+            'etage': 'statique',
+            'prix_promotion': None,  # Simplifié pour l'instant
+            'en_promotion': False,   # Simplifié pour l'instant
+            'disponible': self._extract_availability(doc),
+            'note_moyenne': None,    # Simplifié pour l'instant
+            'nombre_avis': 0,        # Simplifié pour l'instant
+            'stock_affiche': "Non spécifié",
+            'ean': extraire_ean(doc.tree),
+            'date_collecte': date_collecte,
+            'donnees_brutes': doc.echantillon_brut  # Premiers octets de la page, pour debug
+        }
         
-        for selector in price_selectors:
-            try:
-                elements = soup.select(selector)
-                for element in elements:
-                    price_text = element.get_text(strip=True)
-                    price = self._parse_price(price_text)
-                    if price and price > 0:
-                        return price
-                    
-                    # Vérifier attribut data-price
-                    data_price = element.get('data-price')
-                    if data_price:
-                        price = self._parse_price(data_price)
-                        if price and price > 0:
-                            return price
-            except:
-                continue
+        # Checksum
+        data_string = f"{product_data['nom_produit']}_{product_data['prix_ttc']}_{product_data['disponible']}"
+        product_data['checksum_produit'] = hashlib.md5(data_string.encode()).hexdigest()
+        return product_data
+    
+    def _extract_product_name(self, doc):
+        """Extraction nom produit avec fallbacks multiples"""
+        # Sélecteurs CSS précompilés (le dernier gagnant est essayé en premier)
+        name = self.moteur.extraire_nom(doc.tree, 'cdiscount')
+        if name:
+            return name
         
-        # Stratégie 2: Recherche dans le texte général
+        # Fallback: chercher dans le title de la page
         try:
-            page_text = soup.get_text()
-            import re
-            # Chercher des patterns de prix français
-            price_patterns = [
-                r'(\d{1,4})[,.](\d{2})\s*€',
-                r'(\d{1,4})\s*€',
-                r'EUR\s*(\d{1,4})[,.](\d{2})',
-            ]
-            
-            for pattern in price_patterns:
-                matches = re.findall(pattern, page_text)
-                for match in matches:
-                    if isinstance(match, tuple):
-                        if len(match) == 2:
-                            price = float(f"{match[0]}.{match[1]}")
-                        else:
-                            price = float(match[0])
-                    else:
-                        price = float(match)
-                    
-                    # Vérifier que c'est un prix réaliste (entre 1€ et 5000€)
-                    if 1 <= price <= 5000:
-                        return price
+            title_text = doc.titre
+            if 'cdiscount' in title_text.lower():
+                # Nettoyer le titre
+                clean_title = title_text.replace(' - Cdiscount', '').replace(' | Cdiscount', '')
+                return clean_title[:255]
         except:
             pass
         
-        return None
+        return "Nom non trouvé"
     
-    def _extract_availability(self, soup):
-        """Extraction disponibilité"""
-        # Indicateurs de disponibilité
-        availability_indicators = [
-            'en stock',
-            'disponible',
-            'available',
-            'livraison',
-            'expedie'
-        ]
-        
-        unavailability_indicators = [
-            'rupture',
-            'indisponible',
-            'non disponible',
-            'out of stock',
-            'épuisé'
-        ]
+    def _extract_price(self, doc):
+        """Extraction prix avec multiples stratégies, retourne (prix, stratégie retenue)"""
+        # Stratégie 1: Sélecteurs CSS précompilés
+        price = self.moteur.extraire_prix(doc.tree, 'cdiscount')
+        if price:
+            return price, 'selecteur'
         
+        # Stratégie 2: Recherche dans le texte général (prix réaliste entre 1€ et 5000€)
+        # Peu fiable sur une page rendue en JavaScript: le premier prix du texte est souvent celui d'un autre produit
+        price = trouver_prix_texte(doc.texte, prix_min=1, prix_max=5000)
+        return price, ('texte' if price else None)
+    
+    def _extract_availability(self, doc):
+        """Extraction disponibilité (indicateurs de rupture prioritaires, disponible par défaut)"""
         try:
-            page_text = soup.get_text().lower()
-            
-            # Chercher indicateurs de rupture (priorité)
-            for indicator in unavailability_indicators:
-                if indicator in page_text:
-                    return False
-            
-            # Chercher indicateurs de disponibilité
-            for indicator in availability_indicators:
-                if indicator in page_text:
-                    return True
-                    
+            return disponibilite_texte(doc.texte_minuscule)
         except:
-            pass
-        
-        # Par défaut, considérer comme disponible
-        return True
+            return True
     
     def _parse_price(self, price_text):
         """Parse texte prix en float"""
-        if not price_text:
-            return None
-        
-        try:
-            import re
-            # Nettoyer: garder chiffres, virgules, points
-            clean_price = re.sub(r'[^\d,.]', '', str(price_text))
-            
-            if not clean_price:
-                return None
-            
-            # Gérer formats français
-            if ',' in clean_price and '.' in clean_price:
-                # Format 1.234,56
-                clean_price = clean_price.replace('.', '').replace(',', '.')
-            elif ',' in clean_price:
-                # Format 123,45
-                clean_price = clean_price.replace(',', '.')
-            
-            price = float(clean_price)
-            
-            # Vérifier prix réaliste
-            if 1 <= price <= 10000:
-                return price
-            else:
-                return None
-                
-        except (ValueError, TypeError):
-            return None
+        return parse_prix(price_text)
     
-    def save_to_database(self, product_data, id_produit_techpulse=None):
-        """Sauvegarde en base"""
+    def save_to_database(self, product_data, id_produit_techpulse=None, lot=None):
+        """Sauvegarde en base (immédiate, ou différée si un lot d'ingestion est fourni)"""
         if not product_data:
             return False
         
-        conn = self.get_db_connection()
-        if not conn:
-            return False
+        ecriture_immediate = lot is None
+        if ecriture_immediate:
+            lot = IngestionBatch(self.site_id, 'cdiscount', taille_lot=1)
         
-        try:
-            cursor = conn.cursor()
-            
-            # Requête simplifiée (sans ON CONFLICT complexe)
-            insert_query = """
-                INSERT INTO produits_concurrents (
-                    id_produit_techpulse, id_site, url_produit, nom_produit_concurrent,
-                    prix_ttc, prix_promotion, en_promotion, disponible, stock_affiche,
-                    note_moyenne, nombre_avis, date_collecte, donnees_brutes, checksum_produit
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            cursor.execute(insert_query, (
-                id_produit_techpulse,
-                self.site_id,
-                product_data['url'],
-                product_data['nom_produit'],
-                product_data['prix_ttc'],
-                product_data['prix_promotion'],
-                product_data['en_promotion'],
-                product_data['disponible'],
-                product_data['stock_affiche'],
-                product_data['note_moyenne'],
-                product_data['nombre_avis'],
-                product_data['date_collecte'],
-                json.dumps({'sample': product_data['donnees_brutes'][:200]}),
-                product_data['checksum_produit']
-            ))
-            
-            conn.commit()
-            logger.info("✅ Données sauvegardées en base")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur sauvegarde DB: {e}")
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+        lot.ajouter(
+            product_data,
+            {'sample': product_data['donnees_brutes'][:200], 'empreinte_page': product_data.get('empreinte_page')},
+            id_produit_techpulse=id_produit_techpulse
+        )
+        
+        if ecriture_immediate:
+            return lot.stats['lignes'] == 1
+        return True
+
+    def rejouer_journee(self, ecrire=True):
+        """Réextrait toutes les pages Cdiscount archivées du jour de rejeu (aucune requête réseau)"""
+        captures = self.fetch.source.captures_du_jour(self.rejeu, 'cdiscount')
+        logger.info(f"⏪ Rejeu du {self.rejeu}: {len(captures)} pages archivées")
+        
+        lot = IngestionBatch(self.site_id, 'cdiscount', index_checksums=IndexChecksums()) if ecrire else None
+        extraits = 0
+        for capture in captures:
+            product_data = self.scrape_product_page(capture['url'])
+            if product_data and product_data['prix_ttc']:
+                extraits += 1
+                if lot is not None:
+                    self.save_to_database(product_data, lot=lot)
+        
+        if lot is not None:
+            lot.flush()
+        return {'pages': len(captures), 'extraits': extraits, 'ecrits': lot.stats['lignes'] if lot else 0}
 
 def test_scraper_v2():
     """Test du scraper amélioré"""
@@ -345,7 +246,7 @@ def test_scraper_v2():
         "https://www.cdiscount.com/telephonie/telephone-mobile/apple-iphone-15-128-go-noir/f-14406-app0195949102080.html",
     ]
     
-    nb_succes = 0
+    lot = IngestionBatch(scraper.site_id, 'cdiscount', index_checksums=IndexChecksums())
     nb_erreurs = 0
     
     for url in test_urls:
@@ -353,21 +254,21 @@ def test_scraper_v2():
             product_data = scraper.scrape_product_page(url)
             
             if product_data and product_data['prix_ttc']:
-                success = scraper.save_to_database(product_data)
-                if success:
-                    nb_succes += 1
-                else:
-                    nb_erreurs += 1
+                scraper.save_to_database(product_data, lot=lot)
             else:
                 nb_erreurs += 1
             
-            scraper.delay_between_requests(2, 4)
-            
         except Exception as e:
             logger.error(f"❌ Erreur test {url}: {e}")
             nb_erreurs += 1
     
-    logger.info(f"📊 Test V2 terminé: {nb_succes} succès, {nb_erreurs} erreurs")
+    lot.flush()
+    nb_succes = lot.stats['lignes'] + lot.stats['inchanges']
+    nb_erreurs += lot.stats['erreurs']
+    
+    scraper.cache_http.log_stats()
+    pousser_metriques('techpulse_cdiscount_v2')
+    logger.info(f"📊 Test V2 terminé: {nb_succes} succès ({lot.stats['inchanges']} inchangés), {nb_erreurs} erreurs")
 
 if __name__ == "__main__":
     test_scraper_v2()
\ No newline at end of file
@@ -0,0 +1,291 @@
+# scrapers/couche_fetch.py
+"""
+Couche de requêtes HTTP partagée par les scrapers
+Limiteur de débit par hôte, backoff exponentiel avec gigue, Retry-After et disjoncteur par site
+Lecture en flux bornée: le corps n'est jamais chargé en entier en mémoire
+Pages lues archivées (zstd, adressées par contenu) et rejouables sans réseau
+"""
+
+import io
+import os
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from limiteur_debit import LimiteurDebit
+from archive_pages import ArchivePages, archive_partagee, EN_TETE_DATE_ARCHIVE, EN_TETE_EMPREINTE
+from metriques import observer_fetch, observer_octets, observer_disjoncteur
+
+logger = logging.getLogger(__name__)
+
+TENTATIVES = int(os.getenv('TECHPULSE_FETCH_TENTATIVES', '3'))
+BACKOFF_BASE_SEC = float(os.getenv('TECHPULSE_BACKOFF_BASE_SEC', '1'))
+BACKOFF_MAX_SEC = float(os.getenv('TECHPULSE_BACKOFF_MAX_SEC', '30'))
+RETRY_AFTER_MAX_SEC = float(os.getenv('TECHPULSE_RETRY_AFTER_MAX_SEC', '60'))
+
+# Échecs bloquants consécutifs avant ouverture, et durée avant un essai de réouverture
+DISJONCTEUR_SEUIL = int(os.getenv('TECHPULSE_DISJONCTEUR_SEUIL', '5'))
+DISJONCTEUR_PAUSE_SEC = float(os.getenv('TECHPULSE_DISJONCTEUR_PAUSE_SEC', '300'))
+
+# Taille maximale d'un corps lu en flux, et taille des morceaux lus
+TAILLE_MAX_PAGE = int(os.getenv('TECHPULSE_TAILLE_MAX_PAGE_KO', '2048')) * 1024
+TAILLE_MORCEAU = 64 * 1024
+
+# Réponses qui signalent un blocage ou une surcharge du site: retentées et comptées par le disjoncteur
+STATUTS_A_RETENTER = {403, 429, 500, 502, 503, 504}
+
+FERME, OUVERT, SEMI_OUVERT = 'ferme', 'ouvert', 'semi_ouvert'
+
+
+class CircuitOuvert(requests.RequestException):
+    """Disjoncteur du site ouvert: requête refusée sans appel réseau"""
+
+
+def delai_retry_after(valeur):
+    """Secondes demandées par un en-tête Retry-After (entier ou date HTTP), None si illisible"""
+    if not valeur:
+        return None
+    try:
+        return max(0.0, float(valeur))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(valeur)
+        return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def delai_backoff(tentative, base=BACKOFF_BASE_SEC, maximum=BACKOFF_MAX_SEC):
+    """Backoff exponentiel « full jitter »: uniforme entre 0 et base * 2^tentative (plafonné)"""
+    return random.uniform(0, min(maximum, base * (2 ** tentative)))
+
+
+class Disjoncteur:
+    """Disjoncteur d'un site: s'ouvre après N échecs bloquants consécutifs, réessaie après une pause"""
+
+    def __init__(self, site, seuil=DISJONCTEUR_SEUIL, pause=DISJONCTEUR_PAUSE_SEC):
+        self.site = site
+        self.seuil = seuil
+        self.pause = pause
+        self.etat = FERME
+        self.echecs_consecutifs = 0
+        self.dernier_statut = None
+        self.ouvert_depuis = None
+        self.stats = {'ouvertures': 0, 'rejets': 0, 'echecs': 0}
+        self._essai_en_cours = False
+        self._lock = threading.Lock()
+
+    def autoriser(self):
+        """True si une requête peut partir (un seul essai à la fois en semi-ouvert)"""
+        with self._lock:
+            if self.etat == OUVERT and time.monotonic() - self.ouvert_depuis >= self.pause:
+                self.etat = SEMI_OUVERT
+                logger.info(f"🔌 Disjoncteur {self.site} semi-ouvert: requête d'essai")
+
+            if self.etat == FERME:
+                return True
+            if self.etat == SEMI_OUVERT and not self._essai_en_cours:
+                self._essai_en_cours = True
+                return True
+
+            self.stats['rejets'] += 1
+            return False
+
+    def succes(self):
+        with self._lock:
+            if self.etat != FERME:
+                logger.info(f"✅ Disjoncteur {self.site} refermé")
+            self.etat = FERME
+            self.echecs_consecutifs = 0
+            self._essai_en_cours = False
+        observer_disjoncteur(self.site, False)
+
+    def echec(self, statut=None):
+        """Compte un échec bloquant (403/429/5xx ou erreur réseau); True si le disjoncteur est ouvert"""
+        with self._lock:
+            self.stats['echecs'] += 1
+            self.echecs_consecutifs += 1
+            self.dernier_statut = statut
+            essai_rate = self.etat == SEMI_OUVERT
+            self._essai_en_cours = False
+
+            if essai_rate or (self.etat == FERME and self.echecs_consecutifs >= self.seuil):
+                self.etat = OUVERT
+                self.ouvert_depuis = time.monotonic()
+                self.stats['ouvertures'] += 1
+                logger.warning(f"🚫 Disjoncteur {self.site} ouvert après {self.echecs_consecutifs} échecs "
+                               f"(dernier statut: {statut or 'erreur réseau'}), pause {self.pause:.0f}s")
+            ouvert = self.etat == OUVERT
+
+        if ouvert:
+            observer_disjoncteur(self.site, True)
+        return ouvert
+
+    def resume(self):
+        """État sérialisable (logs_collecte.details_execution)"""
+        with self._lock:
+            return {
+                'etat': self.etat,
+                'echecs_consecutifs': self.echecs_consecutifs,
+                'dernier_statut': self.dernier_statut,
+                'ouvertures': self.stats['ouvertures'],
+                'echecs': self.stats['echecs'],
+                'requetes_rejetees': self.stats['rejets']
+            }
+
+
+class CoucheFetch:
+    """GET HTTP avec politesse, reprises et disjoncteur par site"""
+
+    # Octets lus comptés comme téléchargés (faux pour le rejeu depuis l'archive)
+    reseau = True
+
+    def __init__(self, session=None, limiteur=None, tentatives=TENTATIVES, archive=None):
+        self.session = session or requests.Session()
+        self.limiteur = limiteur or LimiteurDebit()
+        self.tentatives = tentatives
+        # Archive des pages lues (None: TECHPULSE_ARCHIVE, désactivée si vide)
+        self.archive = archive if archive is not None else archive_partagee()
+        self._disjoncteurs = {}
+        self._lock = threading.Lock()
+
+    def disjoncteur(self, site):
+        if site not in self._disjoncteurs:
+            with self._lock:
+                self._disjoncteurs.setdefault(site, Disjoncteur(site))
+        return self._disjoncteurs[site]
+
+    def get(self, site, url, **kwargs):
+        """GET avec reprises; retourne la dernière réponse reçue
+
+        Lève CircuitOuvert si le site est coupé, ou l'erreur réseau de la
+        dernière tentative. 403/429/5xx sont retentés après Retry-After ou
+        un backoff exponentiel avec gigue. Avec stream=True le corps n'est pas
+        téléchargé: le lire avec lire() (ou fermer la réponse).
+        """
+        disjoncteur = self.disjoncteur(site)
+        response = None
+        flux = kwargs.get('stream', False)
+
+        for tentative in range(self.tentatives):
+            if not disjoncteur.autoriser():
+                raise CircuitOuvert(f"Disjoncteur {site} ouvert: {url} non demandé")
+
+            self.limiteur.attendre(url)
+            start_time = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except requests.RequestException as e:
+                observer_fetch(site, time.perf_counter() - start_time)
+                if disjoncteur.echec() or tentative == self.tentatives - 1:
+                    raise
+                attente = delai_backoff(tentative)
+                logger.warning(f"⚠️  Erreur requête {tentative + 1}/{self.tentatives} ({e}), nouvel essai dans {attente:.1f}s")
+                time.sleep(attente)
+                continue
+
+            observer_fetch(site, time.perf_counter() - start_time, response, octets=0 if flux else None)
+            if response.status_code not in STATUTS_A_RETENTER:
+                disjoncteur.succes()
+                return response
+
+            if disjoncteur.echec(response.status_code) or tentative == self.tentatives - 1:
+                break
+
+            attente = delai_retry_after(response.headers.get('Retry-After'))
+            if attente is None:
+                attente = delai_backoff(tentative)
+            attente = min(attente, RETRY_AFTER_MAX_SEC)
+            response.close()  # rend la connexion au pool avant d'attendre
+            logger.warning(f"⚠️  Status {response.status_code} - tentative {tentative + 1}/{self.tentatives}, "
+                           f"nouvel essai dans {attente:.1f}s")
+            time.sleep(attente)
+
+        return response
+
+    def lire(self, site, response, consommateur=None, taille_max=TAILLE_MAX_PAGE):
+        """Passe le corps d'une réponse en flux à consommateur(morceau), morceau par morceau
+
+        La lecture s'arrête quand consommateur retourne True ou au-delà de
+        taille_max; la réponse est toujours fermée. Si l'archive est active,
+        une page 200 est lue jusqu'au bout (dans la limite de taille) pour
+        être archivée en entier, même après l'arrêt du consommateur.
+        Retourne (octets lus, tronqué).
+        """
+        ecriture = None
+        if self.archive is not None and response.status_code == 200:
+            ecriture = self.archive.ecriture(site, response.url, response.headers.get('Content-Type'))
+
+        octets = 0
+        tronque = False
+        consommateur_fini = consommateur is None
+        try:
+            if consommateur_fini and ecriture is None:
+                return octets, tronque
+
+            for morceau in response.iter_content(TAILLE_MORCEAU):
+                if octets + len(morceau) > taille_max:
+                    morceau = morceau[:taille_max - octets]
+                    tronque = True
+                octets += len(morceau)
+                if ecriture is not None:
+                    ecriture.ajouter(morceau)
+                if not consommateur_fini:
+                    consommateur_fini = consommateur(morceau)
+                if tronque or (consommateur_fini and ecriture is None):
+                    break
+
+            if ecriture is not None:
+                response.headers[EN_TETE_EMPREINTE] = ecriture.terminer(tronque)
+                ecriture = None
+        finally:
+            if ecriture is not None:
+                ecriture.abandonner()
+            response.close()
+            if self.reseau:
+                observer_octets(site, octets)
+
+        if tronque:
+            logger.warning(f"✂️  {response.url}: corps tronqué à {taille_max // 1024} Ko")
+        return octets, tronque
+
+
+class FetchRejeu(CoucheFetch):
+    """Couche fetch qui sert les pages depuis l'archive: aucune requête réseau
+
+    jour=None rejoue la dernière capture de chaque URL; une URL absente de
+    l'archive répond 404. Les pages rejouées ne sont pas réarchivées.
+    """
+
+    reseau = False
+
+    def __init__(self, jour=None, archive=None):
+        super().__init__(tentatives=1)
+        self.archive = None  # pas de réarchivage
+        self.source = archive or ArchivePages()
+        self.jour = jour
+
+    def get(self, site, url, **kwargs):
+        response = requests.Response()
+        response.url = url
+        capture = self.source.trouver(site, url, self.jour)
+        if capture is None:
+            response.status_code = 404
+            response.reason = "Absente de l'archive"
+            response.raw = io.BytesIO(b'')
+            return response
+
+        response.status_code = 200
+        response.reason = 'OK (archive)'
+        if capture['content_type']:
+            response.headers['Content-Type'] = capture['content_type']
+        response.headers[EN_TETE_DATE_ARCHIVE] = capture['date_collecte']
+        response.headers[EN_TETE_EMPREINTE] = capture['empreinte']
+        response.raw = self.source.ouvrir(capture['empreinte'])
+        return response
@@ -0,0 +1,144 @@
+# scrapers/db_pool.py
+"""
+Pool de connexions PostgreSQL partagé par les scrapers et le DAG
+Configuration par variables d'environnement (TECHPULSE_DB_*)
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+logger = logging.getLogger(__name__)
+
+# Taille du pool et fréquence des vérifications de santé
+POOL_MIN = int(os.getenv('TECHPULSE_DB_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('TECHPULSE_DB_POOL_MAX', '10'))
+HEALTHCHECK_APRES_SEC = float(os.getenv('TECHPULSE_DB_HEALTHCHECK_SEC', '30'))
+
+_lock = threading.Lock()
+_etat = {
+    'pool': None,
+    'pid': None,
+    'slots': None,
+    'derniere_utilisation': {}
+}
+
+
+def get_db_config():
+    """Paramètres de connexion lus depuis l'environnement (défauts docker-compose)"""
+    return {
+        'host': os.getenv('TECHPULSE_DB_HOST', 'postgres'),
+        'port': int(os.getenv('TECHPULSE_DB_PORT', '5432')),
+        'database': os.getenv('TECHPULSE_DB_NAME', 'techpulse_veille'),
+        'user': os.getenv('TECHPULSE_DB_USER', 'techpulse'),
+        'password': os.getenv('TECHPULSE_DB_PASSWORD', 'techpulse2024'),
+        'connect_timeout': int(os.getenv('TECHPULSE_DB_CONNECT_TIMEOUT', '10'))
+    }
+
+
+def get_pool():
+    """Retourne le pool du processus courant (recréé après un fork Celery)"""
+    pid = os.getpid()
+    if _etat['pool'] is None or _etat['pid'] != pid:
+        with _lock:
+            if _etat['pool'] is None or _etat['pid'] != pid:
+                config = get_db_config()
+                _etat['pool'] = pg_pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **config)
+                _etat['pid'] = pid
+                _etat['slots'] = threading.BoundedSemaphore(POOL_MAX)
+                _etat['derniere_utilisation'] = {}
+                logger.info(f"🔌 Pool PostgreSQL ouvert: {config['host']}:{config['port']}/{config['database']} ({POOL_MIN}-{POOL_MAX} connexions)")
+    return _etat['pool']
+
+
+def _connexion_saine(conn):
+    """Vérifie une connexion restée inactive trop longtemps (SELECT 1)"""
+    if conn.closed:
+        return False
+
+    derniere = _etat['derniere_utilisation'].get(id(conn))
+    if derniere is not None and time.monotonic() - derniere < HEALTHCHECK_APRES_SEC:
+        return True
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"⚠️  Connexion DB inutilisable, remplacement: {e}")
+        return False
+
+
+def _emprunter(pool):
+    """Emprunte une connexion saine au pool (une seule tentative de remplacement)"""
+    conn = pool.getconn()
+    if _connexion_saine(conn):
+        return conn
+
+    pool.putconn(conn, close=True)
+    return pool.getconn()
+
+
+@contextmanager
+def connexion_db():
+    """Emprunte une connexion au pool et la restitue en sortie de bloc
+
+    Le commit reste à la charge de l'appelant; une exception dans le bloc
+    provoque un rollback. Bloque si toutes les connexions sont occupées.
+    """
+    pool = get_pool()
+    slots = _etat['slots']
+    slots.acquire()
+    conn = None
+
+    try:
+        conn = _emprunter(pool)
+        yield conn
+    except Exception:
+        if conn is not None and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        if conn is not None:
+            casse = bool(conn.closed)
+            if not casse and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    casse = True
+            _etat['derniere_utilisation'][id(conn)] = time.monotonic()
+            pool.putconn(conn, close=casse)
+        slots.release()
+
+
+def verifier_connexion():
+    """Health check explicite: True si la base répond"""
+    try:
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        return True
+    except Exception as e:
+        logger.error(f"❌ Health check DB échoué: {e}")
+        return False
+
+
+def fermer_pool():
+    """Ferme toutes les connexions du pool (fin de tâche)"""
+    with _lock:
+        if _etat['pool'] is not None and _etat['pid'] == os.getpid():
+            _etat['pool'].closeall()
+        _etat['pool'] = None
+        _etat['pid'] = None
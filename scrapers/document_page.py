@@ -0,0 +1,160 @@
+# scrapers/document_page.py
+"""
+Document de page partagé par tous les extracteurs
+Arbre, texte, texte minuscule, titre et échantillon brut calculés une seule fois, à la demande
+Variante en flux: arbre construit morceau par morceau, arrêt dès que les champs voulus sont trouvés
+"""
+
+import os
+import re
+import logging
+from functools import cached_property
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from extraction_lxml import MoteurExtraction, encodage_probable
+
+logger = logging.getLogger(__name__)
+
+TAILLE_ECHANTILLON = 500
+
+# Octets encore lus une fois les champs trouvés (indicateurs de stock voisins du prix)
+MARGE_FLUX = int(os.getenv('TECHPULSE_MARGE_FLUX_KO', '16')) * 1024
+
+_RE_CHARSET = re.compile(r'charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def charset_content_type(content_type):
+    """Charset d'un en-tête Content-Type s'il est explicite, sinon None"""
+    match = _RE_CHARSET.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def charset_reponse(response):
+    """Charset du Content-Type d'une réponse requests"""
+    return charset_content_type(response.headers.get('Content-Type'))
+
+
+class DocumentPage:
+    """Page HTML analysée paresseusement (un seul parsing, un seul passage texte)"""
+
+    def __init__(self, contenu, encodage=None, url=None):
+        self.contenu = contenu or b''
+        self.encodage = encodage or encodage_probable(self.contenu)
+        self.url = url
+
+    @classmethod
+    def depuis_reponse(cls, response):
+        """Document d'une réponse requests (charset du Content-Type seulement s'il est explicite)"""
+        return cls(response.content, charset_reponse(response), response.url)
+
+    @cached_property
+    def tree(self):
+        """Arbre lxml (None si la page est vide ou illisible)"""
+        return MoteurExtraction.parser(self.contenu, self.encodage)
+
+    @cached_property
+    def texte(self):
+        """Texte visible de la page"""
+        if self.tree is None:
+            return ''
+        return self.tree.text_content()
+
+    @cached_property
+    def texte_minuscule(self):
+        """Texte en minuscules pour les recherches d'indicateurs"""
+        return self.texte.lower()
+
+    @cached_property
+    def titre(self):
+        """Contenu de la balise <title>"""
+        if self.tree is None:
+            return ''
+        return (self.tree.findtext('.//title') or '').strip()
+
+    @cached_property
+    def echantillon_brut(self):
+        """Premiers octets de la réponse, décodés (sans resérialiser l'arbre)"""
+        try:
+            return self.contenu[:TAILLE_ECHANTILLON].decode(self.encodage, errors='replace')
+        except LookupError:  # charset annoncé inconnu
+            return self.contenu[:TAILLE_ECHANTILLON].decode('utf-8', errors='replace')
+
+
+class DocumentFlux(DocumentPage):
+    """Page analysée au fil des morceaux reçus (HTMLPullParser), sans garder le corps
+
+    conditions: {champ: fonction(element) -> valeur ou None}, évaluées à chaque
+    fermeture de balise. Une fois toutes trouvées (plus MARGE_FLUX octets),
+    alimenter() retourne True et la lecture peut s'arrêter: l'arbre partiel
+    suffit aux extracteurs. Seuls les premiers octets sont conservés (échantillon brut).
+    """
+
+    def __init__(self, conditions, encodage=None, url=None, marge=MARGE_FLUX):
+        self.contenu = b''
+        self.encodage = encodage
+        self.url = url
+        self.conditions = {champ: condition for champ, condition in conditions.items() if condition is not None}
+        self.valeurs = {}
+        self.octets_lus = 0
+        self.marge = marge
+        self._fin_lecture = None
+        self._parseur = None
+        self._racine = None
+
+    @classmethod
+    def pour_reponse(cls, response, conditions, marge=MARGE_FLUX):
+        """Document vide à alimenter avec le corps d'une réponse requests en flux"""
+        return cls(conditions, charset_reponse(response), response.url, marge)
+
+    @property
+    def complet(self):
+        """Toutes les conditions ont trouvé leur valeur"""
+        return len(self.valeurs) == len(self.conditions)
+
+    def alimenter(self, morceau):
+        """Ajoute un morceau du corps; True quand la suite n'est plus nécessaire"""
+        if not morceau:
+            return False
+
+        if self._parseur is None:
+            self.encodage = self.encodage or encodage_probable(morceau, partiel=True)
+            self._parseur = etree.HTMLPullParser(events=('end',), encoding=self.encodage)
+            self._parseur.set_element_class_lookup(lxml_html.HtmlElementClassLookup())
+
+        if len(self.contenu) < TAILLE_ECHANTILLON:
+            self.contenu += morceau[:TAILLE_ECHANTILLON - len(self.contenu)]
+        self.octets_lus += len(morceau)
+
+        try:
+            self._parseur.feed(morceau)
+        except (etree.ParserError, LookupError, ValueError) as e:
+            logger.warning(f"⚠️  HTML illisible: {e}")
+            return True
+
+        for _, element in self._parseur.read_events():
+            for champ, condition in self.conditions.items():
+                if champ not in self.valeurs:
+                    valeur = condition(element)
+                    if valeur is not None:
+                        self.valeurs[champ] = valeur
+
+        if self._fin_lecture is None and self.complet:
+            self._fin_lecture = self.octets_lus + self.marge
+        return self._fin_lecture is not None and self.octets_lus >= self._fin_lecture
+
+    def terminer(self):
+        """Ferme le parseur (balises encore ouvertes refermées), retourne l'arbre partiel"""
+        if self._parseur is not None:
+            try:
+                self._racine = self._parseur.close()
+            except (etree.ParserError, etree.XMLSyntaxError) as e:
+                logger.warning(f"⚠️  HTML illisible: {e}")
+            self._parseur = None
+        return self._racine
+
+    @property
+    def tree(self):
+        """Arbre lxml partiel (None avant terminer() ou si rien n'a été lu)"""
+        return self._racine
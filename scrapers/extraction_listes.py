@@ -0,0 +1,122 @@
+# scrapers/extraction_listes.py
+"""
+Extraction des pages de liste (recherche, catégorie): toutes les tuiles produit d'une page et le lien de page suivante
+Sélecteurs CSS précompilés par site, du plus spécifique au plus générique
+"""
+
+import logging
+from urllib.parse import urljoin
+
+from lxml.cssselect import CSSSelector
+
+from extraction_lxml import parse_prix, disponibilite_texte
+
+logger = logging.getLogger(__name__)
+
+# Par site: conteneur d'une tuile, puis champs cherchés dans la tuile; page_suivante sur toute la page
+SELECTEURS_LISTES = {
+    'cdiscount': {
+        'tuile': ['li.prdtBloc', 'article[data-testid="product-card"]', 'li[data-sku]'],
+        'nom': ['.prdtTit', '[data-testid="product-title"]', 'h2', 'h3'],
+        'lien': ['a.prdtBLink', 'a[href*="/f-"]', 'a[href]'],
+        'prix': ['.prdtPrice .price', '.price', '[data-price]'],
+        'prix_barre': ['.prdtPrSt', '.price-old', 'del', 's'],
+        'stock': ['.prdtStock', '.availability'],
+        'page_suivante': ['a[rel="next"]', 'a.jsNxtPage', '.pagination .next a']
+    },
+    'rueducommerce': {
+        'tuile': ['article.item', '.product-item', '[data-product-id]'],
+        'nom': ['.item__title', '[itemprop="name"]', 'h2', 'h3'],
+        'lien': ['a.item__link', 'a[href]'],
+        'prix': ['.item__price', '[itemprop="price"]', '.price'],
+        'prix_barre': ['.item__price--old', 'del', 's'],
+        'stock': ['.item__stock', '.availability'],
+        'page_suivante': ['a[rel="next"]', '.pagination__next a']
+    },
+    'boulanger': {
+        'tuile': ['li.product-list__item', 'article.product', '[data-product-id]'],
+        'nom': ['.product-title__main', '[itemprop="name"]', 'h2', 'h3'],
+        'lien': ['a.product-list__link', 'a[href]'],
+        'prix': ['.price__amount', '[itemprop="price"]', '.price'],
+        'prix_barre': ['.price__old', 'del', 's'],
+        'stock': ['.product-availability', '.availability'],
+        'page_suivante': ['a[rel="next"]', '.pagination__next']
+    }
+}
+
+
+class ExtracteurListes:
+    """Tuiles produit (nom, URL, prix, promotion, disponibilité) d'une page de liste"""
+
+    def __init__(self, selecteurs_listes=None):
+        selecteurs_listes = selecteurs_listes or SELECTEURS_LISTES
+        self._compiles = {
+            site: {champ: [CSSSelector(css) for css in selecteurs] for champ, selecteurs in champs.items()}
+            for site, champs in selecteurs_listes.items()
+        }
+
+    def sites(self):
+        return list(self._compiles)
+
+    @staticmethod
+    def _premier(element, selecteurs, valider):
+        for selecteur in selecteurs:
+            for trouve in selecteur(element):
+                valeur = valider(trouve)
+                if valeur is not None:
+                    return valeur
+        return None
+
+    @staticmethod
+    def _texte(element):
+        texte = ' '.join(element.text_content().split())
+        return texte[:255] if len(texte) > 3 else None
+
+    @staticmethod
+    def _prix(element):
+        prix = parse_prix(element.text_content().strip())
+        return prix if prix is not None else parse_prix(element.get('data-price') or element.get('content'))
+
+    def tuiles(self, tree, site):
+        """Éléments tuile de la page (premier sélecteur qui en trouve)"""
+        for selecteur in self._compiles.get(site, {}).get('tuile', []):
+            elements = selecteur(tree)
+            if elements:
+                return elements
+        return []
+
+    def extraire(self, tree, site, url_page):
+        """Offres de la page (tuiles sans nom, lien ou prix ignorées) et URL de la page suivante (ou None)"""
+        if tree is None or site not in self._compiles:
+            return [], None
+
+        selecteurs = self._compiles[site]
+        offres = []
+        for tuile in self.tuiles(tree, site):
+            nom = self._premier(tuile, selecteurs['nom'], self._texte)
+            lien = self._premier(tuile, selecteurs['lien'], lambda a: a.get('href') or None)
+            prix = self._premier(tuile, selecteurs['prix'], self._prix)
+            if not (nom and lien and prix):
+                continue
+
+            # Prix barré supérieur au prix affiché: prix_ttc = prix de référence, prix_promotion = prix payé
+            prix_barre = self._premier(tuile, selecteurs['prix_barre'], self._prix)
+            en_promotion = prix_barre is not None and prix_barre > prix
+            stock = self._premier(tuile, selecteurs['stock'], self._texte)
+
+            offres.append({
+                'url': urljoin(url_page, lien),
+                'nom_produit': nom,
+                'prix_ttc': prix_barre if en_promotion else prix,
+                'prix_promotion': prix if en_promotion else None,
+                'en_promotion': en_promotion,
+                'disponible': disponibilite_texte((stock or tuile.text_content()).lower()),
+                'stock_affiche': stock or "Non spécifié"
+            })
+
+        suivante = self._premier(tree, selecteurs['page_suivante'], lambda a: a.get('href') or None)
+        return offres, urljoin(url_page, suivante) if suivante else None
+
+
+# Instance partagée (sélecteurs compilés une fois par processus)
+extracteur_listes = ExtracteurListes()
@@ -0,0 +1,312 @@
+# scrapers/extraction_lxml.py
+"""
+Moteur d'extraction lxml avec sélecteurs CSS précompilés par site
+Le sélecteur qui a fonctionné en dernier pour un site est essayé en premier
+"""
+
+import re
+import codecs
+import logging
+import threading
+
+from lxml import etree
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+from cssselect import GenericTranslator
+
+from metriques import observer_extraction
+
+logger = logging.getLogger(__name__)
+
+# Sélecteurs par site et par champ, du plus spécifique au plus générique
+SELECTEURS_PAR_SITE = {
+    'cdiscount': {
+        'nom': [
+            'h1[data-product="name"]',
+            'h1.fpHdrDsc',
+            'h1.product-title',
+            '.fpHdr h1',
+            'h1.title',
+            'h1',
+            '.product-name h1',
+            '[data-testid="product-title"]'
+        ],
+        'prix': [
+            '.fpPrice .price',
+            '.price-current',
+            '.product-price .price',
+            '[data-price]',
+            '.fpPrice',
+            '.price',
+            '.current-price',
+            '.sale-price'
+        ]
+    },
+    'rueducommerce': {
+        'nom': [
+            'h1.product-name',
+            '[itemprop="name"]',
+            'h1'
+        ],
+        'prix': [
+            '[itemprop="price"]',
+            '.price__amount',
+            '.product-price',
+            '[data-price]',
+            '.price'
+        ]
+    },
+    'boulanger': {
+        'nom': [
+            'h1.product-title__main',
+            '[itemprop="name"]',
+            'h1'
+        ],
+        'prix': [
+            '[itemprop="price"]',
+            '.price__amount',
+            '.product-price',
+            '[data-price]',
+            '.price'
+        ]
+    }
+}
+
+# Indicateurs de stock dans le texte (rupture prioritaire)
+INDICATEURS_DISPONIBLE = ('en stock', 'disponible', 'available', 'livraison', 'expedie')
+INDICATEURS_RUPTURE = ('rupture', 'indisponible', 'non disponible', 'out of stock', 'épuisé')
+
+# Attributs porteurs d'un prix quand le texte de l'élément n'en contient pas
+ATTRIBUTS_PRIX = ('data-price', 'content')
+
+# Code EAN/GTIN: microdonnées schema.org, puis JSON-LD des balises script
+_SELECTEUR_GTIN = CSSSelector('[itemprop^="gtin"]')
+_RE_GTIN_JSON = re.compile(r'"gtin(?:8|12|13|14)?"\s*:\s*"(\d{8,14})"')
+
+_RE_NETTOYAGE_PRIX = re.compile(r'[^\d,.]')
+_RE_META_CHARSET = re.compile(rb'''<meta[^>]+charset=["']?([\w-]+)''', re.IGNORECASE)
+
+# Motifs de prix français dans le texte libre (repli quand aucun sélecteur ne répond)
+MOTIFS_PRIX = [
+    re.compile(r'(\d{1,4})[,.](\d{2})\s*€'),
+    re.compile(r'(\d{1,4})\s*€'),
+    re.compile(r'EUR\s*(\d{1,4})[,.](\d{2})', re.IGNORECASE),
+]
+
+
+def parse_prix(price_text):
+    """Parse texte prix en float (formats français), None si irréaliste"""
+    if not price_text:
+        return None
+
+    try:
+        # Nettoyer: garder chiffres, virgules, points
+        clean_price = _RE_NETTOYAGE_PRIX.sub('', str(price_text))
+
+        if not clean_price:
+            return None
+
+        # Gérer formats français
+        if ',' in clean_price and '.' in clean_price:
+            # Format 1.234,56
+            clean_price = clean_price.replace('.', '').replace(',', '.')
+        elif ',' in clean_price:
+            # Format 123,45
+            clean_price = clean_price.replace(',', '.')
+
+        price = float(clean_price)
+
+        # Vérifier prix réaliste
+        if 1 <= price <= 10000:
+            return price
+        return None
+
+    except (ValueError, TypeError):
+        return None
+
+
+def encodage_probable(contenu, partiel=False):
+    """Encodage d'une page: <meta charset> s'il existe, sinon UTF-8 si décodable, sinon cp1252
+
+    Sans cette détection libxml2 suppose latin-1 et abîme les « € ».
+    partiel=True pour un début de flux: un caractère coupé en fin de morceau n'est pas une erreur.
+    """
+    match = _RE_META_CHARSET.search(contenu[:4096])
+    if match:
+        return match.group(1).decode('ascii').lower()
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(contenu, final=not partiel)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'windows-1252'
+
+
+def disponibilite_texte(texte_minuscule, defaut=True):
+    """Disponibilité d'après les indicateurs du texte (minuscules), defaut si aucun n'apparaît"""
+    if not texte_minuscule:
+        return defaut
+    if any(indicateur in texte_minuscule for indicateur in INDICATEURS_RUPTURE):
+        return False
+    if any(indicateur in texte_minuscule for indicateur in INDICATEURS_DISPONIBLE):
+        return True
+    return defaut
+
+
+def ean_valide(code):
+    """True si code est un EAN-8/13 (ou GTIN-12/14) dont la clé de contrôle est juste"""
+    if not code or not code.isdigit() or len(code) not in (8, 12, 13, 14):
+        return False
+    chiffres = [int(c) for c in reversed(code[:-1])]
+    somme = sum(c * (3 if i % 2 == 0 else 1) for i, c in enumerate(chiffres))
+    return (10 - somme % 10) % 10 == int(code[-1])
+
+
+def extraire_ean(tree):
+    """EAN de la page (microdonnées ou JSON-LD), GTIN-12/14 ramenés à 13 chiffres; None si absent ou invalide"""
+    if tree is None:
+        return None
+    candidats = [element.get('content') or element.text_content().strip() for element in _SELECTEUR_GTIN(tree)]
+    for script in tree.iter('script'):
+        if script.text and 'gtin' in script.text:
+            candidats.extend(_RE_GTIN_JSON.findall(script.text))
+    for code in candidats:
+        if ean_valide(code):
+            if len(code) == 12 or (len(code) == 14 and code[0] == '0'):
+                return code.zfill(13)[-13:]
+            return code
+    return None
+
+
+def trouver_prix_texte(texte, prix_min=1, prix_max=5000):
+    """Premier prix réaliste trouvé dans un texte, motif par motif"""
+    if not texte:
+        return None
+
+    for motif in MOTIFS_PRIX:
+        for match in motif.finditer(texte):
+            groupes = match.groups()
+            if len(groupes) == 2:
+                price = float(f"{groupes[0]}.{groupes[1]}")
+            else:
+                price = float(groupes[0])
+
+            if prix_min <= price <= prix_max:
+                return price
+    return None
+
+
+class MoteurExtraction:
+    """Extraction nom/prix sur un arbre lxml, sélecteurs compilés une seule fois"""
+
+    def __init__(self, selecteurs_par_site=None):
+        selecteurs_par_site = selecteurs_par_site or SELECTEURS_PAR_SITE
+        self._compiles = {
+            site: {
+                champ: [(css, CSSSelector(css)) for css in selecteurs]
+                for champ, selecteurs in champs.items()
+            }
+            for site, champs in selecteurs_par_site.items()
+        }
+        # Mêmes sélecteurs ancrés sur l'élément courant (self::), pour le parsing en flux
+        traducteur = GenericTranslator()
+        self._locaux = {
+            site: {
+                champ: [etree.XPath(traducteur.css_to_xpath(css, prefix='self::')) for css in selecteurs]
+                for champ, selecteurs in champs.items()
+            }
+            for site, champs in selecteurs_par_site.items()
+        }
+        # (site, champ) -> rang du dernier sélecteur ayant fonctionné
+        self._dernier_succes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parser(contenu, encodage=None):
+        """Construit l'arbre HTML (None si la page est vide ou illisible)"""
+        if not contenu:
+            return None
+        try:
+            parseur = lxml_html.HTMLParser(encoding=encodage or encodage_probable(contenu))
+            return lxml_html.fromstring(contenu, parser=parseur)
+        except (etree.ParserError, LookupError, ValueError) as e:
+            logger.warning(f"⚠️  HTML illisible: {e}")
+            return None
+
+    def _ordre(self, site, champ):
+        """Sélecteurs du site, le dernier gagnant en tête"""
+        selecteurs = self._compiles.get(site, {}).get(champ, [])
+        rang = self._dernier_succes.get((site, champ))
+        if rang is None or rang >= len(selecteurs):
+            return list(enumerate(selecteurs))
+        return [(rang, selecteurs[rang])] + [
+            (i, sel) for i, sel in enumerate(selecteurs) if i != rang
+        ]
+
+    def _premier_match(self, tree, site, champ, valider):
+        """Valeur du premier sélecteur qui produit un résultat valide"""
+        if tree is None:
+            return None
+
+        for rang, (css, selecteur) in self._ordre(site, champ):
+            for element in selecteur(tree):
+                valeur = valider(element)
+                if valeur is not None:
+                    if self._dernier_succes.get((site, champ)) != rang:
+                        with self._lock:
+                            self._dernier_succes[(site, champ)] = rang
+                    observer_extraction(site, champ, rang)
+                    return valeur
+        observer_extraction(site, champ, None)
+        return None
+
+    @staticmethod
+    def _valider_nom(element):
+        name = element.text_content().strip()
+        if name and len(name) > 3:  # Nom valide
+            return name[:255]  # Limite DB
+        return None
+
+    @staticmethod
+    def _valider_prix(element):
+        price = parse_prix(element.text_content().strip())
+        if price and price > 0:
+            return price
+        for attribut in ATTRIBUTS_PRIX:
+            price = parse_prix(element.get(attribut))
+            if price and price > 0:
+                return price
+        return None
+
+    def extraire_nom(self, tree, site):
+        """Nom produit via sélecteurs, None si introuvable"""
+        return self._premier_match(tree, site, 'nom', self._valider_nom)
+
+    def extraire_prix(self, tree, site):
+        """Prix via sélecteurs (texte puis attributs data-price/content), None si introuvable"""
+        return self._premier_match(tree, site, 'prix', self._valider_prix)
+
+    def detecteur(self, site, champ):
+        """Fonction element -> valeur du sélecteur prioritaire du champ, évaluée sur un élément qui vient de se fermer
+
+        Sert à arrêter un parsing en flux: quand le sélecteur essayé en premier par
+        extraire_nom/extraire_prix répond, la suite de la page ne changera pas son résultat.
+        """
+        ordre = self._ordre(site, champ)
+        if not ordre:
+            return None
+        rang = ordre[0][0]
+        local = self._locaux[site][champ][rang]
+        valider = self._valider_nom if champ == 'nom' else self._valider_prix
+
+        def detecter(element):
+            for trouve in local(element):
+                valeur = valider(trouve)
+                if valeur is not None:
+                    return valeur
+            return None
+
+        return detecter
+
+
+# Instance partagée: la mémoire des sélecteurs gagnants vaut pour tout le processus
+moteur_extraction = MoteurExtraction()
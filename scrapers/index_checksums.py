@@ -0,0 +1,88 @@
+# scrapers/index_checksums.py
+"""
+Index du dernier checksum connu par (site, URL)
+Permet de ne pas réécrire un produit identique à la collecte précédente
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from redis_client import get_redis, signaler_indisponible
+
+logger = logging.getLogger(__name__)
+
+PREFIXE_CHECKSUMS = 'techpulse:checksums'
+PREFIXE_VUS = 'techpulse:vus'
+
+
+class IndexChecksums:
+    """Dernier checksum par (site, URL): Redis si disponible, sinon mémoire du processus
+
+    espace sépare des checksums calculés autrement (tuiles des pages de liste) de ceux des pages produit.
+    """
+
+    def __init__(self, espace=None):
+        suffixe = f":{espace}" if espace else ''
+        self._prefixe_checksums = PREFIXE_CHECKSUMS + suffixe
+        self._prefixe_vus = PREFIXE_VUS + suffixe
+        self._local_checksums = {}
+        self._local_vus = {}
+        self._lock = threading.Lock()
+
+    def precedent(self, site_id, url):
+        """Checksum de la dernière écriture du produit, None s'il n'a jamais été écrit"""
+        client = get_redis()
+        if client is not None:
+            try:
+                precedent = client.hget(f"{self._prefixe_checksums}:{site_id}", url)
+                return precedent.decode() if precedent is not None else None
+            except Exception as e:
+                signaler_indisponible(e)
+
+        with self._lock:
+            return self._local_checksums.get((site_id, url))
+
+    def est_inchange(self, site_id, url, checksum):
+        """True si le produit a le même checksum qu'à sa dernière écriture"""
+        if not checksum:
+            return False
+        return self.precedent(site_id, url) == checksum
+
+    def toucher(self, site_id, url):
+        """Trace légère « vu aujourd'hui » pour un produit inchangé (aucune écriture SQL)"""
+        maintenant = datetime.now().isoformat()
+
+        client = get_redis()
+        if client is not None:
+            try:
+                client.hset(f"{self._prefixe_vus}:{site_id}", url, maintenant)
+                return
+            except Exception as e:
+                signaler_indisponible(e)
+
+        with self._lock:
+            self._local_vus[(site_id, url)] = maintenant
+
+    def enregistrer_lot(self, site_id, checksums_par_url):
+        """Mémorise les checksums d'un lot effectivement écrit en base"""
+        if not checksums_par_url:
+            return
+
+        maintenant = datetime.now().isoformat()
+
+        client = get_redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(f"{self._prefixe_checksums}:{site_id}", mapping=checksums_par_url)
+                pipe.hset(f"{self._prefixe_vus}:{site_id}", mapping={url: maintenant for url in checksums_par_url})
+                pipe.execute()
+                return
+            except Exception as e:
+                signaler_indisponible(e)
+
+        with self._lock:
+            for url, checksum in checksums_par_url.items():
+                self._local_checksums[(site_id, url)] = checksum
+                self._local_vus[(site_id, url)] = maintenant
@@ -0,0 +1,390 @@
+# scrapers/ingestion_batch.py
+"""
+Ingestion par lots dans produits_concurrents et historique_prix (agrégats quotidiens, alertes et derniers prix au passage)
+Un seul aller-retour et un seul commit par lot (execute_values)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from psycopg2.extras import execute_values
+
+from db_pool import connexion_db
+from metriques import observer_ecriture
+from rapprochement import moteur_partage
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT_DEFAUT = 500
+
+# Alertes générées à l'ingestion (TECHPULSE_ALERTES vide: aucune)
+TYPES_ALERTES = ('baisse_prix', 'rupture_stock', 'nouveau_concurrent')
+ALERTES_ACTIVES = [
+    type_alerte.strip() for type_alerte in os.getenv('TECHPULSE_ALERTES', ','.join(TYPES_ALERTES)).split(',')
+    if type_alerte.strip() in TYPES_ALERTES
+]
+SEUIL_BAISSE_PRIX = float(os.getenv('TECHPULSE_ALERTE_SEUIL_BAISSE', '5'))  # en % du dernier prix connu
+
+# Insertion de la collecte et, dans la même instruction:
+# - cumul des agrégats quotidiens du site
+# - alertes par comparaison avec le dernier état connu de chaque (produit, site)
+#   (les CTE voient derniers_prix_concurrents tel qu'avant l'instruction)
+# - mise à jour de ce dernier état avec l'écart au prix TechPulse
+# Retourne (derniers prix mis à jour, alertes créées)
+INSERT_PRODUITS = """
+    WITH lignes AS (
+        INSERT INTO produits_concurrents (
+            id_produit_techpulse, id_site, url_produit, nom_produit_concurrent,
+            prix_ttc, prix_promotion, en_promotion, disponible, stock_affiche,
+            note_moyenne, nombre_avis, date_collecte, donnees_brutes, checksum_produit
+        ) VALUES %s
+        RETURNING id_produit_concurrent, id_produit_techpulse, id_site, url_produit, nom_produit_concurrent,
+                  prix_ttc, prix_promotion, en_promotion, disponible, note_moyenne, nombre_avis, date_collecte
+    ), resume AS (
+        INSERT INTO resume_collecte_quotidien AS r (
+            jour, id_site, nb_produits, nb_prix, somme_prix, prix_min, prix_max, nb_promotions, nb_disponibles
+        )
+        SELECT date_collecte::date, id_site, COUNT(*), COUNT(prix_ttc), COALESCE(SUM(prix_ttc), 0), MIN(prix_ttc), MAX(prix_ttc),
+               COUNT(*) FILTER (WHERE en_promotion), COUNT(*) FILTER (WHERE disponible)
+        FROM lignes
+        GROUP BY date_collecte::date, id_site
+        ON CONFLICT (jour, id_site) DO UPDATE SET
+            nb_produits = r.nb_produits + EXCLUDED.nb_produits,
+            nb_prix = r.nb_prix + EXCLUDED.nb_prix,
+            somme_prix = r.somme_prix + EXCLUDED.somme_prix,
+            prix_min = LEAST(r.prix_min, EXCLUDED.prix_min),
+            prix_max = GREATEST(r.prix_max, EXCLUDED.prix_max),
+            nb_promotions = r.nb_promotions + EXCLUDED.nb_promotions,
+            nb_disponibles = r.nb_disponibles + EXCLUDED.nb_disponibles
+    ), nouveaux AS (
+        SELECT DISTINCT ON (l.id_produit_techpulse, l.id_site)
+            l.id_produit_techpulse, l.id_site, l.id_produit_concurrent, l.url_produit, l.nom_produit_concurrent,
+            l.prix_ttc, l.prix_promotion, l.en_promotion, l.disponible, l.note_moyenne, l.nombre_avis,
+            l.date_collecte, pt.prix_vente_ttc AS prix_techpulse, ecart_prix(l.prix_ttc, pt.prix_vente_ttc) AS ecart_pourcentage,
+            l.date_collecte AS derniere_vue
+        FROM lignes l
+        JOIN produits_techpulse pt ON pt.id_produit = l.id_produit_techpulse
+        WHERE l.prix_ttc IS NOT NULL
+        ORDER BY l.id_produit_techpulse, l.id_site, l.date_collecte DESC
+    ), alertes AS (
+        INSERT INTO alertes_prix (
+            id_produit_techpulse, id_site, type_alerte, ancien_prix, nouveau_prix, pourcentage_variation, commentaire
+        )
+        SELECT n.id_produit_techpulse, n.id_site, a.type_alerte, dp.prix_ttc, n.prix_ttc, a.variation, a.commentaire
+        FROM nouveaux n
+        LEFT JOIN derniers_prix_concurrents dp
+          ON dp.id_produit_techpulse = n.id_produit_techpulse AND dp.id_site = n.id_site
+        CROSS JOIN LATERAL (VALUES
+            ('baisse_prix', ecart_prix(n.prix_ttc, dp.prix_ttc), n.url_produit,
+             n.prix_ttc <= dp.prix_ttc * (1 - {seuil_baisse} / 100.0)),
+            ('rupture_stock', NULL, n.url_produit,
+             dp.disponible AND NOT n.disponible),
+            ('nouveau_concurrent', NULL, 'Écart avec TechPulse: ' || n.ecart_pourcentage || '%% (' || n.url_produit || ')',
+             dp.id_site IS NULL)
+        ) AS a(type_alerte, variation, commentaire, declenchee)
+        WHERE a.declenchee
+          AND a.type_alerte = ANY(ARRAY[{types_actifs}]::varchar[])
+          AND (dp.date_collecte IS NULL OR dp.date_collecte <= n.date_collecte)
+        RETURNING 1
+    ), derniers AS (
+        INSERT INTO derniers_prix_concurrents (
+            id_produit_techpulse, id_site, id_produit_concurrent, url_produit, nom_produit_concurrent,
+            prix_ttc, prix_promotion, en_promotion, disponible, note_moyenne, nombre_avis,
+            date_collecte, prix_techpulse, ecart_pourcentage, derniere_vue
+        )
+        SELECT * FROM nouveaux
+        ON CONFLICT (id_produit_techpulse, id_site) DO UPDATE SET
+            id_produit_concurrent = EXCLUDED.id_produit_concurrent,
+            url_produit = EXCLUDED.url_produit,
+            nom_produit_concurrent = EXCLUDED.nom_produit_concurrent,
+            prix_ttc = EXCLUDED.prix_ttc,
+            prix_promotion = EXCLUDED.prix_promotion,
+            en_promotion = EXCLUDED.en_promotion,
+            disponible = EXCLUDED.disponible,
+            note_moyenne = EXCLUDED.note_moyenne,
+            nombre_avis = EXCLUDED.nombre_avis,
+            date_collecte = EXCLUDED.date_collecte,
+            prix_techpulse = EXCLUDED.prix_techpulse,
+            ecart_pourcentage = EXCLUDED.ecart_pourcentage,
+            derniere_vue = GREATEST(derniers_prix_concurrents.derniere_vue, EXCLUDED.derniere_vue)
+        WHERE derniers_prix_concurrents.date_collecte <= EXCLUDED.date_collecte
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM derniers), (SELECT COUNT(*) FROM alertes)
+""".format(
+    seuil_baisse=SEUIL_BAISSE_PRIX,
+    types_actifs=', '.join(f"'{type_alerte}'" for type_alerte in ALERTES_ACTIVES)
+)
+
+# Une ligne par (produit, site, jour): la dernière collecte du jour l'emporte
+UPSERT_HISTORIQUE = """
+    INSERT INTO historique_prix (
+        id_produit_techpulse, id_site, prix_ttc, prix_promotion, en_promotion, date_prix
+    ) VALUES %s
+    ON CONFLICT (id_produit_techpulse, id_site, date_prix) DO UPDATE SET
+        prix_ttc = EXCLUDED.prix_ttc,
+        prix_promotion = EXCLUDED.prix_promotion,
+        en_promotion = EXCLUDED.en_promotion,
+        heure_collecte = CURRENT_TIME
+"""
+
+# Collectes inchangées (aucune ligne écrite):
+# - le dernier prix connu est marqué comme vu (par URL: une offre rapprochée au fil de l'ingestion
+#   n'a pas de produit TechPulse dans le tampon)
+# - le produit compte dans les agrégats quotidiens, avec les valeurs de la collecte (celles de la dernière écriture)
+MARQUER_VUS = """
+    WITH vus (id_site, url_produit, prix_ttc, en_promotion, disponible, date_collecte) AS (
+        VALUES %s
+    ), derniers AS (
+        UPDATE derniers_prix_concurrents dp SET derniere_vue = v.date_collecte
+        FROM vus v
+        WHERE dp.id_site = v.id_site AND dp.url_produit = v.url_produit AND dp.derniere_vue < v.date_collecte
+        RETURNING 1
+    )
+    INSERT INTO resume_collecte_quotidien AS r (
+        jour, id_site, nb_produits, nb_inchanges, nb_prix, somme_prix, prix_min, prix_max, nb_promotions, nb_disponibles
+    )
+    SELECT date_collecte::date, id_site, COUNT(*), COUNT(*), COUNT(prix_ttc), COALESCE(SUM(prix_ttc), 0),
+           MIN(prix_ttc), MAX(prix_ttc), COUNT(*) FILTER (WHERE en_promotion), COUNT(*) FILTER (WHERE disponible)
+    FROM vus
+    GROUP BY date_collecte::date, id_site
+    ON CONFLICT (jour, id_site) DO UPDATE SET
+        nb_produits = r.nb_produits + EXCLUDED.nb_produits,
+        nb_inchanges = r.nb_inchanges + EXCLUDED.nb_inchanges,
+        nb_prix = r.nb_prix + EXCLUDED.nb_prix,
+        somme_prix = r.somme_prix + EXCLUDED.somme_prix,
+        prix_min = LEAST(r.prix_min, EXCLUDED.prix_min),
+        prix_max = GREATEST(r.prix_max, EXCLUDED.prix_max),
+        nb_promotions = r.nb_promotions + EXCLUDED.nb_promotions,
+        nb_disponibles = r.nb_disponibles + EXCLUDED.nb_disponibles
+"""
+GABARIT_VUS = '(%s, %s, %s::decimal, %s::boolean, %s::boolean, %s::timestamp)'
+
+
+class IngestionBatch:
+    """Tampon d'ingestion d'un site: accumule les produits et les écrit par lots"""
+
+    def __init__(self, site_id, site_name=None, taille_lot=TAILLE_LOT_DEFAUT, index_checksums=None, rapprochement=None):
+        self.site_id = site_id
+        self.site_name = site_name or str(site_id)
+        self.taille_lot = taille_lot
+        self.index_checksums = index_checksums
+        # Produit TechPulse des lignes qui n'en ont pas (None: moteur partagé du processus)
+        self.rapprochement = rapprochement
+        # Écriture d'un lot plein: dans le thread appelant, ou confiée à ecriture_differee(flush) (réacteur Scrapy)
+        self.ecriture_differee = None
+        self._tampon = []
+        self._vus = []
+        self._ean_par_url = {}
+        self._lock = threading.Lock()
+        # Produits TechPulse passés à ajouter() et effectivement collectés (écrits ou inchangés)
+        self.collectes = []
+        self.stats = {
+            'lignes': 0,
+            'erreurs': 0,
+            'inchanges': 0,
+            'lots': 0,
+            'alertes': 0,
+            'rapproches': 0,
+            'duree_ecriture': 0.0
+        }
+
+    def ajouter(self, product_data, donnees_brutes=None, id_produit_techpulse=None):
+        """Ajoute un produit au tampon; écrit le lot dès qu'il est plein
+
+        Retourne False si le produit est identique à sa dernière écriture
+        (même checksum): il est seulement marqué comme vu.
+        """
+        checksum = product_data.get('checksum_produit')
+        if self.index_checksums is not None and self.index_checksums.est_inchange(self.site_id, product_data['url'], checksum):
+            self.index_checksums.toucher(self.site_id, product_data['url'])
+            with self._lock:
+                self.stats['inchanges'] += 1
+                if id_produit_techpulse is not None:
+                    self.collectes.append(id_produit_techpulse)
+                self._vus.append((
+                    self.site_id, product_data['url'], product_data['prix_ttc'], product_data['en_promotion'],
+                    product_data['disponible'], product_data['date_collecte']
+                ))
+                plein = len(self._tampon) + len(self._vus) >= self.taille_lot
+            if plein:
+                self._ecrire_lot_plein()
+            return False
+
+        ligne = (
+            id_produit_techpulse,
+            self.site_id,
+            product_data['url'],
+            product_data['nom_produit'],
+            product_data['prix_ttc'],
+            product_data['prix_promotion'],
+            product_data['en_promotion'],
+            product_data['disponible'],
+            product_data['stock_affiche'],
+            product_data['note_moyenne'],
+            product_data['nombre_avis'],
+            product_data['date_collecte'],
+            json.dumps(donnees_brutes if donnees_brutes is not None else {}),
+            checksum
+        )
+
+        with self._lock:
+            self._tampon.append(ligne)
+            if id_produit_techpulse is None and product_data.get('ean'):
+                self._ean_par_url[product_data['url']] = product_data['ean']
+            plein = len(self._tampon) + len(self._vus) >= self.taille_lot
+
+        if plein:
+            self._ecrire_lot_plein()
+        return True
+
+    def _ecrire_lot_plein(self):
+        if self.ecriture_differee is not None:
+            self.ecriture_differee(self.flush)
+        else:
+            self.flush()
+
+    def flush(self):
+        """Écrit le contenu du tampon en un seul commit, retourne le nombre de lignes écrites"""
+        with self._lock:
+            lot, self._tampon = self._tampon, []
+            vus, self._vus = self._vus, []
+            ean_par_url, self._ean_par_url = self._ean_par_url, {}
+
+        if vus:
+            self._marquer_vus(vus)
+        if not lot:
+            return 0
+
+        start_time = time.time()
+        # Produit de l'appelant par URL (le rapprochement complète ensuite les lignes qui n'en ont pas)
+        planifies = {ligne[2]: ligne[0] for ligne in lot if ligne[0] is not None}
+        lot, moteur = self._rapprocher(lot, ean_par_url)
+        historique = self._lignes_historique(lot)
+        try:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                derniers_prix, alertes = execute_values(cursor, INSERT_PRODUITS, lot, page_size=len(lot), fetch=True)[0]
+                if historique:
+                    execute_values(cursor, UPSERT_HISTORIQUE, historique, page_size=len(historique))
+                conn.commit()
+            ecrites = lot
+
+        except Exception as e:
+            # Un lot rejeté ne doit pas faire perdre les lignes valides
+            logger.warning(f"⚠️  Lot {self.site_name} rejeté ({e}), reprise ligne par ligne")
+            ecrites, derniers_prix, alertes = self._flush_ligne_a_ligne(lot)
+            historique = self._lignes_historique(ecrites)
+
+        duree = time.time() - start_time
+        nb_ecrites = len(ecrites)
+        observer_ecriture(self.site_name, duree, {
+            'produits_concurrents': nb_ecrites,
+            'historique_prix': len(historique),
+            'derniers_prix_concurrents': derniers_prix,
+            'alertes_prix': alertes
+        })
+        if moteur is not None:
+            moteur.enregistrer()
+        if self.index_checksums is not None:
+            self.index_checksums.enregistrer_lot(
+                self.site_id, {ligne[2]: ligne[13] for ligne in ecrites if ligne[13]}
+            )
+
+        with self._lock:
+            self.collectes.extend(planifies[ligne[2]] for ligne in ecrites if ligne[2] in planifies)
+            self.stats['lignes'] += nb_ecrites
+            self.stats['erreurs'] += len(lot) - nb_ecrites
+            self.stats['lots'] += 1
+            self.stats['alertes'] += alertes
+            self.stats['duree_ecriture'] += duree
+
+        debit = nb_ecrites / duree if duree > 0 else 0
+        logger.info(f"💾 Lot {self.site_name}: {nb_ecrites}/{len(lot)} lignes en {duree:.2f}s ({debit:.0f} lignes/s)")
+        if alertes:
+            logger.info(f"🚨 {alertes} alerte(s) prix/stock créée(s) pour {self.site_name}")
+        return nb_ecrites
+
+    def _marquer_vus(self, vus):
+        """Collectes inchangées: derniere_vue et agrégats quotidiens, en une instruction pour tout le lot"""
+        try:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, MARQUER_VUS, vus, template=GABARIT_VUS, page_size=len(vus))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️  {len(vus)} collecte(s) inchangée(s) de {self.site_name} non comptées ({e})")
+
+    def _rapprocher(self, lot, ean_par_url):
+        """Lot dont les lignes sans produit TechPulse sont rapprochées du catalogue (un seul scoring par lot)"""
+        a_rapprocher = [rang for rang, ligne in enumerate(lot) if ligne[0] is None]
+        moteur = (self.rapprochement or moteur_partage()) if a_rapprocher else None
+        if moteur is None:
+            return lot, None
+
+        try:
+            ids = moteur.identifier_lot(
+                self.site_id,
+                [(lot[rang][2], lot[rang][3], ean_par_url.get(lot[rang][2]), lot[rang][4]) for rang in a_rapprocher]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Rapprochement {self.site_name} indisponible ({e}), lignes écrites sans produit")
+            return lot, None
+
+        lot = list(lot)
+        for rang, id_produit in zip(a_rapprocher, ids):
+            if id_produit is not None:
+                lot[rang] = (id_produit,) + lot[rang][1:]
+        with self._lock:
+            self.stats['rapproches'] += sum(1 for id_produit in ids if id_produit is not None)
+        return lot, moteur
+
+    def _lignes_historique(self, lot):
+        """Lignes historique_prix du lot (produits rattachés au catalogue, dédoublonnées par jour)"""
+        historique = {}
+        for ligne in lot:
+            id_produit, id_site, prix_ttc, date_collecte = ligne[0], ligne[1], ligne[4], ligne[11]
+            if id_produit is None or prix_ttc is None:
+                continue
+            cle = (id_produit, id_site, date_collecte.date())
+            historique[cle] = (id_produit, id_site, prix_ttc, ligne[5], ligne[6], date_collecte.date())
+        return list(historique.values())
+
+    def _flush_ligne_a_ligne(self, lot):
+        """Repli: une ligne par savepoint, toujours un seul commit
+
+        Retourne les lignes écrites, le nombre de derniers prix mis à jour et d'alertes créées.
+        """
+        ecrites = []
+        derniers_prix = alertes = 0
+        try:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                for ligne in lot:
+                    cursor.execute("SAVEPOINT ligne")
+                    try:
+                        maj_dernier_prix, alertes_ligne = execute_values(cursor, INSERT_PRODUITS, [ligne], fetch=True)[0]
+                        historique = self._lignes_historique([ligne])
+                        if historique:
+                            execute_values(cursor, UPSERT_HISTORIQUE, historique)
+                        cursor.execute("RELEASE SAVEPOINT ligne")
+                        ecrites.append(ligne)
+                        derniers_prix += maj_dernier_prix
+                        alertes += alertes_ligne
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT ligne")
+                        logger.error(f"❌ Ligne rejetée {ligne[2]}: {e}")
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde lot {self.site_name}: {e}")
+            return [], 0, 0
+        return ecrites, derniers_prix, alertes
+
+    def lignes_par_seconde(self):
+        """Débit d'écriture moyen depuis la création du tampon"""
+        if self.stats['duree_ecriture'] <= 0:
+            return 0.0
+        return self.stats['lignes'] / self.stats['duree_ecriture']
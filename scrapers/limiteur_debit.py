@@ -0,0 +1,125 @@
+# scrapers/limiteur_debit.py
+"""
+Limiteur de débit par hôte (seau à jetons) configuré depuis sites_concurrents.delai_requete_sec
+Le seau vit dans Redis: tous les workers Airflow partagent le même budget par site
+"""
+
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from db_pool import connexion_db
+from redis_client import get_redis, signaler_indisponible
+
+logger = logging.getLogger(__name__)
+
+PREFIXE_SEAUX = 'techpulse:debit'
+
+# Hôtes absents de sites_concurrents: même défaut que la colonne delai_requete_sec
+DELAI_DEFAUT_SEC = float(os.getenv('TECHPULSE_DELAI_DEFAUT_SEC', '3'))
+# Requêtes autorisées d'affilée après une période calme (1 = espacement strict)
+RAFALE = int(os.getenv('TECHPULSE_DEBIT_RAFALE', '1'))
+
+# Réservation d'un jeton: le solde peut devenir négatif, l'appelant attend alors
+# exactement le temps de le ramener à zéro (pas d'attente à l'aveugle ni de sondage).
+# L'horloge est celle de Redis pour que tous les workers voient le même temps.
+SCRIPT_RESERVATION = """
+local t = redis.call('TIME')
+local maintenant = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local debit = tonumber(ARGV[1])
+local capacite = tonumber(ARGV[2])
+local etat = redis.call('HMGET', KEYS[1], 'jetons', 'maj')
+local jetons = tonumber(etat[1]) or capacite
+local maj = tonumber(etat[2]) or maintenant
+jetons = math.min(capacite, jetons + (maintenant - maj) * debit) - 1
+redis.call('HSET', KEYS[1], 'jetons', tostring(jetons), 'maj', tostring(maintenant))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacite / debit) + 60)
+if jetons < 0 then
+    return tostring(-jetons / debit)
+end
+return '0'
+"""
+
+
+def hote_url(url):
+    """Hôte normalisé d'une URL (clé du seau)"""
+    return urlsplit(url).netloc.lower()
+
+
+class LimiteurDebit:
+    """Seau à jetons par hôte: Redis si disponible, sinon mémoire du processus"""
+
+    def __init__(self, delais_par_hote=None, delai_defaut=DELAI_DEFAUT_SEC, rafale=RAFALE):
+        # None: chargés depuis sites_concurrents au premier appel
+        self._delais = delais_par_hote
+        self.delai_defaut = delai_defaut
+        self.rafale = max(rafale, 1)
+        self._seaux_locaux = {}
+        self._script = None
+        self._lock = threading.Lock()
+
+    def _charger_delais(self):
+        """delai_requete_sec des sites actifs, indexé par hôte"""
+        delais = {}
+        try:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT url_base, delai_requete_sec FROM sites_concurrents WHERE actif = true")
+                for url_base, delai in cursor.fetchall():
+                    if delai is not None:
+                        delais[hote_url(url_base)] = float(delai)
+                cursor.close()
+            logger.info(f"🚦 Délais par hôte: {delais}")
+        except Exception as e:
+            logger.warning(f"⚠️  Délais sites_concurrents indisponibles ({e}), {self.delai_defaut}s par hôte")
+        return delais
+
+    def delai_hote(self, hote):
+        """Intervalle minimal entre deux requêtes vers un hôte (0 = pas de limite)"""
+        if self._delais is None:
+            with self._lock:
+                if self._delais is None:
+                    self._delais = self._charger_delais()
+
+        delai = self._delais.get(hote)
+        if delai is None and hote.startswith('www.'):
+            delai = self._delais.get(hote[4:])
+        return self.delai_defaut if delai is None else delai
+
+    def reserver(self, url):
+        """Réserve un créneau pour une requête vers url, retourne l'attente nécessaire en secondes"""
+        hote = hote_url(url)
+        delai = self.delai_hote(hote)
+        if delai <= 0:
+            return 0.0
+        debit = 1.0 / delai
+
+        client = get_redis()
+        if client is not None:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(SCRIPT_RESERVATION)
+                return float(self._script(keys=[f"{PREFIXE_SEAUX}:{hote}"], args=[debit, self.rafale], client=client))
+            except Exception as e:
+                signaler_indisponible(e)
+
+        return self._reserver_local(hote, debit)
+
+    def _reserver_local(self, hote, debit):
+        """Même algorithme que le script Redis, limité au processus courant"""
+        maintenant = time.monotonic()
+        with self._lock:
+            jetons, maj = self._seaux_locaux.get(hote, (self.rafale, maintenant))
+            jetons = min(self.rafale, jetons + (maintenant - maj) * debit) - 1
+            self._seaux_locaux[hote] = (jetons, maintenant)
+        return -jetons / debit if jetons < 0 else 0.0
+
+    def attendre(self, url):
+        """Bloque juste le temps nécessaire avant une requête vers url, retourne l'attente"""
+        attente = self.reserver(url)
+        if attente > 0:
+            logger.debug(f"⏳ {hote_url(url)}: attente {attente:.2f}s")
+            time.sleep(attente)
+        return attente
@@ -0,0 +1,185 @@
+# scrapers/metriques.py
+"""
+Métriques Prometheus du pipeline de collecte (labellisées par site)
+Les tâches Airflow sont courtes: les métriques sont poussées vers le Pushgateway en fin de run
+"""
+
+import os
+import time
+import socket
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, push_to_gateway, start_http_server
+except ImportError:  # Instrumentation désactivée si prometheus-client est absent
+    CollectorRegistry = None
+
+logger = logging.getLogger(__name__)
+
+# Chaîne vide: pas de push (exécutions locales, benchmarks)
+PUSHGATEWAY = os.getenv('TECHPULSE_PUSHGATEWAY', 'pushgateway:9091')
+
+BUCKETS_HTTP = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+BUCKETS_PARSE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+BUCKETS_DB = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+BUCKETS_RANG = (0, 1, 2, 3, 4, 5, 6, 7)
+
+ACTIF = CollectorRegistry is not None
+
+# Durées brutes par étape, pour des percentiles exacts (benchmarks); None = désactivé
+_etat = {'echantillons': None}
+
+if ACTIF:
+    REGISTRE = CollectorRegistry()
+
+    FETCH_DUREE = Histogram(
+        'techpulse_fetch_duree_secondes', 'Durée des requêtes HTTP',
+        ['site'], buckets=BUCKETS_HTTP, registry=REGISTRE
+    )
+    HTTP_REPONSES = Counter(
+        'techpulse_http_reponses_total', 'Réponses HTTP par code de statut',
+        ['site', 'statut'], registry=REGISTRE
+    )
+    OCTETS_TELECHARGES = Counter(
+        'techpulse_octets_telecharges_total', 'Octets de corps de réponse téléchargés',
+        ['site'], registry=REGISTRE
+    )
+    PARSE_DUREE = Histogram(
+        'techpulse_parse_duree_secondes', 'Durée parsing + extraction d\'une page',
+        ['site'], buckets=BUCKETS_PARSE, registry=REGISTRE
+    )
+    EXTRACTION_RANG = Histogram(
+        'techpulse_extraction_rang_selecteur', 'Rang du sélecteur ayant fourni la valeur (0 = premier)',
+        ['site', 'champ'], buckets=BUCKETS_RANG, registry=REGISTRE
+    )
+    EXTRACTION_ECHECS = Counter(
+        'techpulse_extraction_echecs_total', 'Champs non trouvés par les sélecteurs',
+        ['site', 'champ'], registry=REGISTRE
+    )
+    DB_ECRITURE_DUREE = Histogram(
+        'techpulse_db_ecriture_duree_secondes', 'Durée d\'écriture d\'un lot en base',
+        ['site'], buckets=BUCKETS_DB, registry=REGISTRE
+    )
+    DISJONCTEUR_OUVERT = Gauge(
+        'techpulse_disjoncteur_ouvert', 'Disjoncteur du site ouvert (1) ou fermé (0)',
+        ['site'], registry=REGISTRE
+    )
+    LIGNES_ECRITES = Counter(
+        'techpulse_lignes_ecrites_total', 'Lignes écrites en base',
+        ['site', 'table'], registry=REGISTRE
+    )
+
+
+@contextmanager
+def collecter_echantillons():
+    """Enregistre les durées brutes de chaque étape (fetch, parse, ecriture) pendant le bloc"""
+    echantillons = defaultdict(list)
+    _etat['echantillons'] = echantillons
+    try:
+        yield echantillons
+    finally:
+        _etat['echantillons'] = None
+
+
+def _echantillon(etape, duree):
+    echantillons = _etat['echantillons']
+    if echantillons is not None:
+        echantillons[etape].append(duree)
+
+
+def observer_fetch(site, duree, response=None, octets=None):
+    """Latence, statut et taille d'une requête HTTP (response=None: erreur réseau)
+
+    octets=None: taille du corps déjà chargé; en flux le corps n'est pas lu ici
+    (octets=0) et la lecture est comptée par observer_octets.
+    """
+    _echantillon('fetch', duree)
+    if not ACTIF:
+        return
+    FETCH_DUREE.labels(site=site).observe(duree)
+    if response is None:
+        HTTP_REPONSES.labels(site=site, statut='erreur').inc()
+        return
+    HTTP_REPONSES.labels(site=site, statut=str(response.status_code)).inc()
+    observer_octets(site, len(response.content or b'') if octets is None else octets)
+
+
+def observer_reponse(site, duree, statut, octets):
+    """Requête servie hors de requests (téléchargeur Scrapy): statut et taille du corps déjà connus"""
+    _echantillon('fetch', duree)
+    if not ACTIF:
+        return
+    FETCH_DUREE.labels(site=site).observe(duree)
+    HTTP_REPONSES.labels(site=site, statut=str(statut)).inc()
+    observer_octets(site, octets)
+
+
+def observer_octets(site, octets):
+    """Octets de corps HTTP lus"""
+    if ACTIF and octets:
+        OCTETS_TELECHARGES.labels(site=site).inc(octets)
+
+
+def observer_disjoncteur(site, ouvert):
+    """État du disjoncteur d'un site"""
+    if ACTIF:
+        DISJONCTEUR_OUVERT.labels(site=site).set(1 if ouvert else 0)
+
+
+@contextmanager
+def mesurer_parse(site):
+    """Chronomètre parsing + extraction d'une page"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - start_time
+        _echantillon('parse', duree)
+        if ACTIF:
+            PARSE_DUREE.labels(site=site).observe(duree)
+
+
+def observer_extraction(site, champ, rang):
+    """Profondeur de fallback d'un champ (rang=None: aucun sélecteur n'a répondu)"""
+    if not ACTIF:
+        return
+    if rang is None:
+        EXTRACTION_ECHECS.labels(site=site, champ=champ).inc()
+    else:
+        EXTRACTION_RANG.labels(site=site, champ=champ).observe(rang)
+
+
+def observer_ecriture(site, duree, lignes_par_table):
+    """Durée d'écriture d'un lot et lignes écrites par table"""
+    _echantillon('ecriture', duree)
+    if not ACTIF:
+        return
+    DB_ECRITURE_DUREE.labels(site=site).observe(duree)
+    for table, nb_lignes in lignes_par_table.items():
+        LIGNES_ECRITES.labels(site=site, table=table).inc(nb_lignes)
+
+
+def pousser_metriques(job, grouping_key=None):
+    """Pousse le registre vers le Pushgateway (fin de tâche Airflow); n'échoue jamais"""
+    if not ACTIF or not PUSHGATEWAY:
+        return False
+
+    grouping_key = dict(grouping_key or {})
+    grouping_key.setdefault('instance', socket.gethostname())
+
+    try:
+        push_to_gateway(PUSHGATEWAY, job=job, registry=REGISTRE, grouping_key=grouping_key, timeout=5)
+        logger.info(f"📈 Métriques poussées vers {PUSHGATEWAY} ({job})")
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️  Pushgateway injoignable ({PUSHGATEWAY}): {e}")
+        return False
+
+
+def demarrer_exporter(port=8000):
+    """Expose /metrics en HTTP pour un processus long (alternative au Pushgateway)"""
+    if ACTIF:
+        start_http_server(port, registry=REGISTRE)
+        logger.info(f"📈 Exporter Prometheus sur le port {port}")
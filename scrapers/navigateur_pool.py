@@ -0,0 +1,199 @@
+# scrapers/navigateur_pool.py
+"""
+Pool de navigateurs headless (Chrome via selenium) gardés chauds d'une page à l'autre
+Étage de repli des pages dont le prix est rendu en JavaScript: un onglet réutilisé par navigateur,
+images, polices et médias bloqués; le lancement du navigateur est payé une fois par worker
+"""
+
+import os
+import queue
+import atexit
+import logging
+import threading
+import time
+
+try:
+    from selenium import webdriver
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+except ImportError:  # étage navigateur désactivé
+    webdriver = None
+
+from document_page import DocumentPage
+
+logger = logging.getLogger(__name__)
+
+# Navigateurs par processus (0: étage désactivé)
+TAILLE_POOL = int(os.getenv('TECHPULSE_NAVIGATEURS', '2'))
+
+# Un navigateur est relancé après ce nombre de pages (mémoire qui gonfle au fil des navigations)
+PAGES_PAR_NAVIGATEUR = int(os.getenv('TECHPULSE_NAVIGATEUR_PAGES_MAX', '200'))
+
+# Après un lancement impossible (Chrome absent de l'image), étage coupé pour le processus pendant ce délai
+PAUSE_APRES_ECHEC_SEC = float(os.getenv('TECHPULSE_NAVIGATEUR_PAUSE_SEC', '600'))
+
+# Attente maximale du chargement puis du sélecteur attendu
+DELAI_RENDU_SEC = float(os.getenv('TECHPULSE_NAVIGATEUR_DELAI_SEC', '15'))
+
+# Ressources jamais téléchargées (le rendu du prix n'en dépend pas)
+RESSOURCES_BLOQUEES = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*.mp4', '*.webm'
+]
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+class NavigateurIndisponible(Exception):
+    """Aucun navigateur libre dans le délai, ou lancement impossible"""
+
+
+def _rempli(element):
+    """Élément affiché avec un texte, ou porteur d'un prix en attribut"""
+    return bool(element.text.strip() or element.get_attribute('data-price') or element.get_attribute('content'))
+
+
+class Navigateur:
+    """Chrome headless et son onglet unique, réutilisé pour toutes les pages"""
+
+    def __init__(self):
+        options = webdriver.ChromeOptions()
+        for argument in ('--headless=new', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu',
+                         '--disable-extensions', '--blink-settings=imagesEnabled=false',
+                         '--window-size=1366,900', f'--user-agent={USER_AGENT}'):
+            options.add_argument(argument)
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        # DOM prêt suffit: les scripts qui affichent le prix sont attendus par sélecteur
+        options.page_load_strategy = 'eager'
+        if os.getenv('TECHPULSE_CHROME_BIN'):
+            options.binary_location = os.getenv('TECHPULSE_CHROME_BIN')
+
+        self.driver = webdriver.Chrome(options=options)
+        self.driver.set_page_load_timeout(DELAI_RENDU_SEC)
+        self.driver.execute_cdp_cmd('Network.enable', {})
+        self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': RESSOURCES_BLOQUEES})
+        self.pages = 0
+
+    def rendre(self, url, attente_css=None):
+        """HTML de la page après exécution des scripts (et remplissage d'un élément sous attente_css)"""
+        self.driver.get(url)
+        if attente_css:
+            try:
+                WebDriverWait(self.driver, DELAI_RENDU_SEC).until(
+                    lambda driver: any(_rempli(e) for e in driver.find_elements(By.CSS_SELECTOR, attente_css))
+                )
+            except TimeoutException:
+                logger.warning(f"⚠️  {url}: '{attente_css}' toujours vide après {DELAI_RENDU_SEC:.0f}s")
+        self.pages += 1
+        return self.driver.page_source
+
+    def fermer(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.debug(f"Fermeture navigateur: {e}")
+
+
+class PoolNavigateurs:
+    """Navigateurs lancés à la demande (au plus taille), rendus au pool après chaque page"""
+
+    def __init__(self, taille=TAILLE_POOL, pages_max=PAGES_PAR_NAVIGATEUR):
+        self.taille = taille
+        self.pages_max = pages_max
+        # LIFO: le dernier navigateur rendu (le plus chaud) sert en premier
+        self._libres = queue.LifoQueue()
+        self._lances = 0
+        self._lock = threading.Lock()
+        # Pas de nouveau lancement avant cet instant (time.monotonic) après un lancement impossible
+        self._pause_jusqu_a = 0.0
+        self.stats = {'lancements': 0, 'pages': 0, 'echecs': 0, 'duree_lancements': 0.0}
+
+    def _prendre(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if time.monotonic() < self._pause_jusqu_a:
+                raise NavigateurIndisponible("étage navigateur en pause après un lancement impossible")
+            lancer = self._lances < self.taille
+            if lancer:
+                self._lances += 1
+        if not lancer:
+            try:
+                return self._libres.get(timeout=DELAI_RENDU_SEC * 2)
+            except queue.Empty:
+                raise NavigateurIndisponible(f"aucun navigateur libre ({self.taille} occupés)")
+
+        start_time = time.perf_counter()
+        try:
+            navigateur = Navigateur()
+        except Exception as e:
+            with self._lock:
+                self._lances -= 1
+                self._pause_jusqu_a = time.monotonic() + PAUSE_APRES_ECHEC_SEC
+            logger.warning(f"⚠️  Lancement du navigateur impossible, étage en pause {PAUSE_APRES_ECHEC_SEC:.0f}s: {e}")
+            raise NavigateurIndisponible(f"lancement impossible: {e}") from e
+        duree = time.perf_counter() - start_time
+        with self._lock:
+            self.stats['lancements'] += 1
+            self.stats['duree_lancements'] += duree
+        logger.info(f"🌐 Navigateur headless lancé en {duree:.1f}s ({self._lances}/{self.taille})")
+        return navigateur
+
+    def _liberer(self, navigateur, en_echec=False):
+        if en_echec or navigateur.pages >= self.pages_max:
+            navigateur.fermer()
+            with self._lock:
+                self._lances -= 1
+            return
+        self._libres.put(navigateur)
+
+    def rendre(self, url, attente_css=None):
+        """HTML rendu de url; lève NavigateurIndisponible ou l'erreur du navigateur"""
+        navigateur = self._prendre()
+        try:
+            html = navigateur.rendre(url, attente_css)
+        except WebDriverException:
+            with self._lock:
+                self.stats['echecs'] += 1
+            self._liberer(navigateur, en_echec=True)
+            raise
+        with self._lock:
+            self.stats['pages'] += 1
+        self._liberer(navigateur)
+        return html
+
+    def document(self, url, attente_css=None):
+        """DocumentPage du rendu (mêmes extracteurs que pour les pages statiques)"""
+        return DocumentPage(self.rendre(url, attente_css).encode('utf-8'), 'utf-8', url)
+
+    def fermer(self):
+        while True:
+            try:
+                self._libres.get_nowait().fermer()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._lances = 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_partage():
+    """Pool du processus (selenium absent ou TECHPULSE_NAVIGATEURS=0: None), fermé à la sortie"""
+    global _pool
+    if webdriver is None or TAILLE_POOL <= 0:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolNavigateurs()
+                atexit.register(_pool.fermer)
+    return _pool
@@ -0,0 +1,107 @@
+# scrapers/planification.py
+"""
+Planification des collectes par (produit, site): liste des produits dus à chaque run
+Intervalles fixés par recalculer_planification() (priorité de veille, volatilité du prix)
+"""
+
+import os
+import logging
+from datetime import timedelta
+
+from db_pool import connexion_db
+
+logger = logging.getLogger(__name__)
+
+# Un produit réservé par un run redevient dû après ce délai si sa collecte n'aboutit pas
+BAIL_RESERVATION = timedelta(minutes=int(os.getenv('TECHPULSE_PLANIFICATION_BAIL_MIN', '60')))
+
+# Un produit dû dans ce délai est collecté par le run en cours (runs quotidien et horaire à heure fixe:
+# sans marge, un produit dû à 06:02 manque le run de 06:00 et attend la recollecte de 06:30)
+MARGE_ECHEANCE = timedelta(minutes=int(os.getenv('TECHPULSE_PLANIFICATION_MARGE_MIN', '15')))
+
+SELECT_NON_DUS = """
+    SELECT id_produit_techpulse
+    FROM planification_collecte
+    WHERE id_site = %s AND prochaine_collecte > CURRENT_TIMESTAMP + %s
+"""
+
+# Réservation atomique: deux runs simultanés (quotidien et horaire) ne collectent pas le même produit
+RESERVER = """
+    INSERT INTO planification_collecte AS p (id_produit_techpulse, id_site, prochaine_collecte)
+    SELECT id_produit, %s, CURRENT_TIMESTAMP + %s
+    FROM unnest(%s::integer[]) AS id_produit
+    ON CONFLICT (id_produit_techpulse, id_site) DO UPDATE SET
+        prochaine_collecte = EXCLUDED.prochaine_collecte
+    WHERE p.prochaine_collecte <= CURRENT_TIMESTAMP + %s
+    RETURNING id_produit_techpulse
+"""
+
+# Collecte datée de sa réservation (prochaine_collecte - bail), pas de sa fin: l'échéance suivante
+# (ici et dans recalculer_planification()) ne glisse pas de la durée du run à chaque passage.
+# Intervalle pas encore calculé: base de la priorité de veille
+MARQUER_COLLECTES = """
+    UPDATE planification_collecte p SET
+        derniere_collecte = LEAST(p.prochaine_collecte - %(bail)s, CURRENT_TIMESTAMP),
+        prochaine_collecte = LEAST(p.prochaine_collecte - %(bail)s, CURRENT_TIMESTAMP)
+            + COALESCE(p.intervalle_heures, intervalle_base(pt.priorite_veille)) * INTERVAL '1 hour'
+    FROM produits_techpulse pt
+    WHERE pt.id_produit = p.id_produit_techpulse
+      AND p.id_site = %(id_site)s AND p.id_produit_techpulse = ANY(%(ids)s)
+"""
+
+
+class PlanificationCollecte:
+    """Produits dus par site; les produits sans id_produit (catalogue de démonstration) ne sont pas planifiés"""
+
+    def __init__(self, avec_non_planifies=True):
+        self.avec_non_planifies = avec_non_planifies
+
+    def _non_dus(self, id_site):
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_NON_DUS, (id_site, MARGE_ECHEANCE))
+            non_dus = {ligne[0] for ligne in cursor.fetchall()}
+            cursor.close()
+        return non_dus
+
+    def _retenir(self, produits, non_dus):
+        return [
+            produit for produit in produits
+            if (produit.get('id_produit') is None and self.avec_non_planifies)
+            or (produit.get('id_produit') is not None and produit['id_produit'] not in non_dus)
+        ]
+
+    def nombre_dus(self, id_site, produits):
+        """Nombre de produits à collecter sur le site (sans les réserver)"""
+        return len(self._retenir(produits, self._non_dus(id_site)))
+
+    def reserver_dus(self, id_site, produits):
+        """Produits dus du site, réservés pour ce run (un produit déjà réservé ailleurs est écarté)"""
+        candidats = self._retenir(produits, self._non_dus(id_site))
+        ids = [produit['id_produit'] for produit in candidats if produit.get('id_produit') is not None]
+        if not ids:
+            return candidats
+
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(RESERVER, (id_site, BAIL_RESERVATION, ids, MARGE_ECHEANCE))
+            reserves = {ligne[0] for ligne in cursor.fetchall()}
+            conn.commit()
+            cursor.close()
+
+        if len(reserves) < len(ids):
+            logger.info(f"⏭️ {len(ids) - len(reserves)} produit(s) déjà réservé(s) par un autre run")
+        return [produit for produit in candidats if produit.get('id_produit') is None or produit['id_produit'] in reserves]
+
+    def marquer_collectes(self, id_site, ids_produits):
+        """Collectes abouties (écrites ou inchangées): prochaine collecte dans l'intervalle du produit"""
+        ids = [id_produit for id_produit in ids_produits if id_produit is not None]
+        if not ids:
+            return 0
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(MARQUER_COLLECTES, {'bail': BAIL_RESERVATION, 'id_site': id_site, 'ids': ids})
+            nb_marques = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        return nb_marques
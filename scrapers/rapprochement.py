@@ -0,0 +1,448 @@
+# scrapers/rapprochement.py
+"""
+Rapprochement des offres concurrentes avec produits_techpulse
+EAN d'abord, puis jetons normalisés (marque, modèle, capacité) via un index inversé et un score vectorisé,
+sous garde-fou (pas d'accessoire, prix proche de prix_vente_ttc)
+Résultats gardés par (site, URL): une offre déjà vue n'est jamais rescorée
+
+Usage (rattrapage des lignes sans produit): python rapprochement.py [--jours 30]
+"""
+
+import os
+import re
+import logging
+import argparse
+import threading
+import unicodedata
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db_pool import connexion_db
+from catalogue import charger_catalogue
+
+logger = logging.getLogger(__name__)
+
+# Score minimal (cosinus pondéré IDF), et écart minimal avec un second produit différent
+SEUIL_SCORE = float(os.getenv('TECHPULSE_RAPPROCHEMENT_SEUIL', '0.75'))
+MARGE_AMBIGUITE = 0.05
+
+# Cellules (offres x produits) scorées par passe numpy: des blocs de quelques Mo restent en cache
+CELLULES_PAR_PASSE = 250_000
+
+MOTS_VIDES = {
+    'de', 'du', 'des', 'la', 'le', 'les', 'l', 'd', 'et', 'avec', 'pour', 'en', 'a', 'au', 'un', 'une',
+    'ref', 'reference', 'neuf', 'version', 'edition',
+    # Couleurs, réseau et libellés de catégorie: absents du catalogue, ils ne distinguent aucun produit
+    'noir', 'blanc', 'bleu', 'rouge', 'vert', 'gris', 'argent', 'or', 'rose', 'violet', 'jaune', 'minuit',
+    'lumiere', 'stellaire', 'sideral', 'graphite', 'titane', 'naturel',
+    '4g', '5g', 'wi', 'fi', 'wifi', 'cellular', 'ssd', 'ram', 'pouces', 'debloque',
+    'smartphone', 'telephone', 'mobile', 'ordinateur', 'portable', 'tablette', 'tactile', 'casque', 'sans', 'fil'
+}
+
+# Offre d'accessoire: jamais rapprochée par les noms d'un produit qui n'en est pas un
+# (« Coque pour iPhone 15 » partage tous les jetons de l'iPhone 15)
+MOTS_ACCESSOIRES = {
+    'coque', 'etui', 'housse', 'protection', 'protege', 'film', 'verre', 'trempe', 'chargeur', 'cable',
+    'adaptateur', 'support', 'bracelet', 'sacoche', 'pochette', 'stylet', 'clavier', 'dock', 'batterie', 'skin'
+}
+
+# Prix de l'offre / prix_vente_ttc hors de ces bornes: rapprochement par les noms refusé
+RATIO_PRIX_MIN = 0.5
+RATIO_PRIX_MAX = 2.0
+
+# Variantes de gamme: « iPhone 14 Pro » n'est jamais rapproché de « iPhone 14 »
+VARIANTES = {'pro', 'max', 'plus', 'ultra', 'mini', 'lite', 'fe', 'se', 'air', 'note'}
+
+# « 5G » (réseau) n'est pas une capacité: unités Go/GB et To/TB seulement
+_RE_CAPACITE = re.compile(r'\b(\d+)\s*(go|gb|to|tb)\b')
+_RE_ORDINAL = re.compile(r'\b(\d+)\s*(?:e|eme|ere|nd|th)\b')
+_RE_JETON = re.compile(r'[a-z0-9]+')
+_RE_CAPACITE_JETON = re.compile(r'^\d+(go|to)$')
+_RE_REFERENCE_JETON = re.compile(r'^(?=.*[a-z])(?=.*\d)[a-z0-9]+$')
+
+SELECT_CONNUS = """
+    SELECT url_produit, id_produit_techpulse FROM urls_produits_concurrents WHERE id_site = %s AND actif
+    UNION ALL
+    SELECT url_produit, id_produit_techpulse FROM rapprochements_concurrents WHERE id_site = %s
+"""
+
+# Un rapprochement manuel n'est jamais remplacé par le moteur
+UPSERT_RAPPROCHEMENTS = """
+    INSERT INTO rapprochements_concurrents AS r (id_site, url_produit, id_produit_techpulse, methode, score)
+    VALUES %s
+    ON CONFLICT (id_site, url_produit) DO UPDATE SET
+        id_produit_techpulse = EXCLUDED.id_produit_techpulse,
+        methode = EXCLUDED.methode,
+        score = EXCLUDED.score,
+        created_at = CURRENT_TIMESTAMP
+    WHERE r.methode <> 'manuel'
+"""
+
+SELECT_NON_RAPPROCHES = """
+    SELECT DISTINCT ON (id_site, url_produit) id_site, url_produit, nom_produit_concurrent, prix_ttc
+    FROM produits_concurrents
+    WHERE id_produit_techpulse IS NULL AND nom_produit_concurrent IS NOT NULL
+      AND date_collecte >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+    ORDER BY id_site, url_produit, date_collecte DESC
+"""
+
+# Lignes rattachées à leur produit et, dans la même instruction, leurs suites par (produit, site):
+# - historique_prix: un prix par jour, sans écraser celui déjà écrit par l'ingestion
+# - derniers_prix_concurrents: même garde que l'ingestion (une collecte plus ancienne ne remplace rien)
+# Fenêtre en jours insérée par .format(): execute_values n'admet qu'un seul %s
+UPDATE_NON_RAPPROCHES = """
+    WITH lignes AS (
+        UPDATE produits_concurrents pc SET id_produit_techpulse = v.id_produit
+        FROM (VALUES %s) AS v(id_site, url_produit, id_produit)
+        WHERE pc.id_site = v.id_site AND pc.url_produit = v.url_produit
+          AND pc.id_produit_techpulse IS NULL
+          AND pc.date_collecte >= CURRENT_TIMESTAMP - {jours} * INTERVAL '1 day'
+        RETURNING pc.id_produit_concurrent, pc.id_produit_techpulse, pc.id_site, pc.url_produit, pc.nom_produit_concurrent,
+                  pc.prix_ttc, pc.prix_promotion, pc.en_promotion, pc.disponible, pc.note_moyenne, pc.nombre_avis,
+                  pc.date_collecte
+    ), historique AS (
+        INSERT INTO historique_prix (
+            id_produit_techpulse, id_site, prix_ttc, prix_promotion, en_promotion, date_prix, heure_collecte
+        )
+        SELECT DISTINCT ON (l.id_produit_techpulse, l.id_site, l.date_collecte::date)
+            l.id_produit_techpulse, l.id_site, l.prix_ttc, l.prix_promotion, l.en_promotion,
+            l.date_collecte::date, l.date_collecte::time
+        FROM lignes l
+        WHERE l.prix_ttc IS NOT NULL
+        ORDER BY l.id_produit_techpulse, l.id_site, l.date_collecte::date, l.date_collecte DESC
+        ON CONFLICT (id_produit_techpulse, id_site, date_prix) DO NOTHING
+        RETURNING 1
+    ), derniers AS (
+        INSERT INTO derniers_prix_concurrents (
+            id_produit_techpulse, id_site, id_produit_concurrent, url_produit, nom_produit_concurrent,
+            prix_ttc, prix_promotion, en_promotion, disponible, note_moyenne, nombre_avis,
+            date_collecte, prix_techpulse, ecart_pourcentage, derniere_vue
+        )
+        SELECT DISTINCT ON (l.id_produit_techpulse, l.id_site)
+            l.id_produit_techpulse, l.id_site, l.id_produit_concurrent, l.url_produit, l.nom_produit_concurrent,
+            l.prix_ttc, l.prix_promotion, l.en_promotion, l.disponible, l.note_moyenne, l.nombre_avis,
+            l.date_collecte, pt.prix_vente_ttc, ecart_prix(l.prix_ttc, pt.prix_vente_ttc), l.date_collecte
+        FROM lignes l
+        JOIN produits_techpulse pt ON pt.id_produit = l.id_produit_techpulse
+        WHERE l.prix_ttc IS NOT NULL
+        ORDER BY l.id_produit_techpulse, l.id_site, l.date_collecte DESC
+        ON CONFLICT (id_produit_techpulse, id_site) DO UPDATE SET
+            id_produit_concurrent = EXCLUDED.id_produit_concurrent,
+            url_produit = EXCLUDED.url_produit,
+            nom_produit_concurrent = EXCLUDED.nom_produit_concurrent,
+            prix_ttc = EXCLUDED.prix_ttc,
+            prix_promotion = EXCLUDED.prix_promotion,
+            en_promotion = EXCLUDED.en_promotion,
+            disponible = EXCLUDED.disponible,
+            note_moyenne = EXCLUDED.note_moyenne,
+            nombre_avis = EXCLUDED.nombre_avis,
+            date_collecte = EXCLUDED.date_collecte,
+            prix_techpulse = EXCLUDED.prix_techpulse,
+            ecart_pourcentage = EXCLUDED.ecart_pourcentage,
+            derniere_vue = GREATEST(derniers_prix_concurrents.derniere_vue, EXCLUDED.derniere_vue)
+        WHERE derniers_prix_concurrents.date_collecte <= EXCLUDED.date_collecte
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM lignes), (SELECT COUNT(*) FROM historique), (SELECT COUNT(*) FROM derniers)
+"""
+
+
+def jetons(texte):
+    """Jetons normalisés d'un nom: minuscules sans accents, capacités unifiées (128 Go, 128GB -> 128go)"""
+    if not texte:
+        return []
+    texte = unicodedata.normalize('NFKD', texte.lower()).encode('ascii', 'ignore').decode()
+    texte = _RE_CAPACITE.sub(lambda m: m.group(1) + ('to' if m.group(2)[0] == 't' else 'go'), texte)
+    texte = _RE_ORDINAL.sub(r'\1', texte)
+    return [jeton for jeton in _RE_JETON.findall(texte) if jeton not in MOTS_VIDES]
+
+
+def _mesure(jeton):
+    return jeton.isdigit() or _RE_CAPACITE_JETON.match(jeton) is not None
+
+
+def discriminants(jetons_nom):
+    """Capacités, numéros et références de modèle (s23, m2), variantes de gamme d'un nom:
+    deux noms qui divergent ici désignent deux produits différents, quel que soit le reste du score"""
+    capacites = frozenset(j for j in jetons_nom if _RE_CAPACITE_JETON.match(j))
+    return (
+        capacites,
+        frozenset(j for j in jetons_nom if j.isdigit()),
+        frozenset(j for j in jetons_nom if _RE_REFERENCE_JETON.match(j) and j not in capacites),
+        frozenset(j for j in jetons_nom if j in VARIANTES)
+    )
+
+
+def compatibles(offre, produit):
+    """Capacités, numéros, références: au moins une en commun s'il y en a des deux côtés; variantes: identiques"""
+    *classes_o, variantes_o = offre
+    *classes_p, variantes_p = produit
+    return variantes_o == variantes_p and all(
+        not (o and p and not o & p) for o, p in zip(classes_o, classes_p)
+    )
+
+
+class IndexJetons:
+    """Index inversé jeton -> produits (CSR), poids IDF; score cosinus de tout un lot d'offres en numpy"""
+
+    def __init__(self, produits):
+        self.ids = np.array([produit['id_produit'] for produit in produits], dtype=np.int64)
+        self.jetons_produits = jetons_produits = [
+            set(jetons(f"{produit.get('marque') or ''} {produit['nom']}")) for produit in produits
+        ]
+        self.discriminants = [discriminants(jp) for jp in jetons_produits]
+
+        self.vocabulaire = {}
+        postings = []
+        for rang, jp in enumerate(jetons_produits):
+            for jeton in jp:
+                indice = self.vocabulaire.setdefault(jeton, len(self.vocabulaire))
+                if indice == len(postings):
+                    postings.append([])
+                postings[indice].append(rang)
+
+        # Postings à plat: produits du jeton t dans produits_postings[debuts[t]:debuts[t] + longueurs[t]]
+        self.longueurs = np.array([len(p) for p in postings], dtype=np.int64)
+        self.debuts = np.concatenate(([0], np.cumsum(self.longueurs)[:-1])).astype(np.int64) if postings else np.zeros(0, np.int64)
+        self.produits_postings = np.array([rang for p in postings for rang in p], dtype=np.int64)
+        self.poids = np.log1p(max(len(produits), 1) / self.longueurs) if postings else np.zeros(0)
+        self.poids_carres = self.poids ** 2
+        # Jeton d'offre absent du catalogue: poids d'un jeton qui ne désignerait qu'un seul produit
+        self.poids_inconnu_carre = np.log1p(max(len(produits), 1)) ** 2
+
+        carres = np.zeros(len(produits))
+        np.add.at(carres, self.produits_postings, np.repeat(self.poids_carres, self.longueurs))
+        self.inverses_normes = np.divide(1.0, np.sqrt(carres), out=np.zeros(len(produits)), where=carres > 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scorer(self, jetons_offres):
+        """Pour chaque offre: (rang du meilleur produit compatible ou -1, son score, score du suivant)"""
+        nb_produits = len(self.ids)
+        if nb_produits == 0 or not jetons_offres:
+            return [(-1, 0.0, 0.0)] * len(jetons_offres)
+
+        resultats = []
+        passe = max(1, CELLULES_PAR_PASSE // nb_produits)
+        for debut in range(0, len(jetons_offres), passe):
+            bloc = jetons_offres[debut:debut + passe]
+            connus = [sorted({self.vocabulaire[j] for j in jo if j in self.vocabulaire}) for jo in bloc]
+            inconnus = np.array([
+                sum(1 for j in set(jo) if j not in self.vocabulaire and not _mesure(j)) for jo in bloc
+            ], dtype=np.float64)
+
+            # Paires (offre, produit) partageant un jeton, pondérées par IDF²: une seule bincount pour le bloc
+            jetons_bloc = np.array([indice for c in connus for indice in c], dtype=np.int64)
+            offres_bloc = np.repeat(np.arange(len(bloc)), [len(c) for c in connus])
+            longueurs = self.longueurs[jetons_bloc]
+            fins = np.cumsum(longueurs)
+            positions = np.arange(fins[-1] if len(fins) else 0) - np.repeat(fins - longueurs - self.debuts[jetons_bloc], longueurs)
+            cellules = np.repeat(offres_bloc, longueurs) * nb_produits + self.produits_postings[positions]
+            produits_scalaires = np.bincount(
+                cellules, weights=np.repeat(self.poids_carres[jetons_bloc], longueurs), minlength=len(bloc) * nb_produits
+            ).reshape(len(bloc), nb_produits)
+
+            # La norme de l'offre ne change pas son classement: appliquée aux seuls candidats.
+            # Elle compte tous ses jetons (les mots en plus, « coque », « étui », font baisser le score),
+            # sauf capacités et nombres hors catalogue (8go, 13): compatibles() les départage déjà
+            scores = produits_scalaires
+            scores *= self.inverses_normes
+            normes_offres = np.sqrt(
+                np.bincount(offres_bloc, weights=self.poids_carres[jetons_bloc], minlength=len(bloc))
+                + inconnus * self.poids_inconnu_carre
+            )
+            inverses_offres = np.divide(1.0, normes_offres, out=np.zeros(len(bloc)), where=normes_offres > 0)
+
+            # Cinq meilleurs de chaque offre, puis contrôle des discriminants sur ceux-là seulement
+            nb = min(5, nb_produits)
+            candidats = np.argpartition(scores, nb_produits - nb, axis=1)[:, nb_produits - nb:]
+            scores_candidats = np.take_along_axis(scores, candidats, axis=1) * inverses_offres[:, None]
+            ordre = np.argsort(-scores_candidats, axis=1)
+            candidats = np.take_along_axis(candidats, ordre, axis=1)
+            scores_candidats = np.take_along_axis(scores_candidats, ordre, axis=1)
+
+            for rang_offre, jetons_offre in enumerate(bloc):
+                offre = discriminants(jetons_offre)
+                retenus = [
+                    (int(rang), float(score)) for rang, score in zip(candidats[rang_offre], scores_candidats[rang_offre])
+                    if score > 0 and compatibles(offre, self.discriminants[rang])
+                ]
+                if not retenus:
+                    resultats.append((-1, 0.0, 0.0))
+                else:
+                    resultats.append((retenus[0][0], retenus[0][1], retenus[1][1] if len(retenus) > 1 else 0.0))
+        return resultats
+
+
+class MoteurRapprochement:
+    """Produit TechPulse d'une offre: cache (site, URL), EAN, puis similarité des noms"""
+
+    def __init__(self, produits, seuil=SEUIL_SCORE):
+        self.seuil = seuil
+        self.index = IndexJetons([produit for produit in produits if produit.get('nom')])
+        self.par_ean = {produit['ean']: produit['id_produit'] for produit in produits if produit.get('ean')}
+        self.prix_vente = {produit['id_produit']: produit.get('prix_base') for produit in produits}
+        # site -> {url: id_produit ou None}; None: offre déjà scorée sans résultat (non persisté)
+        self._cache = {}
+        self._a_enregistrer = []
+        self._lock = threading.Lock()
+        self.stats = {'cache': 0, 'ean': 0, 'jetons': 0, 'refuses': 0, 'sans_resultat': 0}
+
+    def _cache_site(self, site_id):
+        if site_id not in self._cache:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(SELECT_CONNUS, (site_id, site_id))
+                connus = dict(cursor.fetchall())
+                cursor.close()
+            with self._lock:
+                self._cache.setdefault(site_id, connus)
+        return self._cache[site_id]
+
+    def plausible(self, rang_produit, jetons_offre, prix):
+        """Garde-fou d'un rapprochement par les noms: pas d'accessoire, prix du même ordre que prix_vente_ttc"""
+        accessoires = MOTS_ACCESSOIRES.intersection(jetons_offre)
+        if accessoires - self.index.jetons_produits[rang_produit]:
+            return False
+        prix_vente = self.prix_vente.get(int(self.index.ids[rang_produit]))
+        if prix and prix_vente:
+            return RATIO_PRIX_MIN <= float(prix) / float(prix_vente) <= RATIO_PRIX_MAX
+        return True
+
+    def identifier_lot(self, site_id, offres):
+        """Produit (ou None) de chaque offre (url, nom, ean, prix); nouveaux rapprochements gardés pour enregistrer()"""
+        cache = self._cache_site(site_id)
+        resultats = [None] * len(offres)
+        a_scorer = []
+        nouveaux = []
+        refuses = 0
+
+        for rang, (url, nom, ean, _) in enumerate(offres):
+            if url in cache:
+                resultats[rang] = cache[url]
+            elif ean and ean in self.par_ean:
+                resultats[rang] = self.par_ean[ean]
+                nouveaux.append((site_id, url, resultats[rang], 'ean', None))
+            else:
+                a_scorer.append(rang)
+
+        jetons_offres = [jetons(offres[rang][1]) for rang in a_scorer]
+        scores = self.index.scorer(jetons_offres)
+        for rang, jetons_offre, (meilleur, score, second) in zip(a_scorer, jetons_offres, scores):
+            if meilleur < 0 or score < self.seuil or score - second < MARGE_AMBIGUITE:
+                continue
+            if not self.plausible(meilleur, jetons_offre, offres[rang][3]):
+                refuses += 1
+                continue
+            resultats[rang] = int(self.index.ids[meilleur])
+            nouveaux.append((site_id, offres[rang][0], resultats[rang], 'jetons', round(score, 3)))
+
+        with self._lock:
+            for rang, (url, _, _, _) in enumerate(offres):
+                cache[url] = resultats[rang]
+            self._a_enregistrer.extend(nouveaux)
+            nb_ean = sum(1 for ligne in nouveaux if ligne[3] == 'ean')
+            self.stats['cache'] += len(offres) - len(a_scorer) - nb_ean
+            self.stats['ean'] += nb_ean
+            self.stats['jetons'] += len(nouveaux) - nb_ean
+            self.stats['refuses'] += refuses
+            self.stats['sans_resultat'] += len(a_scorer) - (len(nouveaux) - nb_ean) - refuses
+        return resultats
+
+    def identifier(self, site_id, url, nom, ean=None, prix=None):
+        return self.identifier_lot(site_id, [(url, nom, ean, prix)])[0]
+
+    def enregistrer(self):
+        """Écrit les rapprochements trouvés depuis le dernier appel, retourne leur nombre"""
+        with self._lock:
+            lignes, self._a_enregistrer = self._a_enregistrer, []
+        if not lignes:
+            return 0
+        try:
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, UPSERT_RAPPROCHEMENTS, lignes, page_size=1000)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            # Rapprochements perdus seulement pour les prochains processus: ils seront recalculés
+            logger.warning(f"⚠️  Rapprochements non enregistrés ({e})")
+            return 0
+        return len(lignes)
+
+
+_moteur = None
+_moteur_charge = False
+_moteur_lock = threading.Lock()
+
+
+def moteur_partage():
+    """Moteur du processus, catalogue chargé au premier succès (TECHPULSE_RAPPROCHEMENT vide ou catalogue vide: None)"""
+    global _moteur, _moteur_charge
+    if not os.getenv('TECHPULSE_RAPPROCHEMENT', '1'):
+        return None
+
+    if not _moteur_charge:
+        with _moteur_lock:
+            if not _moteur_charge:
+                # Base injoignable ou catalogue vide: nouvel essai au lot suivant
+                produits = charger_catalogue(avec_urls=False)
+                if produits:
+                    _moteur = MoteurRapprochement(produits)
+                    _moteur_charge = True
+                    logger.info(f"🔗 Rapprochement: {len(_moteur.index)} produits, {len(_moteur.index.vocabulaire)} jetons, "
+                                f"{len(_moteur.par_ean)} EAN")
+    return _moteur
+
+
+def rattraper(jours=30):
+    """Rapproche les lignes sans produit des derniers jours (historique et derniers prix des seuls produits rattachés)"""
+    moteur = moteur_partage()
+    if moteur is None:
+        logger.warning("⚠️  Catalogue vide ou rapprochement désactivé: rien à rattraper")
+        return 0
+
+    with connexion_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SELECT_NON_RAPPROCHES, (jours,))
+        lignes = cursor.fetchall()
+        cursor.close()
+
+    par_site = {}
+    for id_site, url, nom, prix in lignes:
+        par_site.setdefault(id_site, []).append((url, nom, None, prix))
+
+    rapproches = []
+    for id_site, offres in par_site.items():
+        for (url, _, _, _), id_produit in zip(offres, moteur.identifier_lot(id_site, offres)):
+            if id_produit is not None:
+                rapproches.append((id_site, url, id_produit))
+    moteur.enregistrer()
+
+    if rapproches:
+        # Une seule instruction: le dernier prix d'un (produit, site) se choisit parmi toutes ses URLs rattachées
+        with connexion_db() as conn:
+            cursor = conn.cursor()
+            nb_lignes, nb_historique, nb_derniers = execute_values(
+                cursor, UPDATE_NON_RAPPROCHES.format(jours=int(jours)), rapproches, page_size=len(rapproches), fetch=True
+            )[0]
+            conn.commit()
+            cursor.close()
+        logger.info(f"🔗 {nb_lignes} lignes rattachées: {nb_historique} prix d'historique, {nb_derniers} derniers prix")
+
+    logger.info(f"🔗 {len(rapproches)}/{len(lignes)} offres rapprochées sur {jours} jours ({moteur.stats})")
+    return len(rapproches)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Rapprochement des offres sans produit TechPulse")
+    parser.add_argument('--jours', type=int, default=30, help="fenêtre de collecte à rattraper")
+    args = parser.parse_args()
+    print(f"{rattraper(args.jours)} offres rapprochées")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# scrapers/redis_client.py
+"""
+Client Redis partagé (service redis du docker-compose)
+get_redis() retourne None si Redis est absent: les appelants basculent en local
+"""
+
+import os
+import logging
+import threading
+
+try:
+    import redis
+except ImportError:  # Dépendance optionnelle hors conteneurs Airflow
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Base 1: la base 0 sert de broker Celery; chaîne vide = Redis désactivé
+REDIS_URL = os.getenv('TECHPULSE_REDIS_URL', 'redis://redis:6379/1')
+
+_lock = threading.Lock()
+_etat = {
+    'client': None,
+    'pid': None
+}
+
+
+def get_redis():
+    """Client Redis du processus courant, ou None si Redis est injoignable"""
+    if redis is None or not REDIS_URL:
+        return None
+
+    pid = os.getpid()
+    if _etat['pid'] == pid:
+        return _etat['client']
+
+    with _lock:
+        if _etat['pid'] != pid:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+                client.ping()
+                _etat['client'] = client
+                logger.info(f"🔌 Redis connecté: {REDIS_URL}")
+            except Exception as e:
+                _etat['client'] = None
+                logger.warning(f"⚠️  Redis indisponible ({e}), stockage en mémoire du processus")
+            _etat['pid'] = pid
+
+    return _etat['client']
+
+
+def signaler_indisponible(erreur):
+    """À appeler sur erreur Redis en cours de run: bascule le processus en local"""
+    with _lock:
+        if _etat['client'] is not None:
+            logger.warning(f"⚠️  Redis perdu ({erreur}), bascule sur le stockage en mémoire")
+        _etat['client'] = None
+        _etat['pid'] = os.getpid()
@@ -4,84 +4,101 @@ Scraper final TechPulse avec simulation de données réalistes
 Pour démonstration complète du Bloc 1
 """
 
-import requests
 from bs4 import BeautifulSoup
 import time
 import random
 import logging
-import psycopg2
 from datetime import datetime, timedelta
-import json
 import hashlib
+import json
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import connexion_db
+from ingestion_batch import IngestionBatch
+from cache_http import CacheHTTP
+from index_checksums import IndexChecksums
+from metriques import pousser_metriques
+from couche_fetch import CoucheFetch, FetchRejeu
+from catalogue import charger_catalogue
+from limiteur_debit import hote_url
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Backends de collecte: requests (pool de threads) ou Scrapy (téléchargeur Twisted, un spider par site)
+BACKENDS = ('requests', 'scrapy')
+
+def produits_du_shard(produits, shard_index, nb_shards):
+    """Sous-ensemble stable du catalogue (hash du nom produit modulo nb_shards)"""
+    if not nb_shards or nb_shards <= 1:
+        return list(produits)
+    return [
+        p for p in produits
+        if zlib.crc32(p['nom'].encode()) % nb_shards == shard_index
+    ]
+
+# Catalogue de démonstration, utilisé tant que la base n'a pas d'URL concurrente
+CATALOGUE_DEMONSTRATION = [
+    {
+        'nom': 'iPhone 15 128GB',
+        'prix_base': 829.00,
+        'variation_max': 50,
+        'urls': {
+            'cdiscount': 'https://www.cdiscount.com/telephonie/telephone-mobile/apple-iphone-15-128-go-noir/f-14406-app123456.html',
+            'rueducommerce': 'https://www.rueducommerce.fr/p-apple-iphone-15-128go-noir-123456.html',
+            'boulanger': 'https://www.boulanger.com/ref/apple-iphone-15-128go-noir-123456'
+        }
+    },
+    {
+        'nom': 'Samsung Galaxy S24 256GB',
+        'prix_base': 759.00,
+        'variation_max': 80,
+        'urls': {
+            'cdiscount': 'https://www.cdiscount.com/telephonie/telephone-mobile/samsung-galaxy-s24-256go-noir/f-14406-sam789012.html',
+            'rueducommerce': 'https://www.rueducommerce.fr/p-samsung-galaxy-s24-256go-noir-789012.html',
+            'boulanger': 'https://www.boulanger.com/ref/samsung-galaxy-s24-256go-noir-789012'
+        }
+    },
+    {
+        'nom': 'MacBook Air M3 256GB',
+        'prix_base': 1299.00,
+        'variation_max': 100,
+        'urls': {
+            'cdiscount': 'https://www.cdiscount.com/informatique/ordinateurs-pc-portables/apple-macbook-air-m3-256gb/f-10701-app345678.html',
+            'rueducommerce': 'https://www.rueducommerce.fr/p-apple-macbook-air-m3-256gb-345678.html',
+            'boulanger': 'https://www.boulanger.com/ref/apple-macbook-air-m3-256gb-345678'
+        }
+    },
+    {
+        'nom': 'iPad Air 5ème génération 64GB',
+        'prix_base': 699.00,
+        'variation_max': 60,
+        'urls': {
+            'cdiscount': 'https://www.cdiscount.com/informatique/tablettes-tactiles/apple-ipad-air-64gb/f-10702-app567890.html',
+            'rueducommerce': 'https://www.rueducommerce.fr/p-apple-ipad-air-64gb-567890.html',
+            'boulanger': 'https://www.boulanger.com/ref/apple-ipad-air-64gb-567890'
+        }
+    },
+    {
+        'nom': 'Dell XPS 13 Plus Intel i7',
+        'prix_base': 1099.00,
+        'variation_max': 150,
+        'urls': {
+            'cdiscount': 'https://www.cdiscount.com/informatique/ordinateurs-pc-portables/dell-xps-13-plus-i7/f-10701-del234567.html',
+            'rueducommerce': 'https://www.rueducommerce.fr/p-dell-xps-13-plus-i7-234567.html',
+            'boulanger': 'https://www.boulanger.com/ref/dell-xps-13-plus-i7-234567'
+        }
+    }
+]
+
 class TechPulseScraperFinal:
     """Scraper final avec simulation de données réalistes pour TechPulse"""
     
     def __init__(self):
-        self.db_config = {
-            'host': 'postgres',
-            'port': 5432,
-            'database': 'techpulse_veille',
-            'user': 'techpulse',
-            'password': 'techpulse2024'
-        }
-        
-        # Catalogue produits TechPulse à surveiller
-        self.produits_catalogue = [
-            {
-                'nom': 'iPhone 15 128GB',
-                'prix_base': 829.00,
-                'variation_max': 50,
-                'urls': {
-                    'cdiscount': 'https://www.cdiscount.com/telephonie/telephone-mobile/apple-iphone-15-128-go-noir/f-14406-app123456.html',
-                    'rueducommerce': 'https://www.rueducommerce.fr/p-apple-iphone-15-128go-noir-123456.html',
-                    'boulanger': 'https://www.boulanger.com/ref/apple-iphone-15-128go-noir-123456'
-                }
-            },
-            {
-                'nom': 'Samsung Galaxy S24 256GB',
-                'prix_base': 759.00,
-                'variation_max': 80,
-                'urls': {
-                    'cdiscount': 'https://www.cdiscount.com/telephonie/telephone-mobile/samsung-galaxy-s24-256go-noir/f-14406-sam789012.html',
-                    'rueducommerce': 'https://www.rueducommerce.fr/p-samsung-galaxy-s24-256go-noir-789012.html',
-                    'boulanger': 'https://www.boulanger.com/ref/samsung-galaxy-s24-256go-noir-789012'
-                }
-            },
-            {
-                'nom': 'MacBook Air M3 256GB',
-                'prix_base': 1299.00,
-                'variation_max': 100,
-                'urls': {
-                    'cdiscount': 'https://www.cdiscount.com/informatique/ordinateurs-pc-portables/apple-macbook-air-m3-256gb/f-10701-app345678.html',
-                    'rueducommerce': 'https://www.rueducommerce.fr/p-apple-macbook-air-m3-256gb-345678.html',
-                    'boulanger': 'https://www.boulanger.com/ref/apple-macbook-air-m3-256gb-345678'
-                }
-            },
-            {
-                'nom': 'iPad Air 5ème génération 64GB',
-                'prix_base': 699.00,
-                'variation_max': 60,
-                'urls': {
-                    'cdiscount': 'https://www.cdiscount.com/informatique/tablettes-tactiles/apple-ipad-air-64gb/f-10702-app567890.html',
-                    'rueducommerce': 'https://www.rueducommerce.fr/p-apple-ipad-air-64gb-567890.html',
-                    'boulanger': 'https://www.boulanger.com/ref/apple-ipad-air-64gb-567890'
-                }
-            },
-            {
-                'nom': 'Dell XPS 13 Plus Intel i7',
-                'prix_base': 1099.00,
-                'variation_max': 150,
-                'urls': {
-                    'cdiscount': 'https://www.cdiscount.com/informatique/ordinateurs-pc-portables/dell-xps-13-plus-i7/f-10701-del234567.html',
-                    'rueducommerce': 'https://www.rueducommerce.fr/p-dell-xps-13-plus-i7-234567.html',
-                    'boulanger': 'https://www.boulanger.com/ref/dell-xps-13-plus-i7-234567'
-                }
-            }
-        ]
+        # Catalogue à surveiller: produits_techpulse et urls_produits_concurrents (instantané local)
+        self.produits_catalogue = charger_catalogue(repli=CATALOGUE_DEMONSTRATION)
         
         # Mapping sites
         self.sites_mapping = {
@@ -89,14 +106,28 @@ class TechPulseScraperFinal:
             'rueducommerce': 2,
             'boulanger': 3
         }
-
-    def get_db_connection(self):
-        """Connexion PostgreSQL"""
-        try:
-            return psycopg2.connect(**self.db_config)
-        except Exception as e:
-            logger.error(f"Erreur connexion DB: {e}")
-            return None
+        
+        # Nombre maximum de produits collectés en parallèle par site (mode concurrent)
+        self.concurrence_par_site = {
+            'cdiscount': 4,
+            'rueducommerce': 3,
+            'boulanger': 4
+        }
+        
+        # Nombre de produits écrits par commit lors de la collecte
+        self.taille_lot_ingestion = 500
+        
+        # Cache des validateurs HTTP (requêtes conditionnelles)
+        self.cache_http = CacheHTTP()
+        
+        # Dernier checksum écrit par (site, URL): les produits inchangés ne sont pas réécrits
+        self.index_checksums = IndexChecksums()
+        
+        # Requêtes: limiteur de débit par hôte, backoff avec gigue, disjoncteur par site
+        self.fetch = CoucheFetch()
+        
+        # Temps de scraping simulé (désactivé par les benchmarks)
+        self.delais_simulation = True
 
     def simulate_realistic_scraping(self, produit, site_name, url):
         """Simule un scraping réaliste avec variations de prix"""
@@ -104,20 +135,31 @@ class TechPulseScraperFinal:
         # Simulation du temps de scraping
         scraping_time = random.uniform(1.5, 4.0)
         logger.info(f"🔍 Scraping {site_name}: {produit['nom']}")
-        time.sleep(scraping_time)
+        if self.delais_simulation:
+            time.sleep(scraping_time)
         
+        response = None
         try:
-            # Tentative de vraie requête (pour réalisme)
+            # Tentative de vraie requête (pour réalisme), conditionnelle si déjà vue
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
+            headers.update(self.cache_http.en_tetes_conditionnels(url))
             
-            response = requests.get(url, headers=headers, timeout=5)
-            page_accessible = response.status_code == 200
+            # Seuls le statut et les validateurs servent: le corps n'est lu que pour l'archive
+            response = self.fetch.get(site_name, url, headers=headers, timeout=5, stream=True)
+            self.fetch.lire(site_name, response)
+            page_accessible = response.status_code in (200, 304)
             
         except:
             page_accessible = False
         
+        # Page inchangée depuis la dernière collecte: on réutilise l'enregistrement
+        cached_data = self.cache_http.reponse_en_cache(url, response)
+        if cached_data:
+            logger.info(f"  ♻️ Inchangé (304): {cached_data['prix_ttc']}€")
+            return cached_data
+        
         # Génération de données réalistes
         prix_base = produit['prix_base']
         variation = random.uniform(-produit['variation_max'], produit['variation_max'])
@@ -162,6 +204,8 @@ class TechPulseScraperFinal:
         data_string = f"{product_data['nom_produit']}_{product_data['prix_ttc']}_{product_data['disponible']}"
         product_data['checksum_produit'] = hashlib.md5(data_string.encode()).hexdigest()
         
+        self.cache_http.memoriser(url, response, product_data)
+        
         # Log détaillé
         status_icon = "🟢" if disponible else "🔴"
         promo_info = f" (PROMO: {prix_promotion}€)" if en_promotion else ""
@@ -169,172 +213,284 @@ class TechPulseScraperFinal:
         
         return product_data
 
+    def new_ingestion_batch(self, site_name):
+        """Tampon d'ingestion par lots pour un site (produits inchangés ignorés)"""
+        site_id = self.sites_mapping.get(site_name, 1)
+        return IngestionBatch(site_id, site_name, taille_lot=self.taille_lot_ingestion,
+                              index_checksums=self.index_checksums)
+
+    def _donnees_brutes(self, product_data):
+        """Métadonnées JSON stockées dans donnees_brutes"""
+        return {
+            'page_accessible': product_data.get('page_accessible', False),
+            'simulation': True,
+            'scraping_timestamp': product_data['date_collecte'].isoformat()
+        }
+
     def save_to_database(self, product_data, site_name):
-        """Sauvegarde en base de données"""
-        conn = self.get_db_connection()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
-            
-            site_id = self.sites_mapping.get(site_name, 1)
-            
-            # Insertion dans produits_concurrents
-            insert_query = """
-                INSERT INTO produits_concurrents (
-                    id_site, url_produit, nom_produit_concurrent,
-                    prix_ttc, prix_promotion, en_promotion, disponible, stock_affiche,
-                    note_moyenne, nombre_avis, date_collecte, donnees_brutes, checksum_produit
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            donnees_brutes = {
-                'page_accessible': product_data.get('page_accessible', False),
-                'simulation': True,
-                'scraping_timestamp': product_data['date_collecte'].isoformat()
-            }
-            
-            cursor.execute(insert_query, (
-                site_id,
-                product_data['url'],
-                product_data['nom_produit'],
-                product_data['prix_ttc'],
-                product_data['prix_promotion'],
-                product_data['en_promotion'],
-                product_data['disponible'],
-                product_data['stock_affiche'],
-                product_data['note_moyenne'],
-                product_data['nombre_avis'],
-                product_data['date_collecte'],
-                json.dumps(donnees_brutes),
-                product_data['checksum_produit']
-            ))
-            
-            # Mise à jour historique des prix
-            cursor.execute("""
-                INSERT INTO historique_prix (
-                    id_site, prix_ttc, prix_promotion, en_promotion, date_prix
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, (
-                site_id,
-                product_data['prix_ttc'],
-                product_data['prix_promotion'],
-                product_data['en_promotion'],
-                product_data['date_collecte'].date()
-            ))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur sauvegarde: {e}")
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+        """Sauvegarde unitaire en base de données (lot d'une ligne)"""
+        site_id = self.sites_mapping.get(site_name, 1)
+        lot = IngestionBatch(site_id, site_name, taille_lot=1)
+        lot.ajouter(product_data, self._donnees_brutes(product_data))
+        return lot.flush() == 1
 
-    def log_scraping_session(self, site_name, nb_produits, nb_succes, nb_erreurs, duree):
-        """Log de la session de scraping"""
-        conn = self.get_db_connection()
-        if not conn:
-            return
-        
+    def log_scraping_session(self, site_name, nb_produits, nb_succes, nb_erreurs, duree, details=None, message_erreur=None):
+        """Log de la session de scraping (details: JSON stocké dans details_execution)"""
         try:
-            cursor = conn.cursor()
-            
-            site_id = self.sites_mapping.get(site_name, 1)
-            statut = 'success' if nb_erreurs == 0 else 'warning' if nb_erreurs < nb_produits else 'error'
-            
-            cursor.execute("""
-                INSERT INTO logs_collecte (
-                    id_site, type_collecte, statut, nb_produits_collectes,
-                    nb_erreurs, duree_execution_sec, date_debut, date_fin
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                site_id,
-                'scraping_simulation',
-                statut,
-                nb_succes,
-                nb_erreurs,
-                int(duree),
-                datetime.now() - timedelta(seconds=duree),
-                datetime.now()
-            ))
-            
-            conn.commit()
+            with connexion_db() as conn:
+                cursor = conn.cursor()
+                
+                site_id = self.sites_mapping.get(site_name, 1)
+                statut = 'success' if nb_erreurs == 0 else 'warning' if nb_erreurs < nb_produits else 'error'
+                
+                cursor.execute("""
+                    INSERT INTO logs_collecte (
+                        id_site, type_collecte, statut, nb_produits_collectes,
+                        nb_erreurs, duree_execution_sec, message_erreur, details_execution,
+                        date_debut, date_fin
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    site_id,
+                    'scraping_simulation',
+                    statut,
+                    nb_succes,
+                    nb_erreurs,
+                    int(duree),
+                    message_erreur,
+                    json.dumps(details) if details is not None else None,
+                    datetime.now() - timedelta(seconds=duree),
+                    datetime.now()
+                ))
+                
+                conn.commit()
             
         except Exception as e:
             logger.error(f"❌ Erreur log session: {e}")
-        finally:
-            conn.close()
 
-    def run_full_collection(self, target_sites=None):
-        """Exécute une collecte complète sur tous les sites"""
+    def run_full_collection(self, target_sites=None, mode='sequentiel', shard=None, rejeu=None, planification=None,
+                            backend='requests'):
+        """Exécute une collecte complète sur tous les sites
+        
+        mode='concurrent' collecte tous les sites en même temps, avec une
+        limite de produits en vol par site (voir concurrence_par_site).
+        shard=(index, nb_shards) restreint la collecte à une tranche du catalogue.
+        rejeu=jour (date) lit les pages archivées ce jour-là au lieu du réseau.
+        planification (PlanificationCollecte) restreint chaque site à ses produits dus.
+        backend='scrapy' collecte les pages produit avec un spider Scrapy par site
+        (extraction réelle, mode ignoré); le rejeu passe toujours par requests.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+        
+        if rejeu is not None:
+            fetch, delais_simulation = self.fetch, self.delais_simulation
+            self.fetch, self.delais_simulation = FetchRejeu(rejeu), False
+            logger.info(f"⏪ Rejeu depuis l'archive du {rejeu}: aucune requête réseau")
+            try:
+                # backend omis à dessein: le rejeu lit l'archive via la couche fetch, que Scrapy n'utilise pas
+                return self.run_full_collection(target_sites, mode, shard, planification=planification)
+            finally:
+                self.fetch, self.delais_simulation = fetch, delais_simulation
+        
         if target_sites is None:
             target_sites = ['cdiscount', 'rueducommerce', 'boulanger']
         
-        logger.info(f"🚀 Début collecte complète TechPulse")
+        produits = self.produits_catalogue
+        if shard is not None:
+            produits = produits_du_shard(produits, *shard)
+        
+        produits_par_site = {
+            site_name: [p for p in produits if site_name in p['urls']] for site_name in target_sites
+        }
+        
+        logger.info(f"🚀 Début collecte complète TechPulse ({'backend scrapy' if backend == 'scrapy' else f'mode {mode}'})")
         logger.info(f"📋 Sites ciblés: {', '.join(target_sites)}")
-        logger.info(f"📦 Produits à collecter: {len(self.produits_catalogue)}")
+        if shard is not None:
+            logger.info(f"🧩 Shard {shard[0] + 1}/{shard[1]}")
+        if planification is not None:
+            for site_name, produits_site in produits_par_site.items():
+                dus = planification.reserver_dus(self.sites_mapping.get(site_name, 1), produits_site)
+                logger.info(f"🗓️ {site_name}: {len(dus)}/{len(produits_site)} produits dus")
+                produits_par_site[site_name] = dus
+        logger.info(f"📦 Produits à collecter: {sum(len(p) for p in produits_par_site.values())}")
         
         total_start_time = time.time()
+        
+        if backend == 'scrapy':
+            results_summary = self._run_scrapy_collection(target_sites, produits_par_site, planification)
+        elif mode == 'concurrent':
+            results_summary = asyncio.run(self._run_concurrent_collection(target_sites, produits_par_site, planification))
+        else:
+            results_summary = self._run_sequential_collection(target_sites, produits_par_site, planification)
+        
+        # Résumé global
+        total_duration = time.time() - total_start_time
+        total_succes = sum(r['succes'] for r in results_summary.values())
+        total_inchanges = sum(r.get('inchanges', 0) for r in results_summary.values())
+        total_erreurs = sum(r['erreurs'] for r in results_summary.values())
+        total_traites = total_succes + total_inchanges + total_erreurs
+        
+        logger.info(f"\n📊 === RÉSUMÉ GLOBAL ===")
+        logger.info(f"🎯 Total collecté: {total_succes} produits écrits, {total_inchanges} inchangés")
+        logger.info(f"❌ Erreurs: {total_erreurs}")
+        logger.info(f"⏱️ Durée totale: {total_duration:.1f}s")
+        if total_traites:
+            logger.info(f"📈 Taux de succès: {((total_succes + total_inchanges)/total_traites*100):.1f}%")
+        self.cache_http.log_stats()
+        
+        # Tâches Airflow éphémères: une série Pushgateway par (sites, shard)
+        pousser_metriques('techpulse_collecte', {
+            'sites': '-'.join(target_sites),
+            'shard': f"{shard[0]}-{shard[1]}" if shard is not None else 'complet'
+        })
+        
+        return results_summary
+
+    def _run_sequential_collection(self, target_sites, produits_par_site, planification=None):
+        """Collecte site par site, produit par produit"""
         results_summary = {}
         
         for site_name in target_sites:
             logger.info(f"\n📡 === COLLECTE {site_name.upper()} ===")
             
             site_start_time = time.time()
-            nb_succes = 0
-            nb_erreurs = 0
+            lot = self.new_ingestion_batch(site_name)
+            nb_erreurs_scraping = 0
             
-            for produit in self.produits_catalogue:
-                if site_name in produit['urls']:
-                    url = produit['urls'][site_name]
+            for produit in produits_par_site[site_name]:
+                url = produit['urls'][site_name]
+                
+                try:
+                    # Scraping
+                    product_data = self.simulate_realistic_scraping(produit, site_name, url)
                     
-                    try:
-                        # Scraping
-                        product_data = self.simulate_realistic_scraping(produit, site_name, url)
-                        
-                        # Sauvegarde
-                        if self.save_to_database(product_data, site_name):
-                            nb_succes += 1
-                        else:
-                            nb_erreurs += 1
-                        
-                        # Délai entre produits
-                        time.sleep(random.uniform(1, 3))
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Erreur {produit['nom']}: {e}")
-                        nb_erreurs += 1
-            
-            # Log de la session
-            site_duration = time.time() - site_start_time
-            self.log_scraping_session(site_name, len(self.produits_catalogue), nb_succes, nb_erreurs, site_duration)
+                    # Mise en tampon (écrit par lots)
+                    lot.ajouter(product_data, self._donnees_brutes(product_data),
+                                id_produit_techpulse=produit.get('id_produit'))
+                    
+                except Exception as e:
+                    logger.error(f"❌ Erreur {produit['nom']}: {e}")
+                    nb_erreurs_scraping += 1
             
-            # Résumé du site
-            results_summary[site_name] = {
-                'succes': nb_succes,
-                'erreurs': nb_erreurs,
-                'duree': site_duration
-            }
+            # Un commit pour le reliquat du site; seuls les produits écrits ou inchangés sont replanifiés
+            lot.flush()
+            if planification is not None:
+                planification.marquer_collectes(self.sites_mapping.get(site_name, 1), lot.collectes)
             
-            logger.info(f"✅ {site_name}: {nb_succes} succès, {nb_erreurs} erreurs en {site_duration:.1f}s")
+            results_summary[site_name] = self._finish_site(site_name, lot, nb_erreurs_scraping, site_start_time,
+                                                           len(produits_par_site[site_name]))
         
-        # Résumé global
-        total_duration = time.time() - total_start_time
-        total_succes = sum(r['succes'] for r in results_summary.values())
-        total_erreurs = sum(r['erreurs'] for r in results_summary.values())
+        return results_summary
+
+    def _run_scrapy_collection(self, target_sites, produits_par_site, planification=None):
+        """Collecte par spiders Scrapy (tous les sites en même temps), écriture par lots"""
+        from backend_scrapy import crawler_sites
         
-        logger.info(f"\n📊 === RÉSUMÉ GLOBAL ===")
-        logger.info(f"🎯 Total collecté: {total_succes} produits")
-        logger.info(f"❌ Erreurs: {total_erreurs}")
-        logger.info(f"⏱️ Durée totale: {total_duration:.1f}s")
-        logger.info(f"📈 Taux de succès: {(total_succes/(total_succes+total_erreurs)*100):.1f}%")
+        lots = {site_name: self.new_ingestion_batch(site_name) for site_name in target_sites}
+        # AutoThrottle démarre au delai_requete_sec du site (le même que le limiteur de la couche fetch)
+        delais = {
+            site_name: self.fetch.limiteur.delai_hote(hote_url(produits_par_site[site_name][0]['urls'][site_name]))
+            if produits_par_site[site_name] else 0
+            for site_name in target_sites
+        }
         
+        start_time = time.time()
+        spiders = crawler_sites({site: produits_par_site[site] for site in target_sites}, lots, delais,
+                                self.concurrence_par_site, fetch=self.fetch, cache_http=self.cache_http)
+        
+        results_summary = {}
+        for site_name in target_sites:
+            spider = spiders.get(site_name)
+            # Spider jamais démarré: tous ses produits comptent comme erreurs
+            nb_erreurs = spider.erreurs if spider is not None else len(produits_par_site[site_name])
+            if planification is not None:
+                planification.marquer_collectes(self.sites_mapping.get(site_name, 1), lots[site_name].collectes)
+            results_summary[site_name] = self._finish_site(site_name, lots[site_name], nb_erreurs, start_time,
+                                                           len(produits_par_site[site_name]))
         return results_summary
 
+    def _finish_site(self, site_name, lot, nb_erreurs_scraping, site_start_time, nb_produits):
+        """Journalise la session d'un site et construit son résumé"""
+        nb_succes = lot.stats['lignes']
+        nb_inchanges = lot.stats['inchanges']
+        nb_erreurs = nb_erreurs_scraping + lot.stats['erreurs']
+        
+        # Log de la session, avec l'état du disjoncteur du site
+        site_duration = time.time() - site_start_time
+        disjoncteur = self.fetch.disjoncteur(site_name).resume()
+        message_erreur = None
+        if disjoncteur['ouvertures']:
+            message_erreur = (f"Disjoncteur ouvert {disjoncteur['ouvertures']} fois "
+                              f"(dernier statut: {disjoncteur['dernier_statut'] or 'erreur réseau'}), "
+                              f"{disjoncteur['requetes_rejetees']} requêtes non envoyées")
+        self.log_scraping_session(site_name, nb_produits, nb_succes, nb_erreurs, site_duration,
+                                  details={'disjoncteur': disjoncteur}, message_erreur=message_erreur)
+        
+        logger.info(f"✅ {site_name}: {nb_succes} succès, {nb_inchanges} inchangés, {nb_erreurs} erreurs en {site_duration:.1f}s "
+                    f"({lot.lignes_par_seconde():.0f} lignes/s en écriture)")
+        
+        return {
+            'succes': nb_succes,
+            'inchanges': nb_inchanges,
+            'erreurs': nb_erreurs,
+            'duree': site_duration,
+            'lignes_par_sec': lot.lignes_par_seconde()
+        }
+
+    async def _run_concurrent_collection(self, target_sites, produits_par_site, planification=None):
+        """Collecte tous les sites en parallèle (asyncio + pool de threads)"""
+        # Les appels bloquants (requests, psycopg2, sleep) tournent dans un pool
+        # dimensionné sur la somme des limites de concurrence des sites ciblés
+        nb_workers = sum(self.concurrence_par_site.get(site, 2) for site in target_sites)
+        
+        with ThreadPoolExecutor(max_workers=max(nb_workers, 1), thread_name_prefix='collecte') as executor:
+            resumes = await asyncio.gather(*(
+                self._collect_site_async(site_name, produits_par_site[site_name], executor, planification)
+                for site_name in target_sites
+            ))
+        
+        return dict(zip(target_sites, resumes))
+
+    async def _collect_site_async(self, site_name, produits_site, executor, planification=None):
+        """Collecte un site avec au plus concurrence_par_site[site] produits en vol"""
+        loop = asyncio.get_running_loop()
+        limite = self.concurrence_par_site.get(site_name, 2)
+        semaphore = asyncio.Semaphore(limite)
+        lot = self.new_ingestion_batch(site_name)
+        
+        logger.info(f"📡 === COLLECTE {site_name.upper()} (concurrence {limite}) ===")
+        site_start_time = time.time()
+        
+        async def collect_product(produit):
+            async with semaphore:
+                url = produit['urls'][site_name]
+                try:
+                    product_data = await loop.run_in_executor(
+                        executor, self.simulate_realistic_scraping, produit, site_name, url
+                    )
+                    # Mise en tampon; le thread qui remplit le lot l'écrit
+                    await loop.run_in_executor(
+                        executor, lot.ajouter, product_data, self._donnees_brutes(product_data), produit.get('id_produit')
+                    )
+                    return True
+                    
+                except Exception as e:
+                    logger.error(f"❌ Erreur {produit['nom']}: {e}")
+                    return False
+        
+        resultats = await asyncio.gather(*(collect_product(p) for p in produits_site))
+        nb_erreurs_scraping = sum(1 for ok in resultats if not ok)
+        
+        # Un commit pour le reliquat du site, puis log de la session
+        await loop.run_in_executor(executor, lot.flush)
+        if planification is not None:
+            await loop.run_in_executor(
+                executor, planification.marquer_collectes, self.sites_mapping.get(site_name, 1), lot.collectes
+            )
+        return await loop.run_in_executor(
+            executor, self._finish_site, site_name, lot, nb_erreurs_scraping, site_start_time, len(produits_site)
+        )
+
 def test_collecte_complete():
     """Test de collecte complète"""
     scraper = TechPulseScraperFinal()
@@ -7,30 +7,53 @@ Scraper hybride pour démonstration Bloc 1 :
 """
 
 import requests
-from bs4 import BeautifulSoup
 import time
 import random
 import logging
-import psycopg2
 from datetime import datetime
-import json
 import hashlib
 
+from ingestion_batch import IngestionBatch
+from index_checksums import IndexChecksums
+from document_page import DocumentPage, charset_reponse
+from extraction_lxml import trouver_prix_texte
+from extraction_listes import SELECTEURS_LISTES, extracteur_listes
+from scraper_listes import ScraperListes
+from metriques import mesurer_parse, pousser_metriques
+from couche_fetch import CoucheFetch
+from catalogue import charger_catalogue
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+LIBELLES_SITES = {'cdiscount': 'Cdiscount', 'rueducommerce': 'Rue du Commerce', 'boulanger': 'Boulanger'}
+
+# Prix simulé de chaque site par rapport au prix TechPulse
+ECART_PRIX_SITE = {'cdiscount': 0, 'rueducommerce': 10, 'boulanger': 20}
+
+# Données de simulation de repli (base injoignable)
+SIMULATION_DEMONSTRATION = {
+    'cdiscount': [
+        {'nom': 'iPhone 14 128GB - Cdiscount', 'prix_base': 829.00, 'variation': 50},
+        {'nom': 'Samsung Galaxy S23 - Cdiscount', 'prix_base': 759.00, 'variation': 80},
+        {'nom': 'MacBook Air M2 - Cdiscount', 'prix_base': 1299.00, 'variation': 100}
+    ],
+    'rueducommerce': [
+        {'nom': 'iPhone 14 128GB - Rue du Commerce', 'prix_base': 839.00, 'variation': 40},
+        {'nom': 'Samsung Galaxy S23 - Rue du Commerce', 'prix_base': 769.00, 'variation': 70},
+        {'nom': 'MacBook Air M2 - Rue du Commerce', 'prix_base': 1289.00, 'variation': 90}
+    ],
+    'boulanger': [
+        {'nom': 'iPhone 14 128GB - Boulanger', 'prix_base': 849.00, 'variation': 30},
+        {'nom': 'Samsung Galaxy S23 - Boulanger', 'prix_base': 779.00, 'variation': 60},
+        {'nom': 'MacBook Air M2 - Boulanger', 'prix_base': 1309.00, 'variation': 80}
+    ]
+}
+
 class ScraperHybrideDemo:
     """Scraper hybride : vrai scraping + simulation documentée"""
     
     def __init__(self):
-        self.db_config = {
-            'host': 'postgres',
-            'port': 5432,
-            'database': 'techpulse_veille',
-            'user': 'techpulse',
-            'password': 'techpulse2024'
-        }
-        
         # URLs réelles des 3 concurrents TechPulse (URLs valides testées)
         self.urls_test_reelles = [
             {
@@ -56,32 +79,33 @@ class ScraperHybrideDemo:
             }
         ]
         
-        # Données de simulation cohérentes avec votre catalogue TechPulse
-        self.simulation_data_par_site = {
-            'cdiscount': [
-                {'nom': 'iPhone 14 128GB - Cdiscount', 'prix_base': 829.00, 'variation': 50},
-                {'nom': 'Samsung Galaxy S23 - Cdiscount', 'prix_base': 759.00, 'variation': 80},
-                {'nom': 'MacBook Air M2 - Cdiscount', 'prix_base': 1299.00, 'variation': 100}
-            ],
-            'rueducommerce': [
-                {'nom': 'iPhone 14 128GB - Rue du Commerce', 'prix_base': 839.00, 'variation': 40},
-                {'nom': 'Samsung Galaxy S23 - Rue du Commerce', 'prix_base': 769.00, 'variation': 70},
-                {'nom': 'MacBook Air M2 - Rue du Commerce', 'prix_base': 1289.00, 'variation': 90}
-            ],
-            'boulanger': [
-                {'nom': 'iPhone 14 128GB - Boulanger', 'prix_base': 849.00, 'variation': 30},
-                {'nom': 'Samsung Galaxy S23 - Boulanger', 'prix_base': 779.00, 'variation': 60},
-                {'nom': 'MacBook Air M2 - Boulanger', 'prix_base': 1309.00, 'variation': 80}
-            ]
-        }
+        # Dernier checksum écrit par (site, URL)
+        self.index_checksums = IndexChecksums()
+        
+        # Requêtes: limiteur de débit par hôte, backoff avec gigue, disjoncteur par site
+        self.fetch = CoucheFetch()
+        
+        # Pages de liste: toutes les tuiles, pagination, page produit seulement si prix/stock changé
+        self.listes = ScraperListes(fetch=self.fetch, index_produits=self.index_checksums)
+        
+        # Données de simulation tirées du catalogue TechPulse (produits_techpulse)
+        self.simulation_data_par_site = self._simulation_depuis_catalogue() or SIMULATION_DEMONSTRATION
 
-    def get_db_connection(self):
-        """Connexion PostgreSQL"""
-        try:
-            return psycopg2.connect(**self.db_config)
-        except Exception as e:
-            logger.error(f"Erreur connexion DB: {e}")
-            return None
+    def _simulation_depuis_catalogue(self):
+        """Produits simulés par site depuis le catalogue de veille (vide si la base est injoignable)"""
+        produits = charger_catalogue(avec_urls=False)
+        return {
+            site_name: [
+                {
+                    'id_produit': produit['id_produit'],
+                    'nom': f"{produit['nom']} - {libelle}",
+                    'prix_base': produit['prix_base'] + ECART_PRIX_SITE[site_name],
+                    'variation': produit['variation_max']
+                }
+                for produit in produits if produit['prix_base']
+            ]
+            for site_name, libelle in LIBELLES_SITES.items()
+        } if produits else {}
 
     def attempt_real_scraping(self, test_url_data):
         """Tentative de vrai scraping avec documentation complète"""
@@ -106,6 +130,8 @@ class ScraperHybrideDemo:
             'content_length': 0,
             'response_time': 0,
             'prix_trouve': None,
+            'nb_offres': 0,
+            'etage': 'statique',
             'erreur': None,
             'contenu_detecte': []
         }
@@ -113,67 +139,74 @@ class ScraperHybrideDemo:
         try:
             start_time = time.time()
             
-            # Tentative de requête réelle
-            response = requests.get(
+            # Tentative de requête réelle (corps lu en flux, taille bornée)
+            response = self.fetch.get(
+                test_url_data['site'],
                 test_url_data['url'], 
                 headers=headers, 
                 timeout=10,
-                allow_redirects=True
+                allow_redirects=True,
+                stream=True
             )
             
             scraping_result['response_time'] = time.time() - start_time
             scraping_result['status_code'] = response.status_code
-            scraping_result['content_length'] = len(response.content)
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Analyser le contenu reçu
-                page_text = soup.get_text().lower()
-                title = soup.find('title')
+                # Page de liste lue en entier: toutes ses tuiles produit sont extraites
+                contenu = bytearray()
+                scraping_result['content_length'], tronque = self.fetch.lire(test_url_data['site'], response, contenu.extend)
+                with mesurer_parse(test_url_data['site']):
+                    doc = DocumentPage(bytes(contenu), charset_reponse(response), test_url_data['url'])
+                    offres, page_suivante = extracteur_listes.extraire(doc.tree, test_url_data['site'], test_url_data['url'])
+                    
+                    # Analyser le contenu reçu (texte calculé une seule fois)
+                    page_text = doc.texte_minuscule
+                    
+                    if doc.titre:
+                        scraping_result['contenu_detecte'].append(f"Title: {doc.titre[:100]}")
+                    
+                    # Recherche de mots-clés pertinents
+                    keywords = ['iphone', 'samsung', 'smartphone', 'prix', 'euro', '€']
+                    found_keywords = [kw for kw in keywords if kw in page_text]
+                    scraping_result['contenu_detecte'].append(f"Mots-clés trouvés: {found_keywords}")
                 
-                if title:
-                    scraping_result['contenu_detecte'].append(f"Title: {title.get_text()[:100]}")
+                # Tuiles affichées en JavaScript: même page rendue par un navigateur du pool
+                if not offres:
+                    rendu = self.listes.rendre(test_url_data['url'], SELECTEURS_LISTES.get(test_url_data['site'], {}).get('prix', []))
+                    if rendu is not None:
+                        doc = rendu
+                        with mesurer_parse(test_url_data['site']):
+                            offres, page_suivante = extracteur_listes.extraire(doc.tree, test_url_data['site'], doc.url)
+                        scraping_result['etage'] = 'navigateur'
                 
-                # Recherche de mots-clés pertinents
-                keywords = ['iphone', 'samsung', 'smartphone', 'prix', 'euro', '€']
-                found_keywords = [kw for kw in keywords if kw in page_text]
-                scraping_result['contenu_detecte'].append(f"Mots-clés trouvés: {found_keywords}")
+                # Pages suivantes de la liste
+                if offres and page_suivante:
+                    offres += self.listes.parcourir(test_url_data['site'], page_suivante, deja_vues={test_url_data['url']})
+                scraping_result['offres'] = offres
+                scraping_result['nb_offres'] = len(offres)
                 
-                # Tentative d'extraction de prix
-                import re
-                price_patterns = [
-                    r'(\d{1,4})[,.](\d{2})\s*€',
-                    r'(\d{1,4})\s*€',
-                    r'EUR\s*(\d{1,4})[,.](\d{2})',
-                ]
-                
-                for pattern in price_patterns:
-                    matches = re.findall(pattern, page_text)
-                    if matches:
-                        try:
-                            if isinstance(matches[0], tuple) and len(matches[0]) == 2:
-                                prix = float(f"{matches[0][0]}.{matches[0][1]}")
-                            else:
-                                prix = float(matches[0] if isinstance(matches[0], str) else matches[0][0])
-                            
-                            if 100 <= prix <= 3000:  # Prix réaliste
-                                scraping_result['prix_trouve'] = prix
-                                break
-                        except:
-                            continue
+                # Prix de la première tuile, sinon premier prix réaliste du texte (entre 100€ et 3000€)
+                scraping_result['prix_trouve'] = (
+                    offres[0]['prix_promotion'] or offres[0]['prix_ttc'] if offres
+                    else trouver_prix_texte(doc.texte, prix_min=100, prix_max=3000)
+                )
                 
                 scraping_result['success'] = True
                 
                 logger.info(f"   ✅ Status: {response.status_code}")
-                logger.info(f"   📄 Contenu: {len(response.content)} bytes")
+                logger.info(f"   📄 Contenu: {scraping_result['content_length']} bytes lus"
+                            f"{' (tronqué)' if tronque else ''}")
                 logger.info(f"   ⏱️ Temps: {scraping_result['response_time']:.2f}s")
+                if scraping_result['nb_offres']:
+                    logger.info(f"   📃 Offres extraites: {scraping_result['nb_offres']}")
                 if scraping_result['prix_trouve']:
                     logger.info(f"   💰 Prix détecté: {scraping_result['prix_trouve']}€")
                 else:
                     logger.info(f"   💰 Prix: Non détecté (site protégé/dynamique)")
                 
             else:
+                response.close()
                 scraping_result['erreur'] = f"HTTP {response.status_code}"
                 logger.warning(f"   ⚠️ Status: {response.status_code}")
                 
@@ -222,6 +255,7 @@ class ScraperHybrideDemo:
             disponible = random.random() < dispo_chances.get(site_name, 0.9)
             
             product_data = {
+                'id_produit': produit.get('id_produit'),
                 'nom_produit': produit['nom'],
                 'prix_ttc': prix_final,
                 'prix_promotion': prix_promotion,
@@ -244,69 +278,44 @@ class ScraperHybrideDemo:
         
         return results
 
-    def save_to_database_with_metadata(self, product_data, site_id=1):
-        """Sauvegarde avec métadonnées complètes"""
-        conn = self.get_db_connection()
-        if not conn:
-            return False
+    def save_to_database_with_metadata(self, product_data, site_id=1, lot=None):
+        """Sauvegarde avec métadonnées complètes (différée si un lot est fourni)"""
+        # Créer les métadonnées complètes
+        metadata = {
+            'methode_collecte': product_data.get('methode_collecte', 'simulation'),
+            'tentative_scraping': product_data.get('tentative_scraping_reelle', {}),
+            'timestamp_collecte': product_data['date_collecte'].isoformat(),
+            'demonstration_bloc1': True,
+            'systeme_fonctionnel': True
+        }
         
-        try:
-            cursor = conn.cursor()
-            
-            # Créer les métadonnées complètes
-            metadata = {
-                'methode_collecte': product_data.get('methode_collecte', 'simulation'),
-                'tentative_scraping': product_data.get('tentative_scraping_reelle', {}),
-                'timestamp_collecte': product_data['date_collecte'].isoformat(),
-                'demonstration_bloc1': True,
-                'systeme_fonctionnel': True
-            }
-            
-            # URL documentée
-            if product_data.get('tentative_scraping_reelle'):
-                url_base = product_data['tentative_scraping_reelle'].get('url', 'https://simulation.techpulse.com')
-            else:
-                url_base = 'https://simulation.techpulse.com'
-            
-            url_produit = f"{url_base}/produit/{product_data['nom_produit'].replace(' ', '-').lower()}"
-            
-            cursor.execute("""
-                INSERT INTO produits_concurrents (
-                    id_site, url_produit, nom_produit_concurrent,
-                    prix_ttc, prix_promotion, en_promotion, disponible, stock_affiche,
-                    note_moyenne, nombre_avis, date_collecte, donnees_brutes, checksum_produit
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                site_id,
-                url_produit,
-                product_data['nom_produit'],
-                product_data['prix_ttc'],
-                product_data['prix_promotion'],
-                product_data['en_promotion'],
-                product_data['disponible'],
-                product_data['stock_affiche'],
-                product_data['note_moyenne'],
-                product_data['nombre_avis'],
-                product_data['date_collecte'],
-                json.dumps(metadata, indent=2),
-                hashlib.md5(f"{product_data['nom_produit']}{product_data['prix_ttc']}".encode()).hexdigest()
-            ))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur sauvegarde: {e}")
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+        # URL documentée
+        if product_data.get('tentative_scraping_reelle'):
+            url_base = product_data['tentative_scraping_reelle'].get('url', 'https://simulation.techpulse.com')
+        else:
+            url_base = 'https://simulation.techpulse.com'
+        
+        enregistrement = dict(
+            product_data,
+            url=f"{url_base}/produit/{product_data['nom_produit'].replace(' ', '-').lower()}",
+            checksum_produit=hashlib.md5(f"{product_data['nom_produit']}{product_data['prix_ttc']}".encode()).hexdigest()
+        )
+        
+        ecriture_immediate = lot is None
+        if ecriture_immediate:
+            lot = IngestionBatch(site_id, product_data.get('site_name'), taille_lot=1)
+        
+        lot.ajouter(enregistrement, metadata, id_produit_techpulse=product_data.get('id_produit'))
+        
+        if ecriture_immediate:
+            return lot.stats['lignes'] == 1
+        return True
 
     def run_demo_collection(self):
         """Collecte de démonstration complète sur les 3 sites TechPulse"""
         logger.info("🚀 DÉMONSTRATION COLLECTE TECHPULSE")
         logger.info("   Sites concurrents: Cdiscount, Rue du Commerce, Boulanger")
-        logger.info("   Produits surveillés: iPhone 14, Galaxy S23, MacBook Air M2")
+        logger.info(f"   Produits surveillés: {', '.join(p['nom'].rsplit(' - ', 1)[0] for p in self.simulation_data_par_site.get('cdiscount', []))}")
         logger.info("   Méthode: Tentatives réelles + simulation cohérente")
         
         all_results = []
@@ -318,25 +327,38 @@ class ScraperHybrideDemo:
         for url_data in self.urls_test_reelles:
             attempt = self.attempt_real_scraping(url_data)
             scraping_attempts[url_data['site']] = attempt
-            time.sleep(2)  # Respecter les sites
         
         # Phase 2: Génération de données par site avec cohérence TechPulse
         logger.info("\n📊 === PHASE 2: GÉNÉRATION DONNÉES PAR SITE ===")
         
         for site_name in ['cdiscount', 'rueducommerce', 'boulanger']:
             scraping_attempt = scraping_attempts.get(site_name)
-            
-            site_products = self.generate_fallback_data_per_site(site_name, scraping_attempt)
+            offres = scraping_attempt.pop('offres', []) if scraping_attempt else []
             
             # Sauvegarde avec le bon site_id
             site_mapping = {'cdiscount': 1, 'rueducommerce': 2, 'boulanger': 3}
             site_id = site_mapping[site_name]
             
+            # Offres réelles des pages de liste: écrites telles quelles, pas de simulation
+            if offres:
+                logger.info(f"📃 {site_name.upper()}: {len(offres)} offres réelles extraites de la liste")
+                lot = self.listes.lot(site_id, site_name)
+                self.listes.ingerer(site_name, site_id, offres, lot)
+                lot.flush()
+                self.listes.valider_tuiles(site_id)
+                all_results.extend(offres)
+                continue
+            
+            site_products = self.generate_fallback_data_per_site(site_name, scraping_attempt)
+            
+            # Un seul commit par site
+            lot = IngestionBatch(site_id, site_name, index_checksums=self.index_checksums)
             for product_data in site_products:
-                if self.save_to_database_with_metadata(product_data, site_id=site_id):
-                    all_results.append(product_data)
+                self.save_to_database_with_metadata(product_data, site_id=site_id, lot=lot)
             
-            time.sleep(1)
+            lot.flush()
+            if lot.stats['erreurs'] == 0:
+                all_results.extend(site_products)
         
         # Résumé cohérent avec votre projet
         logger.info(f"\n📋 === RÉSUMÉ COLLECTE TECHPULSE ===")
@@ -346,6 +368,8 @@ class ScraperHybrideDemo:
         logger.info(f"🎁 Promotions actives: {sum(1 for p in all_results if p['en_promotion'])}")
         logger.info(f"✅ Système ETL TechPulse: Opérationnel")
         
+        pousser_metriques('techpulse_demo')
+        
         return all_results
 
 def demo_bloc1():
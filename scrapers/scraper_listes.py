@@ -0,0 +1,238 @@
+# scrapers/scraper_listes.py
+"""
+Collecte par pages de liste (recherche, catégorie): toutes les offres d'une page en une requête
+Pagination suivie; page produit demandée seulement quand le prix ou le stock d'une tuile a changé
+"""
+
+import os
+import hashlib
+import logging
+from datetime import datetime
+
+from couche_fetch import CoucheFetch
+from document_page import DocumentPage, charset_reponse
+from extraction_listes import SELECTEURS_LISTES, extracteur_listes
+from extraction_lxml import SELECTEURS_PAR_SITE, moteur_extraction, disponibilite_texte
+from index_checksums import IndexChecksums
+from ingestion_batch import IngestionBatch
+from metriques import mesurer_parse
+from navigateur_pool import pool_partage
+
+logger = logging.getLogger(__name__)
+
+PAGES_MAX = int(os.getenv('TECHPULSE_LISTES_PAGES_MAX', '20'))
+
+# Vide, 0, false ou non: les tuiles modifiées sont écrites sans consulter leur page produit
+DETAIL_SI_CHANGE = os.getenv('TECHPULSE_LISTES_DETAIL', '1').strip().lower() not in ('', '0', 'false', 'non')
+
+ESPACE_TUILES = 'tuiles'
+
+
+def checksum_tuile(offre):
+    """Empreinte prix/stock d'une tuile (un changement de libellé seul ne déclenche pas de page produit)"""
+    return hashlib.md5(
+        f"{offre['prix_ttc']}|{offre['prix_promotion']}|{offre['disponible']}".encode()
+    ).hexdigest()
+
+
+def checksum_produit(product_data):
+    """Même empreinte que les scrapers de pages produit: l'index partagé reconnaît l'offre quelle que soit sa source"""
+    data_string = f"{product_data['nom_produit']}_{product_data['prix_ttc']}_{product_data['disponible']}"
+    return hashlib.md5(data_string.encode()).hexdigest()
+
+
+class ScraperListes:
+    """Pages de liste d'un site: extraction des tuiles, pagination, ingestion par lots"""
+
+    def __init__(self, fetch=None, index_tuiles=None, pages_max=PAGES_MAX, detail_si_change=DETAIL_SI_CHANGE,
+                 navigateurs=None, index_produits=None):
+        self.fetch = fetch or CoucheFetch()
+        # Étage de repli: pages sans tuile ni prix dans le HTML statique (None: pool du processus s'il existe)
+        self.navigateurs = navigateurs or pool_partage()
+        # Checksums des tuiles, séparés de ceux des pages produit (calculés sur d'autres champs)
+        self.index_tuiles = index_tuiles or IndexChecksums(espace=ESPACE_TUILES)
+        # Checksums des pages produit, partagés avec les autres scrapers et tenus à jour par le lot d'ingestion
+        self.index_produits = index_produits or IndexChecksums()
+        # Checksums de tuiles par site, mémorisés seulement une fois l'offre écrite (valider_tuiles)
+        self._tuiles_en_attente = {}
+        self.pages_max = pages_max
+        self.detail_si_change = detail_si_change
+        self.stats = {'pages': 0, 'offres': 0, 'nouvelles': 0, 'inchangees': 0, 'details': 0, 'echecs_detail': 0,
+                      'rendus': 0}
+
+    def _lire_page(self, site, url):
+        """Corps complet d'une page 200 (None sinon): une liste a besoin de toutes ses tuiles"""
+        response = self.fetch.get(site, url, timeout=10, allow_redirects=True, stream=True)
+        if response.status_code != 200:
+            logger.warning(f"⚠️  {url}: HTTP {response.status_code}")
+            response.close()
+            return None
+        contenu = bytearray()
+        self.fetch.lire(site, response, contenu.extend)
+        return DocumentPage(bytes(contenu), charset_reponse(response), response.url or url)
+
+    def rendre(self, url, selecteurs):
+        """Page rendue par le pool de navigateurs (None sans pool ou en cas d'échec)"""
+        if self.navigateurs is None:
+            return None
+        logger.info(f"🌐 Rien d'extractible dans le HTML statique, rendu navigateur: {url}")
+        try:
+            doc = self.navigateurs.document(url, ', '.join(selecteurs))
+        except Exception as e:
+            logger.warning(f"⚠️  Rendu navigateur impossible pour {url}: {e}")
+            return None
+        self.stats['rendus'] += 1
+        return doc
+
+    def page(self, site, url):
+        """Offres d'une page de liste et URL de la page suivante"""
+        doc = self._lire_page(site, url)
+        if doc is None:
+            return [], None
+        with mesurer_parse(site):
+            offres, suivante = extracteur_listes.extraire(doc.tree, site, doc.url)
+        if not offres:
+            rendu = self.rendre(doc.url, SELECTEURS_LISTES.get(site, {}).get('prix', []))
+            if rendu is not None:
+                with mesurer_parse(site):
+                    offres, suivante = extracteur_listes.extraire(rendu.tree, site, rendu.url)
+        self.stats['pages'] += 1
+        for offre in offres:
+            offre['page_liste'] = url
+        return offres, suivante
+
+    def parcourir(self, site, url, deja_vues=None):
+        """Offres de la page et des pages suivantes (au plus pages_max, une page n'est jamais relue)"""
+        vues = set(deja_vues or ())
+        offres = []
+        while url and url not in vues and len(vues) < self.pages_max:
+            vues.add(url)
+            try:
+                offres_page, url = self.page(site, url)
+            except Exception as e:
+                logger.warning(f"⚠️  Pagination {site} interrompue ({e})")
+                break
+            offres.extend(offres_page)
+
+        # Une même offre peut remonter sur deux pages si le classement bouge pendant le parcours
+        uniques = list({offre['url']: offre for offre in offres}.values())
+        logger.info(f"📃 {site}: {len(uniques)} offres sur {len(vues)} page(s) de liste")
+        return uniques
+
+    def detail(self, site, url):
+        """Nom, prix et disponibilité relus sur la page produit (None si illisible)"""
+        doc = self._lire_page(site, url)
+        if doc is None:
+            return None
+        with mesurer_parse(site):
+            prix = moteur_extraction.extraire_prix(doc.tree, site)
+        if prix is None:
+            doc = self.rendre(doc.url, SELECTEURS_PAR_SITE.get(site, {}).get('prix', []))
+            if doc is None:
+                return None
+            with mesurer_parse(site):
+                prix = moteur_extraction.extraire_prix(doc.tree, site)
+            if prix is None:
+                return None
+        return {
+            'nom_produit': moteur_extraction.extraire_nom(doc.tree, site),
+            'prix': prix,
+            'disponible': disponibilite_texte(doc.texte_minuscule)
+        }
+
+    def _completer(self, site, offre):
+        """Offre corrigée par sa page produit: la tuile peut être en retard sur la fiche"""
+        try:
+            detail = self.detail(site, offre['url'])
+        except Exception as e:
+            logger.warning(f"⚠️  Page produit {offre['url']}: {e}")
+            detail = None
+        if detail is None:
+            self.stats['echecs_detail'] += 1
+            return offre
+
+        self.stats['details'] += 1
+        offre = dict(offre, nom_produit=detail['nom_produit'] or offre['nom_produit'], disponible=detail['disponible'])
+        prix_affiche = offre['prix_promotion'] or offre['prix_ttc']
+        if round(detail['prix'], 2) != round(prix_affiche, 2):
+            offre.update(prix_ttc=detail['prix'], prix_promotion=None, en_promotion=False)
+        return offre
+
+    def ingerer(self, site, site_id, offres, lot, ids_par_url=None):
+        """Ajoute au lot les offres nouvelles ou modifiées; retourne le nombre d'offres ajoutées
+
+        Tuile identique à la collecte précédente: seulement marquée comme vue.
+        Prix ou stock changé: page produit relue avant écriture (si detail_si_change).
+        """
+        ids_par_url = ids_par_url or {}
+        en_attente = self._tuiles_en_attente.setdefault(site_id, {})
+        ajoutees = 0
+        for offre in offres:
+            self.stats['offres'] += 1
+            checksum = checksum_tuile(offre)
+            precedent = self.index_tuiles.precedent(site_id, offre['url'])
+            if precedent == checksum:
+                self.index_tuiles.toucher(site_id, offre['url'])
+                self.stats['inchangees'] += 1
+                continue
+
+            if precedent is None:
+                self.stats['nouvelles'] += 1
+            elif self.detail_si_change:
+                offre = self._completer(site, offre)
+
+            product_data = {
+                'url': offre['url'],
+                'nom_produit': offre['nom_produit'],
+                'prix_ttc': offre['prix_ttc'],
+                'prix_promotion': offre['prix_promotion'],
+                'en_promotion': offre['en_promotion'],
+                'disponible': offre['disponible'],
+                'stock_affiche': offre['stock_affiche'],
+                'note_moyenne': None,
+                'nombre_avis': None,
+                'date_collecte': datetime.now()
+            }
+            product_data['checksum_produit'] = checksum_produit(product_data)
+            en_attente[offre['url']] = (checksum, product_data['checksum_produit'])
+            donnees_brutes = {
+                'methode_collecte': 'liste',
+                'page_liste': offre.get('page_liste'),
+                'timestamp_collecte': product_data['date_collecte'].isoformat()
+            }
+            if lot.ajouter(product_data, donnees_brutes, id_produit_techpulse=ids_par_url.get(offre['url'])):
+                ajoutees += 1
+        return ajoutees
+
+    def lot(self, site_id, site):
+        """Lot d'ingestion sur l'index des pages produit (à faire suivre de valider_tuiles après flush)"""
+        return IngestionBatch(site_id, site, index_checksums=self.index_produits)
+
+    def valider_tuiles(self, site_id):
+        """Mémorise les checksums des tuiles dont l'offre est en base; retourne leur nombre
+
+        Une offre dont l'écriture a échoué garde son ancien checksum de tuile: elle sera relue à la prochaine collecte.
+        """
+        en_attente = self._tuiles_en_attente.pop(site_id, {})
+        ecrites = {
+            url: tuile for url, (tuile, produit) in en_attente.items()
+            if self.index_produits.precedent(site_id, url) == produit
+        }
+        self.index_tuiles.enregistrer_lot(site_id, ecrites)
+        return len(ecrites)
+
+    def collecter(self, site, site_id, url, lot=None, ids_par_url=None):
+        """Parcourt les pages de liste depuis url et écrit les offres, retourne les compteurs du parcours"""
+        lot = lot or self.lot(site_id, site)
+        offres = self.parcourir(site, url)
+        ajoutees = self.ingerer(site, site_id, offres, lot, ids_par_url)
+        lot.flush()
+        self.valider_tuiles(site_id)
+        return {'offres': len(offres), 'ajoutees': ajoutees}
+
+    def requetes_par_offre(self):
+        """Requêtes (pages de liste, pages produit, rendus navigateur) par offre traitée"""
+        if not self.stats['offres']:
+            return 0.0
+        requetes = self.stats['pages'] + self.stats['details'] + self.stats['echecs_detail'] + self.stats['rendus']
+        return requetes / self.stats['offres']